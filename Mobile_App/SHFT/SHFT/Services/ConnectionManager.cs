@@ -18,7 +18,9 @@ using SHFT.Models;
 using SHFT.Repos;
 using System.Collections.Concurrent;
 using System.Diagnostics;
+using System.IO.Compression;
 using System.Linq.Expressions;
+using System.Text;
 
 // SHFT - H
 // Winter 2023
@@ -144,7 +146,7 @@ namespace SHFT.Services
                     await args.UpdateCheckpointAsync();
                     partitionEventCount[partition] = 0;
                 }
-                RouteData(args.Data.EventBody);
+                RouteData(args.Data);
                 long checkpoint = args.Data.Offset;
             }
             catch (Exception e)
@@ -153,14 +155,48 @@ namespace SHFT.Services
             }
         }
 
-        private void RouteData(BinaryData eventBody)
+        // Passes the telemetry of every cycle in a message to the repo. The farm batches
+        // several cycles in a json array when batchMaxCycles is above 1 and gzips large
+        // payloads when telemetryCompression is gzip. The binary encoding and zstd need a
+        // cloud side decoder, those messages are skipped.
+        private void RouteData(EventData eventData)
         {
+            eventData.SystemProperties.TryGetValue("content-type", out object contentType);
+            eventData.SystemProperties.TryGetValue("content-encoding", out object contentEncoding);
 
+            if ((contentType ?? eventData.ContentType) is string type && type != "application/json")
+            {
+                Debug.WriteLine($"Skipping telemetry with content type {type}");
+                return;
+            }
 
-            JObject json = JObject.Parse(eventBody.ToString());
-            _telemetryRepo.PassData(json);
-
+            string body;
+            if (contentEncoding as string == "gzip")
+            {
+                using var input = new GZipStream(eventData.EventBody.ToStream(), CompressionMode.Decompress);
+                using var reader = new StreamReader(input, Encoding.UTF8);
+                body = reader.ReadToEnd();
+            }
+            else if (contentEncoding is string encoding && encoding != "utf-8")
+            {
+                Debug.WriteLine($"Skipping telemetry with content encoding {encoding}");
+                return;
+            }
+            else
+            {
+                body = eventData.EventBody.ToString();
+            }
 
+            JToken json = JToken.Parse(body);
+            if (json is JArray cycles)
+            {
+                foreach (JObject item in cycles.OfType<JObject>())
+                    _telemetryRepo.PassData(item);
+            }
+            else if (json is JObject cycle)
+            {
+                _telemetryRepo.PassData(cycle);
+            }
         }
 
 
@@ -0,0 +1,110 @@
+"""
+Runs a simulated farm against the local fake of the IoT hub with the noise readings
+aggregated over a long telemetry interval, to check that a noise reading above the alarm
+threshold is still sent right away on the high priority lane instead of being folded
+into the window's summary.
+
+Reports how long the first noise alarm took to be sent and the number of high priority
+messages. Exits with status 1 if no noise alarm was sent before the window ended, so it
+can be used as a regression check.
+
+Must be run from the farm directory, with the farm's dependencies installed:
+    python -m benchmarks.alarms
+"""
+
+import asyncio
+from argparse import ArgumentParser
+from time import monotonic
+from typing import Any
+
+from farm import Farm
+from subsystems.hardware import backend
+from subsystems.interfaces.reading import Reading
+from telemetry.buffer import TelemetryBuffer
+from benchmarks.fake_hub import FakeIoTHubDeviceClient
+from benchmarks.outage import wait_for
+
+# The number of seconds noise readings are aggregated over, much longer than the run
+TELEMETRY_INTERVAL = 60
+# Every noise reading is above the threshold, so the first one is an alarm
+NOISE_ALARM_THRESHOLD = 0
+
+
+def noise_alarms(client: FakeIoTHubDeviceClient) -> int:
+    """
+    Counts the high priority messages which contain a noise reading.
+
+    Parameters
+    ----------
+    client: FakeIoTHubDeviceClient
+        The fake client.
+
+    Returns
+    -------
+    int
+        The number of noise alarms sent.
+    """
+
+    return sum(Reading.Type.NOISE.value in str(message.data)
+               for message in client.priority_messages)
+
+
+async def measure(farm: Farm, client: FakeIoTHubDeviceClient,
+                  timeout: float) -> dict[str, Any]:
+    """
+    Starts the farm and waits for the first noise alarm to be sent.
+
+    Parameters
+    ----------
+    farm: Farm
+        The farm, using the fake client.
+    client: FakeIoTHubDeviceClient
+        The fake client.
+    timeout: float
+        The maximum number of seconds to wait for the alarm.
+
+    Returns
+    -------
+    dict[str, Any]
+        The results.
+    """
+
+    task = asyncio.create_task(farm.start())
+    await wait_for(lambda: client.connected, timeout)
+
+    start = monotonic()
+    sent = await wait_for(lambda: noise_alarms(client) > 0, timeout)
+    results = {
+        "noise_alarm_sent": sent,
+        "noise_alarm_delay_s": monotonic() - start if sent else None,
+        "priority_messages": len(client.priority_messages)
+    }
+
+    farm._scheduler.stop()
+    await task
+    return results
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser("Checks that noise alarms skip the aggregation window.")
+    parser.add_argument("--timeout", type=float, default=10,
+                        help="The number of seconds to wait for the noise alarm.")
+    args = parser.parse_args()
+
+    # The backend must be selected before the farm creates its peripherals
+    backend.select(backend.SIMULATED)
+
+    client = FakeIoTHubDeviceClient({
+        "telemetryInterval": TELEMETRY_INTERVAL,
+        "aggregatedTypes": [Reading.Type.NOISE.value],
+        "noiseAlarmThreshold": NOISE_ALARM_THRESHOLD
+    })
+    farm = Farm(client=client, buffer=TelemetryBuffer(":memory:"))
+    results = asyncio.run(measure(farm, client, args.timeout))
+
+    for name, value in results.items():
+        print(f"{name:>20}: {value}")
+
+    if not results["noise_alarm_sent"]:
+        print("FAILED: no noise alarm was sent on the high priority lane")
+        raise SystemExit(1)
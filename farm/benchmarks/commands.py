@@ -0,0 +1,135 @@
+"""
+Sends batches of commands to a simulated actuator which takes a while to move, to check
+that each command gets the whole timeout once it starts executing instead of sharing it
+with the commands queued before it, and that a stuck actuator is reported as timed out.
+
+Reports the status of each command and how long each batch took. Exits with status 1 if
+a command which finished in time was reported otherwise, so it can be used as a
+regression check.
+
+Must be run from the farm directory, with the farm's dependencies installed:
+    python -m benchmarks.commands
+"""
+
+import asyncio
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic, sleep
+from typing import Any
+
+from subsystems.hardware import backend
+from subsystems.interfaces.command import Command
+from subsystems.plant_controller import PlantSubsystem
+from subsystems.plant_subsystem.cooling_fan import Fan
+
+
+class SlowFan(Fan):
+    """A fan which takes a fixed amount of time to execute every command."""
+
+    def __init__(self, delay: float) -> None:
+        """
+        Initializes the fan.
+
+        Parameters
+        ----------
+        delay: float
+            The number of seconds every command takes.
+
+        Returns
+        -------
+        None
+        """
+
+        super().__init__(PlantSubsystem.FAN_GPIO)
+        self.delay = delay
+
+    def control_actuator(self, command: Command) -> bool:
+        sleep(self.delay)
+        return super().control_actuator(command)
+
+
+async def measure(timeout: float) -> dict[str, Any]:
+    """
+    Sends two commands which each finish within the timeout to the same actuator, then
+    a command which takes longer than the timeout followed by another one.
+
+    Parameters
+    ----------
+    timeout: float
+        The number of seconds each command may take.
+
+    Returns
+    -------
+    dict[str, Any]
+        The results.
+    """
+
+    fan = SlowFan(timeout * 0.6)
+    subsystem = PlantSubsystem()
+    subsystem.set_actuators([fan])
+    command = Command(Command.Type.FAN, Command.Unit.BOOL, Fan.State.ON.value)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        start = monotonic()
+        in_time = await subsystem.control_actuators_concurrently(
+            executor, [command, command], timeout)
+        in_time_duration = monotonic() - start
+
+        fan.delay = timeout * 2
+        start = monotonic()
+        stuck = await subsystem.control_actuators_concurrently(
+            executor, [command, command], timeout)
+        stuck_duration = monotonic() - start
+
+    return {
+        "in_time": [status.value for status in in_time],
+        "in_time_s": in_time_duration,
+        "stuck": [status.value for status in stuck],
+        "stuck_s": stuck_duration
+    }
+
+
+def failures(results: dict[str, Any]) -> list[str]:
+    """
+    Checks the results of a run against the statuses each command should have.
+
+    Parameters
+    ----------
+    results: dict[str, Any]
+        The results of measure.
+
+    Returns
+    -------
+    list[str]
+        A description of every check which failed, empty if every status was right.
+    """
+
+    applied = Command.Status.APPLIED.value
+    checks = {
+        "commands which finished in time weren't applied":
+            results["in_time"] == [applied, applied],
+        "the stuck command wasn't reported as timed out":
+            results["stuck"] == [Command.Status.TIMED_OUT.value,
+                                 Command.Status.REJECTED.value]
+    }
+    return [description for description, passed in checks.items() if not passed]
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser("Checks the timeouts of commands queued for one actuator.")
+    parser.add_argument("--timeout", type=float, default=0.5,
+                        help="The number of seconds each command may take.")
+    args = parser.parse_args()
+
+    # The backend must be selected before the subsystem creates its peripherals
+    backend.select(backend.SIMULATED)
+
+    results = asyncio.run(measure(args.timeout))
+    for name, value in results.items():
+        print(f"{name:>10}: {value}")
+
+    failed = failures(results)
+    for description in failed:
+        print(f"FAILED: {description}")
+    if failed:
+        raise SystemExit(1)
@@ -0,0 +1,140 @@
+"""
+Benchmarks the CPU time spent compressing telemetry against the bytes it saves, for single
+cycles and batches in both wire formats. Run it on the reTerminal itself since the trade
+off depends on the CPU. zstd is only measured when zstandard is installed, with and
+without a dictionary trained on varied sample cycles.
+
+Must be run from the farm directory:
+    python -m benchmarks.compression
+"""
+
+import gzip
+from argparse import ArgumentParser
+from random import Random
+from time import process_time
+from typing import Callable, Union
+
+from benchmarks.serialization import sample_cycle
+from subsystems.interfaces.reading import Reading
+from telemetry.codec import BinaryEncoding
+from telemetry.compression import train_dictionary, zstandard
+from telemetry.serialization import JsonEncoding
+
+
+def varied_cycle(random: Random) -> dict[str, list[Reading]]:
+    """
+    Creates a typical cycle with randomized values, so dictionaries aren't trained on a
+    single payload.
+
+    Parameters
+    ----------
+    random: Random
+        The random number generator.
+
+    Returns
+    -------
+    dict[str, list[Reading]]
+        The readings of each subsystem keyed by subsystem name.
+    """
+
+    cycle = sample_cycle()
+    for readings in cycle.values():
+        for index, reading in enumerate(readings):
+            if isinstance(reading.value, float):
+                value = round(reading.value * random.uniform(0.8, 1.2), 4)
+                readings[index] = Reading(value, reading.reading_type, reading.reading_unit)
+
+    return cycle
+
+
+def compressors(samples: list[bytes]) -> dict[str, Callable[[bytes], bytes]]:
+    """
+    Creates the compressors to compare.
+
+    Parameters
+    ----------
+    samples: list[bytes]
+        The payloads a zstd dictionary is trained on.
+
+    Returns
+    -------
+    dict[str, Callable[[bytes], bytes]]
+        The compression functions keyed by name.
+    """
+
+    candidates = {f"gzip-{level}": (lambda data, level=level: gzip.compress(data, level, mtime=0))
+                  for level in (1, 6, 9)}
+
+    if zstandard is not None:
+        candidates["zstd"] = zstandard.ZstdCompressor().compress
+        dictionary = zstandard.ZstdCompressionDict(train_dictionary(samples))
+        candidates["zstd-dict"] = zstandard.ZstdCompressor(dict_data=dictionary).compress
+
+    return candidates
+
+
+def run(cycles: int, number: int) -> dict[str, dict[str, dict[str, float]]]:
+    """
+    Measures every compressor on every payload.
+
+    Parameters
+    ----------
+    cycles: int
+        The number of cycles in a batched payload.
+    number: int
+        The number of times each payload is compressed.
+
+    Returns
+    -------
+    dict[str, dict[str, dict[str, float]]]
+        The original and compressed sizes, the percentage saved and the CPU time per
+        compression in microseconds, keyed by payload name then compressor name.
+    """
+
+    random = Random(0)
+    payloads: dict[str, Union[str, bytes]] = {}
+    samples = []
+    for encoding in (JsonEncoding(), BinaryEncoding()):
+        single = encoding.encode(varied_cycle(random))
+        batch = encoding.join([encoding.encode(varied_cycle(random)) for _ in range(cycles)])
+        payloads[f"{encoding.name} x1"] = single
+        payloads[f"{encoding.name} x{cycles}"] = batch
+        samples.extend(encoding.encode(varied_cycle(random)) for _ in range(200))
+
+    samples = [sample.encode("utf-8") if isinstance(sample, str) else sample
+               for sample in samples]
+
+    candidates = compressors(samples)
+    results = {}
+    for payload_name, payload in payloads.items():
+        data = payload.encode("utf-8") if isinstance(payload, str) else payload
+        results[payload_name] = {}
+        for name, compress in candidates.items():
+            start = process_time()
+            for _ in range(number):
+                compressed = compress(data)
+            cpu_time = process_time() - start
+
+            results[payload_name][name] = {
+                "bytes": len(data),
+                "compressed_bytes": len(compressed),
+                "saved_percent": 100 * (1 - len(compressed) / len(data)),
+                "cpu_us": cpu_time / number * 1e6
+            }
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser("Benchmarks telemetry compression CPU time against bytes saved.")
+    parser.add_argument("--cycles", type=int, default=10,
+                        help="The number of cycles in a batched payload.")
+    parser.add_argument("--number", type=int, default=1000,
+                        help="The number of times each payload is compressed.")
+    args = parser.parse_args()
+
+    for payload_name, result in run(args.cycles, args.number).items():
+        for name, measures in result.items():
+            print(f"{payload_name:>10} {name:>9}: {measures['bytes']:6d} B -> "
+                  f"{measures['compressed_bytes']:6d} B ({measures['saved_percent']:5.1f}% saved), "
+                  f"{measures['cpu_us']:8.2f} us CPU")
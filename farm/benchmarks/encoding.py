@@ -0,0 +1,77 @@
+"""
+Benchmarks the size and throughput of the json and binary telemetry wire formats, for a
+single cycle and for a batch of cycles.
+
+Must be run from the farm directory:
+    python -m benchmarks.encoding
+"""
+
+import json
+from argparse import ArgumentParser
+from timeit import repeat
+
+from benchmarks.serialization import sample_cycle
+from telemetry.codec import BinaryEncoding, decode
+from telemetry.serialization import JsonEncoding
+
+
+def run(cycles: int, number: int, repetitions: int) -> dict[str, dict[str, float]]:
+    """
+    Measures every wire format.
+
+    Parameters
+    ----------
+    cycles: int
+        The number of cycles in a batch.
+    number: int
+        The number of batches encoded and decoded per repetition.
+    repetitions: int
+        The number of repetitions. The fastest one is kept.
+
+    Returns
+    -------
+    dict[str, dict[str, float]]
+        The bytes per cycle, bytes per batch and the encode and decode time per cycle in
+        microseconds, keyed by wire format name.
+    """
+
+    cycle = sample_cycle()
+    decoders = {JsonEncoding.name: json.loads, BinaryEncoding.name: decode}
+
+    results = {}
+    for encoding in (JsonEncoding(), BinaryEncoding()):
+        decoder = decoders[encoding.name]
+
+        def encode():
+            return encoding.join([encoding.encode(cycle) for _ in range(cycles)])
+
+        batch = encode()
+        single = encoding.encode(cycle)
+        encode_time = min(repeat(encode, number=number, repeat=repetitions))
+        decode_time = min(repeat(lambda: decoder(batch), number=number, repeat=repetitions))
+
+        results[encoding.name] = {
+            "bytes_per_cycle": len(single.encode("utf-8") if isinstance(single, str) else single),
+            "bytes_per_batch": len(batch.encode("utf-8") if isinstance(batch, str) else batch),
+            "encode_us_per_cycle": encode_time / number / cycles * 1e6,
+            "decode_us_per_cycle": decode_time / number / cycles * 1e6
+        }
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser("Benchmarks the size and throughput of the telemetry wire formats.")
+    parser.add_argument("--cycles", type=int, default=10,
+                        help="The number of cycles in a batch.")
+    parser.add_argument("--number", type=int, default=1000,
+                        help="The number of batches encoded per repetition.")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="The number of repetitions.")
+    args = parser.parse_args()
+
+    for name, result in run(args.cycles, args.number, args.repeat).items():
+        print(f"{name:>6}: {result['bytes_per_cycle']:6d} B/cycle, "
+              f"{result['bytes_per_batch']:7d} B/batch of {args.cycles}, "
+              f"encode {result['encode_us_per_cycle']:7.2f} us/cycle, "
+              f"decode {result['decode_us_per_cycle']:7.2f} us/cycle")
@@ -0,0 +1,158 @@
+"""
+A local fake of the IoT hub's device client, used to run the farm without a hub. It
+accepts every call the connection manager makes, records what was sent and can add a
+delay to every message to emulate the network. The connection can be dropped and the hub
+made unreachable to emulate an outage, calls then fail with the client's exceptions.
+
+Usage:
+    client = FakeIoTHubDeviceClient(desired={"telemetryInterval": 1})
+    farm = Farm(client=client, buffer=TelemetryBuffer(":memory:"))
+    print(client.messages_sent, client.bytes_sent)
+    client.drop()
+    client.restore()
+"""
+
+import asyncio
+from typing import Any, Callable, Optional
+
+from azure.iot.device.exceptions import ConnectionFailedError, NoConnectionError
+
+
+class FakeIoTHubDeviceClient:
+    """
+    Stands in for azure.iot.device.aio.IoTHubDeviceClient.
+    """
+
+    def __init__(self, desired: Optional[dict[str, Any]] = None,
+                 send_latency: float = 0) -> None:
+        """
+        Initializes the client.
+
+        Parameters
+        ----------
+        desired: dict, optional
+            The desired properties of the device twin.
+        send_latency: float
+            The number of seconds each message takes to send.
+
+        Returns
+        -------
+        None
+        """
+
+        self.desired = dict(desired or {})
+        self.reported: dict[str, Any] = {}
+        self.send_latency = send_latency
+        self.connected = False
+        # Whether connection attempts fail, like when the network is down
+        self.unreachable = False
+        self.connects = 0
+        self.messages_sent = 0
+        self.bytes_sent = 0
+        # The messages sent with the high priority routing tag
+        self.priority_messages: list[Any] = []
+        self.method_responses: list[Any] = []
+        self.on_twin_desired_properties_patch_received: Optional[Callable] = None
+        self.on_method_request_received: Optional[Callable] = None
+        self.on_connection_state_change: Optional[Callable] = None
+
+    async def connect(self) -> None:
+        if self.unreachable:
+            raise ConnectionFailedError("The fake hub is unreachable")
+        self.connects += 1
+        self._set_connected(True)
+
+    async def shutdown(self) -> None:
+        self.connected = False
+
+    async def get_twin(self) -> dict[str, Any]:
+        self._check_connected()
+        return {"desired": dict(self.desired), "reported": dict(self.reported)}
+
+    async def patch_twin_reported_properties(self, reported: dict[str, Any]) -> None:
+        self._check_connected()
+        self.reported.update(reported)
+
+    async def send_message(self, message: Any) -> None:
+        self._check_connected()
+        if self.send_latency:
+            await asyncio.sleep(self.send_latency)
+        self.messages_sent += 1
+        self.bytes_sent += len(message.data)
+        if message.custom_properties.get("priority") == "high":
+            self.priority_messages.append(message)
+
+    async def send_method_response(self, response: Any) -> None:
+        self.method_responses.append(response)
+
+    def drop(self, unreachable: bool = True) -> None:
+        """
+        Drops the connection.
+
+        Parameters
+        ----------
+        unreachable: bool
+            Whether connection attempts fail until restore is called.
+
+        Returns
+        -------
+        None
+        """
+
+        self.unreachable = unreachable
+        self._set_connected(False)
+
+    def restore(self) -> None:
+        """
+        Makes the hub reachable again. The client stays disconnected until it connects.
+
+        Returns
+        -------
+        None
+        """
+
+        self.unreachable = False
+
+    def _set_connected(self, connected: bool) -> None:
+        """
+        Changes the connection state and calls the connection state change handler.
+
+        Parameters
+        ----------
+        connected: bool
+            The new connection state.
+
+        Returns
+        -------
+        None
+        """
+
+        changed = connected != self.connected
+        self.connected = connected
+        if changed and self.on_connection_state_change is not None:
+            self.on_connection_state_change()
+
+    def _check_connected(self) -> None:
+        """
+        Raises the client's exception for calls made while disconnected.
+
+        Returns
+        -------
+        None
+        """
+
+        if not self.connected:
+            raise NoConnectionError("The fake hub is not connected")
+
+    def reset(self) -> None:
+        """
+        Forgets the messages sent so far.
+
+        Returns
+        -------
+        None
+        """
+
+        self.messages_sent = 0
+        self.bytes_sent = 0
+        self.priority_messages.clear()
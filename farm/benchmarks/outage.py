@@ -0,0 +1,162 @@
+"""
+Runs a simulated farm against the local fake of the IoT hub and takes the hub down for a
+while, to check that sampling keeps going while offline, that the connection comes back
+on its own once the hub is reachable and that the telemetry buffered in the meantime is
+sent.
+
+Reports the ticks run during the outage, the messages buffered, how long reconnecting
+took once the hub was back and the connection statistics of the connection manager.
+Exits with status 1 if the farm didn't recover, so it can be used as a regression check.
+
+Must be run from the farm directory, with the farm's dependencies installed:
+    python -m benchmarks.outage --outage 10
+"""
+
+import asyncio
+from argparse import ArgumentParser
+from time import monotonic
+from typing import Any, Callable
+
+from farm import Farm
+from subsystems.hardware import backend
+from telemetry.buffer import TelemetryBuffer
+from benchmarks.fake_hub import FakeIoTHubDeviceClient
+
+# The number of seconds between telemetry messages during the run
+TELEMETRY_INTERVAL = 0.2
+
+
+async def wait_for(condition: Callable[[], bool], timeout: float) -> bool:
+    """
+    Waits until a condition is true.
+
+    Parameters
+    ----------
+    condition: Callable[[], bool]
+        The condition.
+    timeout: float
+        The maximum number of seconds to wait.
+
+    Returns
+    -------
+    bool
+        True if the condition became true in time.
+    """
+
+    deadline = monotonic() + timeout
+    while not condition():
+        if monotonic() > deadline:
+            return False
+        await asyncio.sleep(0.01)
+    return True
+
+
+async def measure(farm: Farm, client: FakeIoTHubDeviceClient, warmup: float,
+                  outage: float, timeout: float) -> dict[str, Any]:
+    """
+    Starts the farm, drops the hub for the length of the outage and waits for the farm
+    to reconnect and send what it buffered.
+
+    Parameters
+    ----------
+    farm: Farm
+        The farm, using the fake client.
+    client: FakeIoTHubDeviceClient
+        The fake client.
+    warmup: float
+        The number of seconds the farm runs connected before the outage.
+    outage: float
+        The number of seconds the hub is unreachable.
+    timeout: float
+        The maximum number of seconds to wait for the farm to recover.
+
+    Returns
+    -------
+    dict[str, Any]
+        The results.
+    """
+
+    connection_manager = farm._connection_manager
+    task = asyncio.create_task(farm.start())
+    await asyncio.sleep(warmup)
+
+    ticks_before = farm.tick_stats.ticks
+    sent_before = client.messages_sent
+    client.drop()
+    await asyncio.sleep(outage)
+    ticks_during = farm.tick_stats.ticks - ticks_before
+    buffered = connection_manager.buffer_stats["depth"]
+
+    client.restore()
+    restored = monotonic()
+    reconnected = await wait_for(lambda: client.connected, timeout)
+    reconnect_delay = monotonic() - restored
+    drained = await wait_for(lambda: len(connection_manager._buffer) == 0, timeout)
+
+    results = {
+        "ticks_during_outage": ticks_during,
+        "messages_buffered": buffered,
+        "reconnected": reconnected,
+        "reconnect_delay_s": reconnect_delay,
+        "buffer_drained": drained,
+        "messages_sent_since_drop": client.messages_sent - sent_before,
+        "connection": connection_manager.connection_stats
+    }
+
+    farm._scheduler.stop()
+    await task
+    return results
+
+
+def failures(results: dict[str, Any]) -> list[str]:
+    """
+    Checks the results of a run against what a recovered farm looks like.
+
+    Parameters
+    ----------
+    results: dict[str, Any]
+        The results of measure.
+
+    Returns
+    -------
+    list[str]
+        A description of every check which failed, empty if the farm recovered.
+    """
+
+    checks = {
+        "sampling stopped during the outage": results["ticks_during_outage"] > 0,
+        "nothing was buffered during the outage": results["messages_buffered"] > 0,
+        "the farm didn't reconnect": results["reconnected"],
+        "the buffer wasn't drained": results["buffer_drained"],
+        "the reconnect wasn't counted": results["connection"]["reconnects"] >= 1
+    }
+    return [description for description, passed in checks.items() if not passed]
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser("Takes the fake IoT hub down under a simulated farm and checks "
+                            "that the farm recovers.")
+    parser.add_argument("--warmup", type=float, default=2,
+                        help="The number of seconds the farm runs before the outage.")
+    parser.add_argument("--outage", type=float, default=5,
+                        help="The number of seconds the hub is unreachable.")
+    parser.add_argument("--timeout", type=float, default=60,
+                        help="The number of seconds to wait for the farm to recover.")
+    args = parser.parse_args()
+
+    # The backend must be selected before the farm creates its peripherals
+    backend.select(backend.SIMULATED)
+
+    client = FakeIoTHubDeviceClient({"telemetryInterval": TELEMETRY_INTERVAL})
+    farm = Farm(client=client, buffer=TelemetryBuffer(":memory:"))
+    results = asyncio.run(measure(farm, client, args.warmup, args.outage, args.timeout))
+
+    for name, value in {**results, **results["connection"]}.items():
+        if name != "connection":
+            print(f"{name:>26}: {value}")
+
+    failed = failures(results)
+    for description in failed:
+        print(f"FAILED: {description}")
+    if failed:
+        raise SystemExit(1)
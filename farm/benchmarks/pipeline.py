@@ -0,0 +1,303 @@
+"""
+Benchmarks the whole telemetry pipeline, from reading the sensors to handing messages to
+the IoT hub client, on simulated peripherals and a local fake of the hub. Every sensor is
+sampled on every cycle and deadbands are disabled so each cycle does the most work, and
+cycles run back to back to measure throughput.
+
+Reports the cycle latency (p50 and p99), readings per second, bytes per message, memory
+allocated per cycle and CPU time per cycle. CPU time includes the simulation's background
+threads. Results can be saved as JSON and compared against the results of another commit.
+
+Must be run from the farm directory, with the farm's dependencies installed:
+    python -m benchmarks.pipeline --output before.json
+    python -m benchmarks.pipeline --compare before.json
+"""
+
+import asyncio
+import json
+import platform
+import tracemalloc
+from argparse import ArgumentParser
+from subprocess import DEVNULL, CalledProcessError, check_output
+from time import perf_counter, process_time, time
+from typing import Any, Optional
+
+from farm import Farm
+from subsystems.hardware import backend
+from subsystems.interfaces.reading import Reading, ReadingBatch
+from telemetry.buffer import TelemetryBuffer
+from telemetry.deadband import DeadbandFilter
+from benchmarks.fake_hub import FakeIoTHubDeviceClient
+
+# The metrics where a higher value is better, the others are better when lower
+HIGHER_IS_BETTER = ("readings_per_second",)
+# The sampling interval given to every reading type so every sensor is due every cycle
+SAMPLING_INTERVAL = 0.001
+
+
+def desired_properties(encoding: str, batch_cycles: int) -> dict[str, Any]:
+    """
+    Creates the device twin which makes every sensor due on every cycle and sends every
+    reading at the end of its cycle.
+
+    Parameters
+    ----------
+    encoding: str
+        The telemetry wire format.
+    batch_cycles: int
+        The number of cycles per message.
+
+    Returns
+    -------
+    dict[str, Any]
+        The desired properties.
+    """
+
+    return {
+        "telemetryInterval": SAMPLING_INTERVAL,
+        "samplingIntervals": {reading_type.value: SAMPLING_INTERVAL
+                              for reading_type in Reading.Type},
+        "deadbands": {reading_type.value: None
+                      for reading_type in DeadbandFilter.DEFAULT_DEADBANDS},
+        "telemetryEncoding": encoding,
+        "batchMaxCycles": batch_cycles
+    }
+
+
+def percentile(values: list[float], q: float) -> float:
+    """
+    Gets a percentile with the nearest rank method.
+
+    Parameters
+    ----------
+    values: list[float]
+        The values, in any order.
+    q: float
+        The percentile, between 0 and 1.
+
+    Returns
+    -------
+    float
+        The value at the percentile.
+    """
+
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q * len(ordered)) - 1))]
+
+
+async def measure(farm: Farm, client: FakeIoTHubDeviceClient, cycles: int,
+                  warmup: int) -> dict[str, float]:
+    """
+    Runs telemetry cycles back to back and measures them.
+
+    Parameters
+    ----------
+    farm: Farm
+        The farm, connected to the fake client.
+    client: FakeIoTHubDeviceClient
+        The fake client.
+    cycles: int
+        The number of measured cycles.
+    warmup: int
+        The number of cycles run before measuring.
+
+    Returns
+    -------
+    dict[str, float]
+        The metrics.
+    """
+
+    connection_manager = farm._connection_manager
+    await connection_manager.connect()
+    connection_manager.start_lanes()
+
+    # Count the readings handed to the connection manager
+    readings_sent = 0
+    send_telemetry = connection_manager.send_telemetry
+
+    async def counting_send_telemetry(telemetry: dict) -> None:
+        nonlocal readings_sent
+        readings_sent += sum(len(reading) if isinstance(reading, ReadingBatch) else 1
+                             for readings in telemetry.values() for reading in readings)
+        await send_telemetry(telemetry)
+
+    connection_manager.send_telemetry = counting_send_telemetry
+
+    async def cycle() -> None:
+        await farm.send_readings()
+        await connection_manager.flush_due_telemetry()
+
+    for _ in range(warmup):
+        await cycle()
+    await connection_manager.flush_due_telemetry(force=True)
+    readings_sent = 0
+    client.reset()
+
+    # Latency and CPU time
+    latencies = []
+    cpu_start = process_time()
+    start = perf_counter()
+    for _ in range(cycles):
+        cycle_start = perf_counter()
+        await cycle()
+        latencies.append(perf_counter() - cycle_start)
+    await connection_manager.flush_due_telemetry(force=True)
+    elapsed = perf_counter() - start
+    cpu_time = process_time() - cpu_start
+    readings = readings_sent
+
+    # Allocations, measured separately since tracing slows everything down
+    allocated = []
+    tracemalloc.start()
+    for _ in range(min(cycles, 100)):
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        await cycle()
+        _, peak = tracemalloc.get_traced_memory()
+        allocated.append(peak - before)
+    tracemalloc.stop()
+
+    await connection_manager.close()
+
+    return {
+        "latency_p50_ms": percentile(latencies, 0.5) * 1000,
+        "latency_p99_ms": percentile(latencies, 0.99) * 1000,
+        "readings_per_second": readings / elapsed,
+        "bytes_per_message": client.bytes_sent / client.messages_sent
+        if client.messages_sent else 0,
+        "allocated_kib_per_cycle": sum(allocated) / len(allocated) / 1024,
+        "cpu_ms_per_cycle": cpu_time / cycles * 1000
+    }
+
+
+def commit() -> Optional[str]:
+    """
+    Gets the commit being benchmarked.
+
+    Returns
+    -------
+    str, optional
+        The hash of the current commit, None if it can't be found.
+    """
+
+    try:
+        return check_output(["git", "rev-parse", "--short", "HEAD"],
+                            stderr=DEVNULL, text=True).strip()
+    except (OSError, CalledProcessError):
+        return None
+
+
+def run(cycles: int, warmup: int, encoding: str, batch_cycles: int,
+        concurrent_reads: bool, send_latency: float) -> dict[str, Any]:
+    """
+    Creates a simulated farm connected to a fake hub and benchmarks it.
+
+    Parameters
+    ----------
+    cycles: int
+        The number of measured cycles.
+    warmup: int
+        The number of cycles run before measuring.
+    encoding: str
+        The telemetry wire format.
+    batch_cycles: int
+        The number of cycles per message.
+    concurrent_reads: bool
+        Whether the sensors are read at the same time on a thread pool.
+    send_latency: float
+        The number of seconds the fake hub takes to accept each message.
+
+    Returns
+    -------
+    dict[str, Any]
+        The configuration of the run, where it ran and its metrics.
+    """
+
+    # The backend must be selected before the farm creates its peripherals
+    backend.select(backend.SIMULATED)
+
+    client = FakeIoTHubDeviceClient(desired_properties(encoding, batch_cycles),
+                                    send_latency)
+    farm = Farm(concurrent_reads=concurrent_reads, client=client,
+                buffer=TelemetryBuffer(":memory:"))
+
+    return {
+        "commit": commit(),
+        "time": time(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "config": {
+            "cycles": cycles,
+            "warmup": warmup,
+            "encoding": encoding,
+            "batch_cycles": batch_cycles,
+            "concurrent_reads": concurrent_reads,
+            "send_latency": send_latency
+        },
+        "metrics": asyncio.run(measure(farm, client, cycles, warmup))
+    }
+
+
+def compare(baseline: dict[str, Any], results: dict[str, Any]) -> dict[str, float]:
+    """
+    Compares the metrics of two runs.
+
+    Parameters
+    ----------
+    baseline: dict[str, Any]
+        The results of the run to compare against.
+    results: dict[str, Any]
+        The results of the new run.
+
+    Returns
+    -------
+    dict[str, float]
+        The percent by which each metric improved, negative when it regressed.
+    """
+
+    changes = {}
+    for name, value in results["metrics"].items():
+        previous = baseline["metrics"].get(name)
+        if not previous:
+            continue
+        change = (value - previous) / previous * 100
+        changes[name] = change if name in HIGHER_IS_BETTER else -change
+
+    return changes
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser("Benchmarks the telemetry pipeline end to end on simulated "
+                            "hardware and a fake IoT hub.")
+    parser.add_argument("--cycles", type=int, default=500,
+                        help="The number of measured cycles.")
+    parser.add_argument("--warmup", type=int, default=20,
+                        help="The number of cycles run before measuring.")
+    parser.add_argument("--encoding", choices=("json", "binary"), default="json",
+                        help="The telemetry wire format.")
+    parser.add_argument("--batch-cycles", type=int, default=1,
+                        help="The number of cycles per message.")
+    parser.add_argument("--sequential-reads", action="store_true",
+                        help="Reads the sensors one after the other.")
+    parser.add_argument("--send-latency", type=float, default=0,
+                        help="The number of seconds the fake hub takes per message.")
+    parser.add_argument("--output", help="Saves the results to this JSON file.")
+    parser.add_argument("--compare", help="Compares the results to a saved JSON file.")
+    args = parser.parse_args()
+
+    results = run(args.cycles, args.warmup, args.encoding, args.batch_cycles,
+                  not args.sequential_reads, args.send_latency)
+
+    for name, value in results["metrics"].items():
+        print(f"{name:>24}: {value:12.3f}")
+
+    if args.compare is not None:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        print(f"\nCompared to {baseline.get('commit')} (positive is better):")
+        for name, change in compare(baseline, results).items():
+            print(f"{name:>24}: {change:+8.1f}%")
+
+    if args.output is not None:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
@@ -0,0 +1,96 @@
+"""
+Benchmarks the memory and construction time of a large number of readings. Compares the
+slotted Reading, which stores an integer timestamp, with the original dict backed reading
+which called datetime.now() for every reading.
+
+Must be run from the farm directory:
+    python -m benchmarks.readings
+"""
+
+import datetime
+import tracemalloc
+from argparse import ArgumentParser
+from time import perf_counter
+from typing import Callable
+
+from subsystems.interfaces.reading import Reading
+
+
+class DictReading:
+    """The original reading, kept for comparison."""
+
+    def __init__(self, value, reading_type, reading_unit) -> None:
+        self.reading_type = reading_type
+        self.value = value
+        self.reading_unit = reading_unit
+        self.timestamp = datetime.datetime.now()
+
+
+def measure(factory: Callable, count: int) -> dict[str, float]:
+    """
+    Creates readings and keeps them alive to measure their cost.
+
+    Parameters
+    ----------
+    factory: Callable
+        The reading class.
+    count: int
+        The number of readings to create.
+
+    Returns
+    -------
+    dict[str, float]
+        The construction time in nanoseconds per reading and the memory held in bytes per
+        reading.
+    """
+
+    start = perf_counter()
+    readings = [factory(21.4, Reading.Type.TEMPERATURE, Reading.Unit.CELCIUS)
+                for _ in range(count)]
+    construction_time = perf_counter() - start
+
+    # Measure memory separately since tracing slows construction down
+    del readings
+    tracemalloc.start()
+    readings = [factory(21.4, Reading.Type.TEMPERATURE, Reading.Unit.CELCIUS)
+                for _ in range(count)]
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del readings
+
+    return {
+        "ns_per_reading": construction_time / count * 1e9,
+        "bytes_per_reading": memory / count
+    }
+
+
+def run(count: int) -> dict[str, dict[str, float]]:
+    """
+    Measures both reading implementations.
+
+    Parameters
+    ----------
+    count: int
+        The number of readings to create.
+
+    Returns
+    -------
+    dict[str, dict[str, float]]
+        The measurements keyed by implementation name.
+    """
+
+    return {
+        "dict": measure(DictReading, count),
+        "slots": measure(Reading, count)
+    }
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser("Benchmarks the memory and construction time of readings.")
+    parser.add_argument("--count", type=int, default=1_000_000,
+                        help="The number of readings to create.")
+    args = parser.parse_args()
+
+    for name, result in run(args.count).items():
+        print(f"{name:>5}: {result['ns_per_reading']:7.1f} ns/reading, "
+              f"{result['bytes_per_reading']:6.1f} B/reading")
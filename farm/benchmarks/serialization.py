@@ -0,0 +1,164 @@
+"""
+Benchmarks the per cycle cost of serializing the farm's telemetry. Compares the original
+approach, which serialized every reading to json and parsed it back before serializing the
+whole payload, with the single pass serializer using the standard library and orjson.
+
+Must be run from the farm directory:
+    python -m benchmarks.serialization
+"""
+
+import json
+from argparse import ArgumentParser
+from timeit import repeat
+
+from subsystems.interfaces.reading import Reading
+from telemetry import serialization
+
+
+def sample_cycle() -> dict[str, list[Reading]]:
+    """
+    Creates the readings of a typical cycle where every sensor was due.
+
+    Returns
+    -------
+    dict[str, list[Reading]]
+        The readings of each subsystem keyed by subsystem name.
+    """
+
+    location = {"Latitude": {"degrees": "45", "minutes": "30.123"},
+                "Latitude Direction": "N",
+                "Longitude": {"degrees": "073", "minutes": "34.567"},
+                "Longitude Direction": "W",
+                "Timestamp": "172900.000",
+                "Status": "A",
+                "FAA mode indicator": "A*7B"}
+
+    return {
+        "GeoLocationSubsystem": [
+            Reading(12.3, Reading.Type.PITCH, Reading.Unit.DEGREES),
+            Reading(-4.5, Reading.Type.ROLL, Reading.Unit.DEGREES),
+            Reading(location, Reading.Type.GEO_LOCATION, Reading.Unit.NONE),
+            Reading(0.0123, Reading.Type.VIBRATION, Reading.Unit.NONE)
+        ],
+        "SecuritySubsystem": [
+            Reading(41.2, Reading.Type.NOISE, Reading.Unit.DECIBEL),
+            Reading(False, Reading.Type.MOTION, Reading.Unit.BOOL),
+            Reading(True, Reading.Type.DOOR_LOCKED, Reading.Unit.BOOL),
+            Reading(320, Reading.Type.LUMINOSITY, Reading.Unit.LUX),
+            Reading(False, Reading.Type.BUZZER, Reading.Unit.BOOL)
+        ],
+        "PlantSubsystem": [
+            Reading(55.72, Reading.Type.SOIL_MOISTURE, Reading.Unit.PERCENTAGE),
+            Reading(21.4, Reading.Type.TEMPERATURE, Reading.Unit.CELCIUS),
+            Reading(48.9, Reading.Type.HUMIDITY, Reading.Unit.PERCENTAGE),
+            Reading(3.21, Reading.Type.WATER_LEVEL, Reading.Unit.CENTIMETERS),
+            Reading(True, Reading.Type.RGB_LED_STICK, Reading.Unit.BOOL),
+            Reading(False, Reading.Type.FAN, Reading.Unit.BOOL)
+        ]
+    }
+
+
+def double_round_trip(cycle: dict[str, list[Reading]]) -> str:
+    """
+    Serializes a cycle the way Farm.send_readings originally did.
+
+    Parameters
+    ----------
+    cycle: dict[str, list[Reading]]
+        The readings of each subsystem keyed by subsystem name.
+
+    Returns
+    -------
+    str
+        The json payload.
+    """
+
+    telemetry = {}
+    for subsystem, readings in cycle.items():
+        telemetry[subsystem] = []
+        for reading in readings:
+            telemetry[subsystem].append(json.loads(reading.to_json()))
+
+    return json.dumps(telemetry)
+
+
+def single_pass_stdlib(cycle: dict[str, list[Reading]]) -> str:
+    """
+    Serializes a cycle in a single pass with the standard library.
+
+    Parameters
+    ----------
+    cycle: dict[str, list[Reading]]
+        The readings of each subsystem keyed by subsystem name.
+
+    Returns
+    -------
+    str
+        The json payload.
+    """
+
+    return json.dumps(serialization.readings_to_telemetry(cycle), separators=(",", ":"))
+
+
+def single_pass(cycle: dict[str, list[Reading]]) -> str:
+    """
+    Serializes a cycle the way Farm.send_readings does now.
+
+    Parameters
+    ----------
+    cycle: dict[str, list[Reading]]
+        The readings of each subsystem keyed by subsystem name.
+
+    Returns
+    -------
+    str
+        The json payload.
+    """
+
+    return serialization.dumps(serialization.readings_to_telemetry(cycle))
+
+
+def run(number: int, repetitions: int) -> dict[str, float]:
+    """
+    Times every serializer.
+
+    Parameters
+    ----------
+    number: int
+        The number of cycles serialized per repetition.
+    repetitions: int
+        The number of repetitions. The fastest one is kept.
+
+    Returns
+    -------
+    dict[str, float]
+        The number of microseconds each serializer takes per cycle, keyed by name.
+    """
+
+    cycle = sample_cycle()
+    serializers = {
+        "double_round_trip": double_round_trip,
+        "single_pass_stdlib": single_pass_stdlib,
+        "single_pass" + ("_orjson" if serialization.USING_ORJSON else "_stdlib"): single_pass
+    }
+
+    results = {}
+    for name, serializer in serializers.items():
+        best = min(repeat(lambda: serializer(cycle), number=number, repeat=repetitions))
+        results[name] = best / number * 1e6
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser("Benchmarks the per cycle telemetry serialization cost.")
+    parser.add_argument("--number", type=int, default=10000,
+                        help="The number of cycles serialized per repetition.")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="The number of repetitions.")
+    args = parser.parse_args()
+
+    baseline = None
+    for name, microseconds in run(args.number, args.repeat).items():
+        baseline = baseline or microseconds
+        print(f"{name:>22}: {microseconds:8.2f} us/cycle ({baseline / microseconds:.1f}x)")
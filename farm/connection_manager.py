@@ -1,7 +1,8 @@
 """
-This module defines two classes: ConnectionConfig and ConnectionManager taken partially 
-from Connected Objects' Assignment 2. The ConnectionConfig class represents all the 
-necessary information required to connect the client to the cloud gateway. The 
+This module defines three classes: ConnectionConfig, ConnectionSupervisor and 
+ConnectionManager taken partially from Connected Objects' Assignment 2. The 
+ConnectionConfig class represents all the necessary information required to connect the 
+client to the cloud gateway. The ConnectionSupervisor keeps the connection up. The 
 ConnectionManager class is a wrapper for all the connection logic and includes 
 functionality to connect to the IoT hub, handle message and device twin update handlers 
 and handle direct method requests.
@@ -10,6 +11,9 @@ Classes:
 ConnectionConfig: Represents all information required to successfully connect client 
 to cloud gateway.
 
+ConnectionSupervisor: Reconnects to the IoT hub with exponential backoff whenever the
+connection drops.
+
 ConnectionManager: A wrapper for all logic related to the connection to the IoT hub.
 
 Methods:
@@ -24,8 +28,15 @@ _direct_method_request_handler(): A callback method for direct method requests.
                                     direct method requests by calling the appropriate 
                                     hardware method and responds accordingly.
 
+supervise(): Connects in the background and reconnects whenever the connection drops.
+
 is_connected: Indicates whether the ConnectionManager is currently connected to the IoT hub.
 
+send_the_d2c_message(): Sends telemetry to the IoT hub, storing it in an on-disk buffer while
+                        the hub can't be reached.
+
+drain_buffer(): Sends buffered telemetry once the connection returns.
+
 close(): Gracefully closes the connection.
 
 Usage:
@@ -45,16 +56,31 @@ await loop.run_in_executor(None, stdin_listener)
 await conManager.close()
 """
 import asyncio
+from json import dumps
 from os import environ, getenv
 from os.path import isfile
-from typing import Dict, List, Any
+from datetime import datetime
+from random import uniform
+from time import monotonic, time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
 
 from subsystems.interfaces.command import Command
+from subsystems.interfaces.direct_method import DirectMethod
+from subsystems.interfaces.reading import Reading
+from telemetry.batching import TelemetryBatcher
+from telemetry.buffer import TelemetryBuffer
+from telemetry.codec import BinaryEncoding
+from telemetry.compression import Compressor
+from telemetry.deadband import Deadband, DeadbandFilter
+from telemetry.health import HealthReport
+from telemetry.lanes import SendLane
+from telemetry.serialization import JsonEncoding
+from telemetry.twin import TwinPatchPipeline
 from farm import Farm
 
 from azure.iot.device.aio import IoTHubDeviceClient
-from azure.iot.device import MethodResponse, MethodRequest
-from azure.iot.device.exceptions import ClientError
+from azure.iot.device import Message, MethodResponse, MethodRequest
+from azure.iot.device.exceptions import ClientError, OperationCancelled, OperationTimeout
 from dotenv import load_dotenv
 
 
@@ -85,12 +111,340 @@ class ConnectionConfig:
         self._device_connection_str = device_str
 
 
+class ConnectionSupervisor:
+    """
+    Keeps the connection to the IoT hub up. Watches the client's connected flag and
+    reconnects with exponential backoff and full jitter, so devices coming back from the
+    same outage don't all reconnect at once. Counts reconnects and measures how long each
+    outage lasted.
+    """
+
+    # The number of seconds between checks of the connected flag. The client also wakes
+    # the supervisor as soon as its connection state changes.
+    POLL_INTERVAL = 1
+    # The delay before the second connection attempt is drawn between 0 and this many
+    # seconds, the bound is multiplied by BACKOFF_FACTOR after every failed attempt.
+    INITIAL_BACKOFF = 1
+    BACKOFF_FACTOR = 2
+    MAX_BACKOFF = 300
+
+    def __init__(self, connect: Callable[[], Awaitable[None]],
+                 is_connected: Callable[[], bool], debug: bool = False) -> None:
+        """
+        Initializes the supervisor without starting it.
+
+        Parameters
+        ----------
+        connect: Callable[[], Awaitable[None]]
+            Connects to the IoT hub. Any exception it raises is retried with backoff.
+        is_connected: Callable[[], bool]
+            Indicates whether the client is currently connected.
+        debug: bool
+            Indicates whether connection attempts should be printed.
+
+        Returns
+        -------
+        None
+        """
+
+        self.connect_attempts = 0
+        self.connect_failures = 0
+        self.reconnects = 0
+        self.last_outage: Optional[float] = None
+        self.longest_outage = 0.0
+        self.total_outage = 0.0
+
+        self._connect = connect
+        self._is_connected = is_connected
+        self._debug = debug
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake_event: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        # The monotonic time the current outage was noticed at
+        self._outage_start: Optional[float] = None
+
+    def start(self) -> None:
+        """
+        Starts connecting and supervising the connection on the running event loop.
+
+        Returns
+        -------
+        None
+        """
+
+        if self._task is not None:
+            return
+
+        self._loop = asyncio.get_running_loop()
+        self._wake_event = asyncio.Event()
+        self._task = asyncio.create_task(self._supervise())
+
+    def notify(self) -> None:
+        """
+        Wakes the supervisor to check the connection right away. Safe to call from the
+        IoT hub client's handler thread, it's used as the client's connection state
+        change handler.
+
+        Returns
+        -------
+        None
+        """
+
+        if self._loop is None:
+            return
+
+        try:
+            self._loop.call_soon_threadsafe(self._wake_event.set)
+        except RuntimeError:
+            # The loop is closed, the farm is shutting down
+            pass
+
+    async def _sleep(self, seconds: float) -> None:
+        """
+        Sleeps until the delay elapsed or the supervisor is woken up.
+
+        Parameters
+        ----------
+        seconds: float
+            The maximum number of seconds to sleep.
+
+        Returns
+        -------
+        None
+        """
+
+        try:
+            await asyncio.wait_for(self._wake_event.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+        self._wake_event.clear()
+
+    async def _supervise(self) -> None:
+        """
+        Connects, then reconnects every time the connection drops, until closed.
+
+        Returns
+        -------
+        None
+        """
+
+        connected_once = False
+        while not self._closing:
+            if connected_once and self._is_connected():
+                await self._sleep(ConnectionSupervisor.POLL_INTERVAL)
+                continue
+
+            if connected_once:
+                self._outage_start = monotonic()
+                if self._debug:
+                    print("Connection lost, reconnecting")
+
+            # The first attempt is immediate, the next ones back off
+            backoff = ConnectionSupervisor.INITIAL_BACKOFF
+            while not self._closing:
+                self.connect_attempts += 1
+                delay = uniform(0, backoff)
+                try:
+                    await self._connect()
+                    break
+                except ConnectionManager.SEND_ERRORS as e:
+                    if self._debug:
+                        print(f"Failed to connect: {e}, retrying in {delay:.1f} seconds")
+                except Exception as e:
+                    # Anything else, like bad credentials or a malformed twin, is retried
+                    # too so supervision never stops
+                    print(f"Unexpected error while connecting: {e!r}, retrying in "
+                          f"{delay:.1f} seconds")
+
+                self.connect_failures += 1
+                await asyncio.sleep(delay)
+                backoff = min(backoff * ConnectionSupervisor.BACKOFF_FACTOR,
+                              ConnectionSupervisor.MAX_BACKOFF)
+
+            if self._closing:
+                return
+            if connected_once:
+                self._record_outage(monotonic() - self._outage_start)
+            connected_once = True
+
+    def _record_outage(self, duration: float) -> None:
+        """
+        Records a reconnect and the outage before it.
+
+        Parameters
+        ----------
+        duration: float
+            The number of seconds the connection was down.
+
+        Returns
+        -------
+        None
+        """
+
+        self.reconnects += 1
+        self.last_outage = duration
+        self.longest_outage = max(self.longest_outage, duration)
+        self.total_outage += duration
+        self._outage_start = None
+        if self._debug:
+            print(f"Reconnected after {duration:.1f} seconds")
+
+    @property
+    def current_outage(self) -> Optional[float]:
+        """
+        The number of seconds since the connection dropped.
+
+        Returns
+        -------
+        float, optional
+            The duration of the current outage, None if the connection is up.
+        """
+
+        if self._outage_start is None:
+            return None
+        return monotonic() - self._outage_start
+
+    def to_dict(self) -> dict:
+        """
+        Creates a dictionary of the connection statistics.
+
+        Returns
+        -------
+        dict
+            The number of reconnects and connection attempts and the outage durations in
+            seconds.
+        """
+
+        return {
+            "reconnects": self.reconnects,
+            "connect_attempts": self.connect_attempts,
+            "connect_failures": self.connect_failures,
+            "current_outage": self.current_outage,
+            "last_outage": self.last_outage,
+            "longest_outage": self.longest_outage,
+            "total_outage": self.total_outage
+        }
+
+    async def close(self) -> None:
+        """
+        Stops supervising the connection.
+
+        Returns
+        -------
+        None
+        """
+
+        if self._task is not None:
+            # The flag stops the loop even if the cancellation is lost in a wait_for
+            # which completes at the same time
+            self._closing = True
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
 class ConnectionManager:
     """A wrapper for all logic related to the connection to the IoT hub."""
 
     DEFAULT_TELEMETRY_INTERVAL = 5
-
-    def __init__(self, farm: Farm, debug: bool = False) -> None:
+    # The number of seconds a telemetry window may end early, so the tick which lands on
+    # the end of the window isn't missed because of scheduling jitter
+    WINDOW_TOLERANCE = 0.05
+    # The number of buffered messages read from disk at a time while draining the buffer
+    DRAIN_BATCH_SIZE = 20
+    # The errors which mean a message could not be sent and should be buffered
+    SEND_ERRORS = (ClientError, OperationCancelled, OperationTimeout)
+
+    # Device twin property names
+    TELEMETRY_INTERVAL = "telemetryInterval"
+    SAMPLING_INTERVALS = "samplingIntervals"
+    TELEMETRY_ENCODING = "telemetryEncoding"
+    AGGREGATED_TYPES = "aggregatedTypes"
+    DEADBANDS = "deadbands"
+    NOISE_ALARM_THRESHOLD = "noiseAlarmThreshold"
+    DEADBAND_MAX_SILENCE = "deadbandMaxSilence"
+    HEALTH_INTERVAL = "healthInterval"
+    HEALTH_REPORT_INTERVAL = "healthReportInterval"
+    # The reported property containing the health summary
+    HEALTH = "health"
+    # The wire formats which can be selected with the telemetryEncoding property. The
+    # mobile app only reads json, binary telemetry needs a cloud side decoder like
+    # telemetry.codec.decode.
+    ENCODINGS = {
+        JsonEncoding.name: JsonEncoding,
+        BinaryEncoding.name: BinaryEncoding
+    }
+    # Batch flush policy properties, with the batcher attribute each one sets, the value
+    # used when the property is removed and the types of value accepted. Counts must be
+    # whole numbers.
+    BATCH_POLICY = {
+        "batchMaxCycles": ("max_cycles", TelemetryBatcher.DEFAULT_MAX_CYCLES, (int,)),
+        "batchMaxSeconds": ("max_seconds", TelemetryBatcher.DEFAULT_MAX_SECONDS,
+                            (int, float)),
+        "batchMaxBytes": ("max_bytes", TelemetryBatcher.DEFAULT_MAX_BYTES, (int,))
+    }
+    # The mobile app decompresses gzip, zstd needs a cloud side decoder
+    TELEMETRY_COMPRESSION = "telemetryCompression"
+    COMPRESSION_THRESHOLD = "compressionThreshold"
+    # A zstd dictionary trained on typical payloads, used when it exists. The cloud side
+    # needs the same dictionary to decompress the messages.
+    ZSTD_DICTIONARY_PATH = "telemetry.zstd.dict"
+    # The reported property explaining why the zstd dictionary isn't used, None when it is
+    # or when there is none
+    COMPRESSION_DICTIONARY_ERROR = "compressionDictionaryError"
+
+    # Readings sent right away on the high priority lane when their value is true, unless
+    # their sensor already published them as events
+    PRIORITY_TYPES = (Reading.Type.MOTION, Reading.Type.DOOR_OPENED)
+    # Noise readings crossing above this many decibels are also sent right away
+    DEFAULT_NOISE_ALARM_THRESHOLD = 70
+    # The custom message property which marks messages sent on the high priority lane
+    PRIORITY_PROPERTIES = {"priority": "high"}
+    # The number of messages sent at the same time on each lane. The bulk lane sends one
+    # at a time so routine telemetry stays in order.
+    HIGH_LANE_CONCURRENCY = 2
+    BULK_LANE_CONCURRENCY = 1
+
+    # The direct method response of each command status, as (status, payload). Commands
+    # which time out keep executing so they are reported as pending.
+    COMMAND_RESPONSES = {
+        Command.Status.APPLIED: (200, None),
+        Command.Status.REJECTED: (400, {"details": "Invalid value for this actuator"}),
+        Command.Status.TIMED_OUT: (202, {"details": "Command pending"}),
+        Command.Status.FAILED: (500, {"details": "The actuator failed to execute the command"})
+    }
+    # Command statuses from best to worst, the worst status of a bulk request is returned
+    COMMAND_SEVERITY = (Command.Status.APPLIED, Command.Status.TIMED_OUT,
+                        Command.Status.REJECTED, Command.Status.FAILED)
+
+    # Direct methods handled by the connection manager rather than an actuator
+    IS_ONLINE = "is_online"
+    APPLY_COMMANDS = "apply-commands"
+    APPLY_COMMANDS_SCHEMA = {
+        "type": "object",
+        "properties": {
+            "commands": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {"type": {"type": "string"}, "value": {}},
+                    "required": ["type", "value"]
+                }
+            },
+            "wait": {"type": "boolean"}
+        },
+        "required": ["commands"]
+    }
+    # The reported property which advertises the direct methods and their schemas
+    DIRECT_METHODS = "directMethods"
+
+    def __init__(self, farm: Farm, debug: bool = False,
+                 client: Optional[IoTHubDeviceClient] = None,
+                 buffer: Optional[TelemetryBuffer] = None) -> None:
         """
         Constructor for ConnectionManager and initializes an internal cloud gateway client.
 
@@ -100,6 +454,12 @@ class ConnectionManager:
             The farm this connection manager is working within.
         debug: bool
             Indicates whether the connection manager should be run in debug / verbose mode.
+        client: IoTHubDeviceClient, optional
+            The client used to talk to the IoT hub. Created from the connection string in
+            the .env file if None. Used to run against a local fake of the hub.
+        buffer: TelemetryBuffer, optional
+            The buffer which stores telemetry while the hub can't be reached. Opens the
+            default on-disk buffer if None.
 
         Returns
         -------
@@ -107,12 +467,59 @@ class ConnectionManager:
         """
 
         self._telemetry_interval = ConnectionManager.DEFAULT_TELEMETRY_INTERVAL
+        self._sampling_intervals: dict[Reading.Type, float] = {}
+        # Off by default since the mobile app expects raw readings
+        self._aggregated_types: set[Reading.Type] = set()
+        self._deadbands = dict(DeadbandFilter.DEFAULT_DEADBANDS)
+        self._deadband_max_silence = DeadbandFilter.DEFAULT_MAX_SILENCE
+        self._noise_alarm_threshold = ConnectionManager.DEFAULT_NOISE_ALARM_THRESHOLD
+        self._noise_alarm = False
+        # Health messages are off until the device twin sets an interval
+        self._health_interval: Optional[float] = None
+        self._health_report = HealthReport()
+        # Twin patches arrive on the client's handler thread and are applied on the loop
+        self._twin_patches = TwinPatchPipeline(self._apply_twin_patch,
+                                               self._report_properties)
         self._debug = debug
         self._connected = False
-        self._config: ConnectionConfig = self._load_connection_config()
-        self._client = IoTHubDeviceClient.create_from_connection_string(
-            self._config._device_connection_str)
+        if client is None:
+            self._config: ConnectionConfig = self._load_connection_config()
+            client = IoTHubDeviceClient.create_from_connection_string(
+                self._config._device_connection_str)
+        self._client = client
         self._farm = farm
+        # The priority types which are only polled, the others are sent as events
+        self._alarm_types = set(ConnectionManager.PRIORITY_TYPES) - farm.event_types
+        self._supervisor = ConnectionSupervisor(self.connect, lambda: self._client.connected,
+                                                debug)
+
+        self._encoding = JsonEncoding()
+        self._batcher = TelemetryBatcher(encoding=self._encoding)
+        # The routine readings of the current telemetry interval. Sensors sampled faster
+        # than the telemetry interval add to the window, which is sent as a single cycle
+        # when the interval ends.
+        self._window: Dict[str, List[Reading]] = {}
+        self._window_start: Optional[float] = None
+        self._window_end: Optional[float] = None
+        self._compressor = Compressor()
+        self._buffer = buffer if buffer is not None else TelemetryBuffer()
+        self._drain_lock = asyncio.Lock()
+        # Commands executing after their direct method was answered
+        self._pending_commands: set[asyncio.Task] = set()
+        # The direct methods advertised by the actuators, keyed by method name and by
+        # command type. Built when connecting.
+        self._direct_methods: Dict[str, DirectMethod] = {}
+        self._command_methods: Dict[str, DirectMethod] = {}
+        self._send_failures = 0
+        # Reset by every successful send, reported in the health summary
+        self._consecutive_send_failures = 0
+        self._last_send_time: Optional[float] = None
+
+        # Alarms never wait behind routine telemetry
+        self._high_lane = SendLane("high", self._send_priority,
+                                   ConnectionManager.HIGH_LANE_CONCURRENCY)
+        self._bulk_lane = SendLane("bulk", self.send_the_d2c_message,
+                                   ConnectionManager.BULK_LANE_CONCURRENCY)
 
     def _load_connection_config(self) -> ConnectionConfig:
         """
@@ -148,7 +555,8 @@ class ConnectionManager:
     async def connect(self) -> None:
         """
         Connects to cloud gateway using connection credentials and setups message and
-        device twin update handlers.
+        device twin update handlers. Also used to reconnect, in which case the desired
+        properties missed while offline are applied and anything buffered is sent.
 
         Returns
         -------
@@ -161,31 +569,399 @@ class ConnectionManager:
         if self._debug:
             print("Connected")
 
-        # Initialize the the telemetry interval
-        TELEMETRY_INTERVAL = "telemetryInterval"
+        # Initialize the telemetry interval and sampling intervals
         twin = await self._client.get_twin()
-        try:
-            self._telemetry_interval = twin["desired"][TELEMETRY_INTERVAL]
-        except KeyboardInterrupt:
-            pass
+        reported = self._apply_twin_patch(twin["desired"])
+        # Problems found while applying them are reported so they are seen from the cloud
+        if ConnectionManager.COMPRESSION_DICTIONARY_ERROR in reported:
+            self._twin_patches.report({
+                ConnectionManager.COMPRESSION_DICTIONARY_ERROR:
+                    reported[ConnectionManager.COMPRESSION_DICTIONARY_ERROR]
+            })
+
+        # Set the twin update handler on the client. Patches are applied on the farm's
+        # event loop once start_twin_patches is called.
+        self._client.on_twin_desired_properties_patch_received = self._twin_patches.submit
+        self._client.on_connection_state_change = self._supervisor.notify
+
+        # Set the method request handler on the client
+        if not self._direct_methods:
+            self._build_direct_methods()
+        self._client.on_method_request_received = self._direct_method_request_handler
+        await self._client.patch_twin_reported_properties(
+            {ConnectionManager.DIRECT_METHODS: self.direct_method_schemas})
+
+        # Send anything which was reported or buffered while the device was offline
+        self._twin_patches.retry()
+        await self.drain_buffer()
+
+    def supervise(self) -> None:
+        """
+        Connects to the IoT hub in the background on the running event loop and
+        reconnects whenever the connection drops. Telemetry sent in the meantime is
+        buffered.
+
+        Returns
+        -------
+        None
+        """
+
+        self._supervisor.start()
+
+    def _apply_desired_properties(self, desired: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Applies the desired properties of the device twin. The desired properties can
+        either be the full set of desired properties or a patch.
+
+        Parameters
+        ----------
+        desired: dict
+            The desired properties or desired properties patch from the device twin.
+
+        Returns
+        -------
+        dict
+            The reported properties which changed as a result of the desired properties.
+        """
 
-        # Define behavior for receiving a twin patch
-        def twin_patch_handler(patch):
-            # update telemetry interval if need be
-            if TELEMETRY_INTERVAL in patch:
-                self._telemetry_interval = patch[TELEMETRY_INTERVAL]
-                # _ = stopped static type checker from complaining.
-                asyncio.run(self._client.patch_twin_reported_properties(
-                    {TELEMETRY_INTERVAL: self._telemetry_interval}))
+        reported = {}
+
+        # update telemetry interval if need be, None means back to the default
+        if ConnectionManager.TELEMETRY_INTERVAL in desired:
+            value = desired[ConnectionManager.TELEMETRY_INTERVAL]
+            if value is None:
+                value = ConnectionManager.DEFAULT_TELEMETRY_INTERVAL
+            if not isinstance(value, bool) and isinstance(value, (int, float)) and value > 0:
+                self._telemetry_interval = value
+                reported[ConnectionManager.TELEMETRY_INTERVAL] = value
                 if self._debug:
                     print("New telemetry interval: {} seconds".format(
                         self._telemetry_interval))
 
-        # Set the twin update handler on the client
-        self._client.on_twin_desired_properties_patch_received = twin_patch_handler
+        # Twin patches only contain the reading types which changed, with None
+        # meaning the reading type's interval was removed. The whole property is None
+        # when it was deleted, which removes every interval.
+        intervals = desired.get(ConnectionManager.SAMPLING_INTERVALS, {})
+        if intervals is None:
+            self._sampling_intervals.clear()
+            reported[ConnectionManager.SAMPLING_INTERVALS] = None
+            if self._debug:
+                print("Sampling intervals removed")
+        elif isinstance(intervals, dict):
+            changes = {}
+            for type_name, interval in intervals.items():
+                try:
+                    reading_type = Reading.Type(type_name)
+                except ValueError:
+                    if self._debug:
+                        print(f"Ignoring sampling interval for unknown reading type {type_name}")
+                    continue
+
+                if interval is None:
+                    self._sampling_intervals.pop(reading_type, None)
+                elif not isinstance(interval, bool) and isinstance(interval, (int, float)) \
+                        and interval > 0:
+                    self._sampling_intervals[reading_type] = interval
+                else:
+                    continue
+                changes[type_name] = interval
+
+            if changes:
+                reported[ConnectionManager.SAMPLING_INTERVALS] = changes
+                if self._debug:
+                    print(f"New sampling intervals: {self._sampling_intervals}")
 
-        # Set the method request handler on the client
-        self._client.on_method_request_received = self._direct_method_request_handler
+        # The reading types sent as window summaries, None means none are aggregated
+        if ConnectionManager.AGGREGATED_TYPES in desired:
+            aggregated_types = set()
+            for type_name in desired[ConnectionManager.AGGREGATED_TYPES] or []:
+                try:
+                    aggregated_types.add(Reading.Type(type_name))
+                except ValueError:
+                    if self._debug:
+                        print(f"Ignoring aggregation of unknown reading type {type_name}")
+
+            self._aggregated_types = aggregated_types
+            reported[ConnectionManager.AGGREGATED_TYPES] = sorted(
+                reading_type.value for reading_type in aggregated_types)
+            if self._debug:
+                print(f"New aggregated types: {reported[ConnectionManager.AGGREGATED_TYPES]}")
+
+        # A deleted deadbands property puts back the default deadbands
+        deadbands = desired.get(ConnectionManager.DEADBANDS, {})
+        if deadbands is None:
+            self._deadbands = dict(DeadbandFilter.DEFAULT_DEADBANDS)
+            reported[ConnectionManager.DEADBANDS] = None
+            if self._debug:
+                print("Deadbands reset to the defaults")
+        elif isinstance(deadbands, dict):
+            changes = self._apply_deadbands(deadbands)
+            if changes:
+                reported[ConnectionManager.DEADBANDS] = changes
+
+        if ConnectionManager.DEADBAND_MAX_SILENCE in desired:
+            value = desired[ConnectionManager.DEADBAND_MAX_SILENCE]
+            if value is None:
+                value = DeadbandFilter.DEFAULT_MAX_SILENCE
+            if not isinstance(value, bool) and isinstance(value, (int, float)) and value > 0:
+                self._deadband_max_silence = value
+                reported[ConnectionManager.DEADBAND_MAX_SILENCE] = value
+                if self._debug:
+                    print(f"New deadband max silence: {value} seconds")
+
+        # update the health message interval, None turns health messages off
+        if ConnectionManager.HEALTH_INTERVAL in desired:
+            value = desired[ConnectionManager.HEALTH_INTERVAL]
+            if value is None or (not isinstance(value, bool) and
+                                 isinstance(value, (int, float)) and value > 0):
+                self._health_interval = value
+                reported[ConnectionManager.HEALTH_INTERVAL] = value
+                if self._debug:
+                    print(f"New health interval: {value} seconds")
+
+        # update the health summary rate limit, None means back to the default
+        if ConnectionManager.HEALTH_REPORT_INTERVAL in desired:
+            value = desired[ConnectionManager.HEALTH_REPORT_INTERVAL]
+            if value is None:
+                value = HealthReport.DEFAULT_INTERVAL
+            if not isinstance(value, bool) and isinstance(value, (int, float)) and value > 0:
+                self._health_report.interval = value
+                reported[ConnectionManager.HEALTH_REPORT_INTERVAL] = value
+                if self._debug:
+                    print(f"New health report interval: {value} seconds")
+
+        if ConnectionManager.NOISE_ALARM_THRESHOLD in desired:
+            value = desired[ConnectionManager.NOISE_ALARM_THRESHOLD]
+            if value is None:
+                value = ConnectionManager.DEFAULT_NOISE_ALARM_THRESHOLD
+            if not isinstance(value, bool) and isinstance(value, (int, float)):
+                self._noise_alarm_threshold = value
+                reported[ConnectionManager.NOISE_ALARM_THRESHOLD] = value
+                if self._debug:
+                    print(f"New noise alarm threshold: {value} dB")
+
+        # update the wire format, None means back to the default
+        if ConnectionManager.TELEMETRY_ENCODING in desired:
+            name = desired[ConnectionManager.TELEMETRY_ENCODING] or JsonEncoding.name
+            if name in ConnectionManager.ENCODINGS:
+                self._encoding = ConnectionManager.ENCODINGS[name]()
+                reported[ConnectionManager.TELEMETRY_ENCODING] = name
+                if self._debug:
+                    print(f"New telemetry encoding: {name}")
+
+        # update the compression stage, None means no compression / the default threshold
+        if ConnectionManager.TELEMETRY_COMPRESSION in desired or \
+                ConnectionManager.COMPRESSION_THRESHOLD in desired:
+            reported.update(self._apply_compression(desired))
+
+        # update the batch flush policy
+        for property_name, (attribute, default, types) in \
+                ConnectionManager.BATCH_POLICY.items():
+            if property_name not in desired:
+                continue
+
+            value = desired[property_name]
+            if value is None:
+                value = default
+            elif isinstance(value, bool) or not isinstance(value, types) or value <= 0:
+                if self._debug:
+                    print(f"Ignoring invalid {property_name}: {value}")
+                continue
+
+            setattr(self._batcher, attribute, value)
+            reported[property_name] = value
+            if self._debug:
+                print(f"New {property_name}: {value}")
+
+        return reported
+
+    def _apply_twin_patch(self, patch: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Applies a desired properties patch on the event loop and lets the farm pick up
+        new intervals right away instead of after its current sleep.
+
+        Parameters
+        ----------
+        patch: dict
+            The desired properties patch from the device twin.
+
+        Returns
+        -------
+        dict
+            The reported properties which changed as a result of the patch.
+        """
+
+        reported = self._apply_desired_properties(patch)
+        if reported:
+            self._farm.reschedule()
+        return reported
+
+    async def _report_properties(self, reported: Dict[str, Any]) -> bool:
+        """
+        Sends reported properties to the device twin.
+
+        Parameters
+        ----------
+        reported: dict
+            The reported properties which changed.
+
+        Returns
+        -------
+        bool
+            True if the reported properties were sent, false otherwise.
+        """
+
+        if self._debug:
+            print(f"Reporting properties: {reported}")
+        try:
+            await self._client.patch_twin_reported_properties(reported)
+        except ConnectionManager.SEND_ERRORS as e:
+            if self._debug:
+                print(f"Failed to report properties: {e}")
+            return False
+
+        return True
+
+    def _apply_deadbands(self, deadbands: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Applies the deadbands property of the device twin. Like the sampling intervals,
+        patches only contain the reading types which changed and None removes a reading
+        type's deadband so every one of its readings is sent.
+
+        Parameters
+        ----------
+        deadbands: dict
+            The deadband of each reading type, as {"absolute": ..., "percentage": ...}.
+
+        Returns
+        -------
+        dict
+            The deadbands which changed.
+        """
+
+        changes = {}
+        for type_name, deadband in deadbands.items():
+            try:
+                reading_type = Reading.Type(type_name)
+            except ValueError:
+                if self._debug:
+                    print(f"Ignoring deadband for unknown reading type {type_name}")
+                continue
+
+            if deadband is None:
+                self._deadbands.pop(reading_type, None)
+                changes[type_name] = None
+                continue
+
+            if not isinstance(deadband, dict):
+                continue
+            thresholds = (deadband.get("absolute"), deadband.get("percentage"))
+            if any(threshold is not None and (
+                    isinstance(threshold, bool) or
+                    not isinstance(threshold, (int, float)) or threshold < 0)
+                   for threshold in thresholds):
+                continue
+            absolute, percentage = thresholds
+
+            self._deadbands[reading_type] = Deadband(absolute, percentage)
+            changes[type_name] = self._deadbands[reading_type].to_dict()
+
+        if changes and self._debug:
+            print(f"New deadbands: {changes}")
+
+        return changes
+
+    def _apply_compression(self, desired: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Applies the compression properties of the device twin.
+
+        Parameters
+        ----------
+        desired: dict
+            The desired properties or desired properties patch from the device twin.
+
+        Returns
+        -------
+        dict
+            The compression properties which changed.
+        """
+
+        reported = {}
+        algorithm = self._compressor.algorithm
+        threshold = self._compressor.threshold
+
+        if ConnectionManager.TELEMETRY_COMPRESSION in desired:
+            value = desired[ConnectionManager.TELEMETRY_COMPRESSION] or Compressor.NONE
+            if value in Compressor.available_algorithms():
+                algorithm = value
+                reported[ConnectionManager.TELEMETRY_COMPRESSION] = value
+            elif self._debug:
+                print(f"Compression {value} is not available on this device")
+
+        if ConnectionManager.COMPRESSION_THRESHOLD in desired:
+            value = desired[ConnectionManager.COMPRESSION_THRESHOLD]
+            if value is None:
+                value = Compressor.DEFAULT_THRESHOLD
+            if not isinstance(value, bool) and isinstance(value, int) and value >= 0:
+                threshold = value
+                reported[ConnectionManager.COMPRESSION_THRESHOLD] = value
+
+        if reported:
+            dictionary = None
+            dictionary_error = None
+            if algorithm == Compressor.ZSTD and isfile(ConnectionManager.ZSTD_DICTIONARY_PATH):
+                try:
+                    with open(ConnectionManager.ZSTD_DICTIONARY_PATH, "rb") as dictionary_file:
+                        dictionary = dictionary_file.read()
+                    self._compressor = Compressor(algorithm, threshold, dictionary)
+                except Exception as e:
+                    # A bad dictionary mustn't keep the device from connecting, zstd works
+                    # without one
+                    dictionary_error = f"{ConnectionManager.ZSTD_DICTIONARY_PATH}: {e!r}"
+                    dictionary = None
+                    print(f"Not using the zstd dictionary, {dictionary_error}")
+
+            if dictionary is None:
+                self._compressor = Compressor(algorithm, threshold)
+            if algorithm == Compressor.ZSTD:
+                reported[ConnectionManager.COMPRESSION_DICTIONARY_ERROR] = dictionary_error
+            if self._debug:
+                print(f"New compression: {algorithm} above {threshold} bytes")
+
+        return reported
+
+    def _build_direct_methods(self) -> None:
+        """
+        Builds the table of direct methods from the methods advertised by the farm's
+        actuators.
+
+        Returns
+        -------
+        None
+        """
+
+        self._direct_methods = {}
+        self._command_methods = {}
+        for method in self._farm.direct_methods:
+            self._direct_methods[method.name] = method
+            self._command_methods.setdefault(method.command_type.value, method)
+
+    @property
+    def direct_method_schemas(self) -> Dict[str, Any]:
+        """
+        The payload schema of every direct method, in the format of the device twin.
+        Methods without a payload have a schema of None.
+
+        Returns
+        -------
+        dict
+            The schemas keyed by method name.
+        """
+
+        schemas = {name: method.schema for name, method in self._direct_methods.items()}
+        schemas[ConnectionManager.IS_ONLINE] = None
+        schemas[ConnectionManager.APPLY_COMMANDS] = ConnectionManager.APPLY_COMMANDS_SCHEMA
+        return schemas
 
     # Define behavior for handling methods
     async def _direct_method_request_handler(self, method_request: MethodRequest) -> None:
@@ -204,69 +980,152 @@ class ConnectionManager:
 
         """
 
-        # A dictionary to lookup direct messages from the iot hub.
-        # Each value is a tuple containing (payload, device_method)
-        # where device_method is the method which the iot hub wants this
-        # device to call.
-        method_responses_dict = {
-            'is_online': (None, None),
-            'buzzer-on': (None, lambda state: self._farm.control_subsystems(Command(
-                Command.Type.BUZZER, Command.Unit.BOOL, state)
-            )),
-            'door-lock': (None, lambda state: self._farm.control_subsystems(Command(
-                Command.Type.MICRO_SERVO_MOTOR, Command.Unit.BOOL, state)
-            )),
-            'fan-on': (None, lambda state: self._farm.control_subsystems(Command(
-                Command.Type.FAN, Command.Unit.BOOL, state)
-            )),
-            'led-on': (None, lambda state: self._farm.control_subsystems(Command(
-                Command.Type.RGB_LED_STICK, Command.Unit.BOOL, state)
-            )),
-
-        }
-
         # Determine how to respond to the method request based on the method name
-        try:
-            payload, method = method_responses_dict[method_request.name]
-            status = 200
-            if self._debug:
-                print("executed method: " + method_request.name)
-
-            if method is not None:
-                # Call the method with the value from the payload if the method exists
-                # Respond with 400 if the payload is invalid.
-                try:
-                    state = method_request.payload["value"]
-                    method(state)
-
-                    # Display the new state
-                    print(f"{method_request.name} set to {state}")
-                except KeyError:
-                    status = 400
-                    payload = {"details": "No value was found in the payload"}
-                except Exception as e:
-                    status = 400
-                    payload = {"details": f"Invalid payload {e}"}
-        except KeyError:
+        name = method_request.name
+        if name not in self._direct_methods and name not in (
+                ConnectionManager.IS_ONLINE, ConnectionManager.APPLY_COMMANDS):
             # set response for unknown methods
             status = 400
             payload = {"details": "method name unknown"}
             if self._debug:
-                print("executed unknown method: " + method_request.name)
+                print("executed unknown method: " + name)
+        else:
+            if self._debug:
+                print("executed method: " + name)
+
+            if name == ConnectionManager.IS_ONLINE:
+                status, payload = 200, None
+            elif name == ConnectionManager.APPLY_COMMANDS:
+                status, payload = await self._apply_commands(method_request.payload)
+            else:
+                status, payload = await self._apply_command(
+                    self._direct_methods[name], method_request.payload)
 
         # Send the response
         method_response = MethodResponse.create_from_method_request(
             method_request, status, payload)
         await self._client.send_method_response(method_response)
 
-    async def send_the_d2c_message(self, telemetry: Dict[str, List[Any]]) -> None:
+    async def _apply_command(self, method: DirectMethod, payload: Any
+                             ) -> tuple[int, Optional[dict]]:
+        """
+        Executes the command of a direct method which controls a single actuator.
+
+        Parameters
+        ----------
+        method: DirectMethod
+            The direct method which was called.
+        payload: Any
+            The payload of the request.
+
+        Returns
+        -------
+        tuple[int, dict, optional]
+            The status and payload of the response.
+        """
+
+        # Respond with 400 if the payload is invalid.
+        error = method.validate(payload)
+        if error is not None:
+            return 400, {"details": error}
+
+        command = method.create_command(payload)
+        if payload.get("wait", True) is False:
+            # Respond right away and let the command execute in the background
+            self._execute_in_background([command])
+            return ConnectionManager.COMMAND_RESPONSES[Command.Status.TIMED_OUT]
+
+        # Respond once the actuator confirms the command
+        command_status, = await self._farm.execute_commands([command])
+        if command_status == Command.Status.APPLIED:
+            # Display the new state
+            print(f"{method.name} set to {command.value}")
+        return ConnectionManager.COMMAND_RESPONSES[command_status]
+
+    async def _apply_commands(self, payload: Any) -> tuple[int, Optional[dict]]:
         """
-        Sends telemetry data to the IoT Hub.
+        Executes the commands of an apply-commands direct method request. No command is
+        executed unless every command is valid.
 
         Parameters
         ----------
-        telemetry: dict
-            A dictionary containing telemetry data.
+        payload: Any
+            The payload of the request, containing a list of {"type", "value"} commands
+            where type is the value of a Command.Type.
+
+        Returns
+        -------
+        tuple[int, dict, optional]
+            The status and payload of the response. The status is the one of the worst
+            command status and the payload contains the status of each command.
+        """
+
+        if not isinstance(payload, dict) or not isinstance(payload.get("commands"), list) \
+                or not payload["commands"]:
+            return 400, {"details": "No commands were found in the payload"}
+        if not isinstance(payload.get("wait", True), bool):
+            return 400, {"details": "wait must be a boolean"}
+
+        commands = []
+        for index, command_payload in enumerate(payload["commands"]):
+            method = self._command_methods.get(command_payload.get("type")) \
+                if isinstance(command_payload, dict) else None
+            if method is None:
+                return 400, {"details": f"Unknown command type at index {index}"}
+
+            error = method.validate(command_payload)
+            if error is not None:
+                return 400, {"details": f"{error} at index {index}"}
+            commands.append(method.create_command(command_payload))
+
+        if payload.get("wait", True) is False:
+            self._execute_in_background(commands)
+            return ConnectionManager.COMMAND_RESPONSES[Command.Status.TIMED_OUT]
+
+        statuses = await self._farm.execute_commands(commands)
+        worst = max(statuses, key=ConnectionManager.COMMAND_SEVERITY.index)
+        status, _ = ConnectionManager.COMMAND_RESPONSES[worst]
+        return status, {"results": [command_status.value for command_status in statuses]}
+
+    def _execute_in_background(self, commands: List[Command]) -> None:
+        """
+        Executes commands without waiting for them.
+
+        Parameters
+        ----------
+        commands: list[Command]
+            The commands to execute.
+
+        Returns
+        -------
+        None
+        """
+
+        async def execute() -> None:
+            statuses = await self._farm.execute_commands(commands)
+            if self._debug:
+                for command, command_status in zip(commands, statuses):
+                    print(f"Background command {command} finished: {command_status.value}")
+
+        task = asyncio.get_running_loop().create_task(execute())
+        self._pending_commands.add(task)
+        task.add_done_callback(self._pending_commands.discard)
+
+    async def send_the_d2c_message(self, telemetry: Union[str, bytes],
+                                   content_type: Optional[str] = None,
+                                   content_encoding: Optional[str] = None) -> None:
+        """
+        Sends telemetry data to the IoT Hub. If the hub can't be reached the telemetry is
+        stored in the buffer and sent once the connection returns.
+
+        Parameters
+        ----------
+        telemetry: Union[str, bytes]
+            The serialized telemetry message.
+        content_type: str, optional
+            The content type of the message.
+        content_encoding: str, optional
+            The content encoding of the message.
 
         Returns
         -------
@@ -275,7 +1134,516 @@ class ConnectionManager:
         if self._debug:
             print(f"Sending Telemetry: {telemetry}")
 
-        await self._client.send_message(telemetry)
+        # Only send directly when nothing is buffered so messages stay in order
+        if len(self._buffer) == 0 and \
+                await self._try_send(telemetry, content_type, content_encoding):
+            return
+
+        self._buffer.push(telemetry, content_type, content_encoding)
+        await self.drain_buffer()
+
+    async def send_telemetry(self, readings_by_subsystem: Dict[str, List[Reading]]) -> None:
+        """
+        Adds the telemetry of a tick to the current telemetry window. Once the telemetry
+        interval ended, the window is encoded in the current wire format as one cycle and
+        added to the current batch, which is sent on the bulk lane if the flush policy
+        says it's due. Alarms should already be split off with split_alarms.
+
+        Parameters
+        ----------
+        readings_by_subsystem: dict[str, list[Reading]]
+            The readings of each subsystem keyed by subsystem name.
+
+        Returns
+        -------
+        None
+        """
+
+        if not readings_by_subsystem:
+            return
+
+        # Windows follow each other so telemetry keeps the telemetry interval's cadence
+        if self._window_start is None:
+            now = monotonic()
+            self._window_start = self._window_end if self._window_end is not None and \
+                now - self._window_end < self._telemetry_interval else now
+        for subsystem, readings in readings_by_subsystem.items():
+            self._window.setdefault(subsystem, []).extend(readings)
+
+        if self._window_due():
+            await self._end_window()
+
+    def _window_due(self) -> bool:
+        """
+        Checks whether the telemetry interval of the current window ended.
+
+        Returns
+        -------
+        bool
+            True if the window has readings and should be sent.
+        """
+
+        return self._window_start is not None and \
+            monotonic() - self._window_start >= \
+            self._telemetry_interval - ConnectionManager.WINDOW_TOLERANCE
+
+    async def _end_window(self) -> None:
+        """
+        Encodes the current telemetry window as one cycle, adds it to the current batch
+        and sends the batch if it's due.
+
+        Returns
+        -------
+        None
+        """
+
+        window, self._window = self._window, {}
+        self._window_start = None
+        self._window_end = monotonic()
+        if not window:
+            return
+
+        # Don't mix wire formats within a batch
+        if self._batcher.encoding.name != self._encoding.name:
+            payload = self._batcher.flush()
+            if payload is not None:
+                await self._send_batch(payload)
+            self._batcher.encoding = self._encoding
+
+        for payload in self._batcher.add(self._encoding.encode(window)):
+            await self._send_batch(payload)
+
+    def split_alarms(self, readings_by_subsystem: Dict[str, List[Reading]]
+                     ) -> tuple[Dict[str, List[Reading]], Dict[str, List[Reading]]]:
+        """
+        Separates the readings which should be sent on the high priority lane: detected
+        motion and opened doors which weren't already sent as events and noise crossing
+        above the alarm threshold. Must be given the raw readings, before they are
+        aggregated or filtered, so alarms are never held back or summarized.
+
+        Parameters
+        ----------
+        readings_by_subsystem: dict[str, list[Reading]]
+            The readings of each subsystem keyed by subsystem name.
+
+        Returns
+        -------
+        tuple[dict[str, list[Reading]], dict[str, list[Reading]]]
+            The alarms and the routine readings, both keyed by subsystem name.
+        """
+
+        alarms = {}
+        routine = {}
+        for subsystem, readings in readings_by_subsystem.items():
+            for reading in readings:
+                if reading.reading_type in self._alarm_types:
+                    alarm = reading.value is True
+                elif reading.reading_type == Reading.Type.NOISE and \
+                        isinstance(reading.value, (int, float)):
+                    loud = reading.value >= self._noise_alarm_threshold
+                    alarm = loud and not self._noise_alarm
+                    self._noise_alarm = loud
+                else:
+                    alarm = False
+
+                (alarms if alarm else routine).setdefault(subsystem, []).append(reading)
+
+        return alarms, routine
+
+    async def send_event(self, readings_by_subsystem: Dict[str, List[Reading]]) -> None:
+        """
+        Sends events on the high priority lane, in their own message instead of adding
+        them to the current batch.
+
+        Parameters
+        ----------
+        readings_by_subsystem: dict[str, list[Reading]]
+            The events of each subsystem keyed by subsystem name.
+
+        Returns
+        -------
+        None
+        """
+
+        payload, content_encoding = self._compressor.compress(
+            self._encoding.encode(readings_by_subsystem), self._encoding.content_encoding)
+        await self._high_lane.submit(payload, self._encoding.content_type, content_encoding)
+
+    async def send_health(self, health: Dict[str, Any]) -> None:
+        """
+        Sends a health message on the bulk lane. Health messages are always compact json
+        with a single Health key, so the cloud can tell them apart from telemetry.
+
+        Parameters
+        ----------
+        health: dict
+            The health statistics of the device.
+
+        Returns
+        -------
+        None
+        """
+
+        payload = dumps({"Health": health}, separators=(",", ":"))
+        await self._bulk_lane.submit(payload, JsonEncoding.content_type,
+                                     JsonEncoding.content_encoding)
+
+    @property
+    def health_report_due(self) -> bool:
+        """
+        Whether the health summary can be reported, which is at most once per health
+        report interval.
+
+        Returns
+        -------
+        bool
+            True if report_health would report the summary.
+        """
+
+        return self._health_report.is_due()
+
+    async def report_health(self, health: Dict[str, Any]) -> None:
+        """
+        Reports the health summary in the device twin if the health report interval
+        elapsed, along with the state of the outbound pipeline. Only the keys which
+        changed since the last report are sent. sendFailures is the number of sends which
+        failed since the last successful one, so it returns to 0 once the hub is reachable.
+
+        Parameters
+        ----------
+        health: dict
+            The health of the rest of the device, like the sensor error rates.
+
+        Returns
+        -------
+        None
+        """
+
+        if not self.is_connected or not self._health_report.is_due():
+            return
+
+        lanes = self.lane_stats
+        summary = {
+            "pendingTelemetry": len(self._buffer) + len(self._batcher) +
+            bool(self._window) + sum(lane["pending"] for lane in lanes.values()),
+            "lastSend": None if self._last_send_time is None else
+            str(datetime.fromtimestamp(round(self._last_send_time))),
+            "sendFailures": self._consecutive_send_failures,
+            "reconnects": self._supervisor.reconnects,
+            "lastOutage": None if self._supervisor.last_outage is None else
+            round(self._supervisor.last_outage),
+            **health
+        }
+
+        patch = self._health_report.changes(summary)
+        if not patch:
+            return
+
+        if self._debug:
+            print(f"Reporting health: {patch}")
+        try:
+            await self._client.patch_twin_reported_properties({ConnectionManager.HEALTH: patch})
+        except ConnectionManager.SEND_ERRORS as e:
+            self._health_report.invalidate()
+            if self._debug:
+                print(f"Failed to report health: {e}")
+
+    async def _send_priority(self, payload: Union[str, bytes], content_type: Optional[str],
+                             content_encoding: Optional[str]) -> None:
+        """
+        Sends a high priority message without waiting for buffered telemetry to be sent
+        first. The message is buffered if the hub can't be reached.
+
+        Parameters
+        ----------
+        payload: Union[str, bytes]
+            The serialized message.
+        content_type: str, optional
+            The content type of the message.
+        content_encoding: str, optional
+            The content encoding of the message.
+
+        Returns
+        -------
+        None
+        """
+
+        if self._debug:
+            print(f"Sending priority telemetry: {payload}")
+
+        if not await self._try_send(payload, content_type, content_encoding,
+                                    ConnectionManager.PRIORITY_PROPERTIES):
+            # Keep the routing tag so the alarm is still routed as one once drained
+            self._buffer.push(payload, content_type, content_encoding,
+                              ConnectionManager.PRIORITY_PROPERTIES)
+
+    async def flush_due_telemetry(self, force: bool = False) -> None:
+        """
+        Ends the current telemetry window if its interval ended and sends the current
+        batch if it has been open for longer than the flush policy allows. Should be
+        called regularly since windows and batches are otherwise only flushed when
+        telemetry is added.
+
+        Parameters
+        ----------
+        force: bool
+            Ends the current window and sends the current batch even if they aren't due.
+
+        Returns
+        -------
+        None
+        """
+
+        if force or self._window_due():
+            await self._end_window()
+
+        if force or self._batcher.is_due():
+            payload = self._batcher.flush()
+            if payload is not None:
+                await self._send_batch(payload)
+
+    async def _send_batch(self, payload: Union[str, bytes]) -> None:
+        """
+        Compresses a batched payload if it's large enough and sends it on the bulk lane
+        with the content properties of the batcher's encoding. Compressed payloads are
+        buffered compressed.
+
+        Parameters
+        ----------
+        payload: Union[str, bytes]
+            The batched payload.
+
+        Returns
+        -------
+        None
+        """
+
+        encoding = self._batcher.encoding
+        payload, content_encoding = self._compressor.compress(payload,
+                                                              encoding.content_encoding)
+        await self._bulk_lane.submit(payload, encoding.content_type, content_encoding)
+
+    async def _try_send(self, payload: Union[str, bytes], content_type: Optional[str],
+                        content_encoding: Optional[str],
+                        custom_properties: Optional[Dict[str, str]] = None) -> bool:
+        """
+        Attempts to send a message to the IoT hub.
+
+        Parameters
+        ----------
+        payload: Union[str, bytes]
+            The message to send.
+        content_type: str, optional
+            The content type of the message.
+        content_encoding: str, optional
+            The content encoding of the message.
+        custom_properties: dict[str, str], optional
+            Application properties of the message, which the IoT hub can route on.
+
+        Returns
+        -------
+        bool
+            True if the message was sent, False if the hub could not be reached.
+        """
+
+        if not self.is_connected:
+            return False
+
+        message = Message(payload, content_encoding=content_encoding,
+                          content_type=content_type)
+        if custom_properties:
+            message.custom_properties.update(custom_properties)
+        try:
+            await self._client.send_message(message)
+        except ConnectionManager.SEND_ERRORS as e:
+            self._send_failures += 1
+            self._consecutive_send_failures += 1
+            if self._debug:
+                print(f"Failed to send telemetry: {e}")
+            return False
+
+        self._consecutive_send_failures = 0
+        self._last_send_time = time()
+        return True
+
+    async def drain_buffer(self) -> None:
+        """
+        Sends buffered telemetry oldest first, in batches, until the buffer is empty or a
+        message fails to send.
+
+        Returns
+        -------
+        None
+        """
+
+        async with self._drain_lock:
+            while self.is_connected and len(self._buffer) > 0:
+                batch = self._buffer.peek(ConnectionManager.DRAIN_BATCH_SIZE)
+
+                sent = []
+                for message_id, payload, content_type, content_encoding, properties in batch:
+                    if not await self._try_send(payload, content_type, content_encoding,
+                                                properties):
+                        break
+                    sent.append(message_id)
+
+                self._buffer.remove(sent)
+                if len(sent) < len(batch):
+                    break
+
+                if self._debug:
+                    print(f"Sent {len(sent)} buffered messages, {len(self._buffer)} left")
+
+    def start_lanes(self) -> None:
+        """
+        Starts the workers of the outbound lanes on the running event loop. Until then
+        messages are sent by the caller.
+
+        Returns
+        -------
+        None
+        """
+
+        self._high_lane.start()
+        self._bulk_lane.start()
+
+    def start_twin_patches(self) -> None:
+        """
+        Starts applying device twin patches on the running event loop, including the
+        ones received since connecting.
+
+        Returns
+        -------
+        None
+        """
+
+        self._twin_patches.bind(asyncio.get_running_loop())
+
+    @property
+    def lane_stats(self) -> dict:
+        """
+        Queue depth and latency metrics of the outbound lanes.
+
+        Returns
+        -------
+        dict
+            The metrics of each lane keyed by lane name.
+        """
+
+        return {lane.name: lane.to_dict() for lane in (self._high_lane, self._bulk_lane)}
+
+    @property
+    def connection_stats(self) -> dict:
+        """
+        Reconnect counts and outage durations of the connection to the IoT hub.
+
+        Returns
+        -------
+        dict
+            The connection statistics, see ConnectionSupervisor.to_dict.
+        """
+
+        return self._supervisor.to_dict()
+
+    @property
+    def buffer_stats(self) -> dict:
+        """
+        Backpressure metrics of the offline telemetry buffer.
+
+        Returns
+        -------
+        dict
+            The buffer depth, size, eviction counts, total number of send failures and the
+            time of the last successful send.
+        """
+
+        stats = self._buffer.to_dict()
+        stats["send_failures"] = self._send_failures
+        stats["last_send_time"] = self._last_send_time
+        return stats
+
+    @property
+    def telemetry_interval(self) -> float:
+        """
+        The number of seconds between each telemetry message, set by the device twin.
+
+        Returns
+        -------
+        float
+            The telemetry interval in seconds.
+        """
+
+        return self._telemetry_interval
+
+    @property
+    def sampling_intervals(self) -> dict[Reading.Type, float]:
+        """
+        The number of seconds between each sample of a reading type, set by the device
+        twin. Reading types which are not in the dictionary use their sensor's default
+        sampling period.
+
+        Returns
+        -------
+        dict[Reading.Type, float]
+            The sampling interval in seconds of each configured reading type.
+        """
+
+        return self._sampling_intervals
+
+    @property
+    def aggregated_types(self) -> set[Reading.Type]:
+        """
+        The reading types which are sent as a summary per telemetry interval instead of
+        as individual readings, set by the device twin.
+
+        Returns
+        -------
+        set[Reading.Type]
+            The aggregated reading types.
+        """
+
+        return self._aggregated_types
+
+    @property
+    def deadbands(self) -> dict[Reading.Type, Deadband]:
+        """
+        The deadband of each reading type which is only sent when it changes, set by the
+        device twin.
+
+        Returns
+        -------
+        dict[Reading.Type, Deadband]
+            The deadbands keyed by reading type.
+        """
+
+        return self._deadbands
+
+    @property
+    def deadband_max_silence(self) -> float:
+        """
+        The number of seconds after which a reading is sent even if it's within its
+        deadband, set by the device twin.
+
+        Returns
+        -------
+        float
+            The max silence in seconds.
+        """
+
+        return self._deadband_max_silence
+
+    @property
+    def health_interval(self) -> Optional[float]:
+        """
+        The number of seconds between health messages, set by the device twin.
+
+        Returns
+        -------
+        float, optional
+            The interval in seconds, None if health messages are off.
+        """
+
+        return self._health_interval
 
     @property
     def is_connected(self) -> bool:
@@ -302,11 +1670,21 @@ class ConnectionManager:
 
         """
 
+        await self._supervisor.close()
+
+        # Send whatever is left in the current batch, or buffer it if offline
+        await self.flush_due_telemetry(force=True)
+        await self._twin_patches.close()
+        await self._high_lane.close()
+        await self._bulk_lane.close()
+
         try:
             await self._client.shutdown()
         except (ClientError, AttributeError):
             pass
 
+        self._buffer.close()
+
 
 if __name__ == "__main__":
 
@@ -1,13 +1,225 @@
 import asyncio
-import json
-from time import sleep
 from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from math import floor, sqrt
+from time import monotonic
+from typing import TYPE_CHECKING, Awaitable, Callable, Optional
 
+from subsystems.hardware import backend
 from subsystems.geo_location_controller import GeoLocationSubsystem
 from subsystems.security_controller import SecuritySubsystem
 from subsystems.plant_controller import PlantSubsystem
 from subsystems.interfaces.command import Command
+from subsystems.interfaces.direct_method import DirectMethod
+from subsystems.interfaces.events import EventChannel
+from subsystems.interfaces.reading import Reading
+from subsystems.instrumentation import Instrumentation
 from subsystems.subsystem import Subsystem
+from telemetry.aggregation import WindowAggregator
+from telemetry.buffer import TelemetryBuffer
+from telemetry.deadband import DeadbandFilter
+from telemetry.metrics import MetricsServer
+
+if TYPE_CHECKING:
+    from azure.iot.device.aio import IoTHubDeviceClient
+
+
+class TickStats:
+    """
+    Running statistics about the ticks of a TelemetryScheduler. Latency is how late a tick
+    started compared to its deadline and jitter is the standard deviation of that latency.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initializes empty tick statistics.
+
+        Returns
+        -------
+        None
+        """
+
+        self.ticks = 0
+        self.overruns = 0
+        # Ticks which raised an exception
+        self.errors = 0
+        self.max_latency = 0.0
+        self.last_duration = 0.0
+        self._mean_latency = 0.0
+        self._latency_m2 = 0.0
+
+    def record(self, latency: float, duration: float) -> None:
+        """
+        Records a single tick.
+
+        Parameters
+        ----------
+        latency: float
+            The number of seconds between the tick's deadline and the moment it started.
+        duration: float
+            The number of seconds the tick took to run.
+
+        Returns
+        -------
+        None
+        """
+
+        # Welford's algorithm so the jitter can be updated without storing every tick
+        self.ticks += 1
+        delta = latency - self._mean_latency
+        self._mean_latency += delta / self.ticks
+        self._latency_m2 += delta * (latency - self._mean_latency)
+
+        self.max_latency = max(self.max_latency, latency)
+        self.last_duration = duration
+
+    @property
+    def mean_latency(self) -> float:
+        """
+        The average number of seconds a tick started after its deadline.
+
+        Returns
+        -------
+        float
+            The mean tick latency in seconds.
+        """
+
+        return self._mean_latency
+
+    @property
+    def jitter(self) -> float:
+        """
+        The standard deviation of the tick latency.
+
+        Returns
+        -------
+        float
+            The tick jitter in seconds.
+        """
+
+        if self.ticks < 2:
+            return 0.0
+        return sqrt(self._latency_m2 / (self.ticks - 1))
+
+    def to_dict(self) -> dict:
+        """
+        Creates a dictionary containing all the tick statistics.
+
+        Returns
+        -------
+        dict
+            The tick statistics keyed by name.
+        """
+
+        return {
+            "ticks": self.ticks,
+            "overruns": self.overruns,
+            "errors": self.errors,
+            "mean_latency": self.mean_latency,
+            "max_latency": self.max_latency,
+            "jitter": self.jitter,
+            "last_duration": self.last_duration
+        }
+
+
+class TelemetryScheduler:
+    """
+    Runs a coroutine on a fixed cadence. Deadlines are computed from the previous deadline
+    rather than from the moment the previous tick finished, so a slow tick does not push
+    every later tick back. Ticks which are missed entirely are skipped and counted as
+    overruns instead of being run back to back.
+    """
+
+    def __init__(self, tick: Callable[[], Awaitable[None]],
+                 interval: Callable[[], float]) -> None:
+        """
+        Initializes the scheduler.
+
+        Parameters
+        ----------
+        tick: Callable[[], Awaitable[None]]
+            The coroutine function to call on every tick.
+        interval: Callable[[], float]
+            Returns the number of seconds between ticks. Called after every tick so the
+            interval can be changed while the scheduler is running.
+
+        Returns
+        -------
+        None
+        """
+
+        self._tick = tick
+        self._interval = interval
+        self._stop_event = asyncio.Event()
+        self._wake_event = asyncio.Event()
+        self.stats = TickStats()
+
+    async def run(self) -> None:
+        """
+        Runs ticks until stop is called. Exceptions raised by a tick are counted and
+        printed, a failing tick doesn't stop the ticks after it.
+
+        Returns
+        -------
+        None
+        """
+
+        loop = asyncio.get_running_loop()
+        self._stop_event.clear()
+        self._wake_event.clear()
+        deadline = loop.time()
+
+        while not self._stop_event.is_set():
+            started = loop.time()
+            try:
+                await self._tick()
+            except Exception as e:
+                self.stats.errors += 1
+                print(f"Telemetry tick failed: {e!r}")
+            finished = loop.time()
+            self.stats.record(started - deadline, finished - started)
+
+            # Skip every deadline which has already passed
+            interval = self._interval()
+            deadline += interval
+            if finished >= deadline:
+                missed = floor((finished - deadline) / interval) + 1
+                deadline += missed * interval
+                self.stats.overruns += missed
+
+            # Sleep until the next deadline unless the scheduler is stopped first. When
+            # rescheduled, the deadline moves up to one new interval after the last tick.
+            while not self._stop_event.is_set():
+                try:
+                    await asyncio.wait_for(self._wake_event.wait(), deadline - loop.time())
+                except asyncio.TimeoutError:
+                    break
+                self._wake_event.clear()
+                deadline = min(deadline, started + self._interval())
+
+    def stop(self) -> None:
+        """
+        Stops the scheduler after the current tick.
+
+        Returns
+        -------
+        None
+        """
+
+        self._stop_event.set()
+        self._wake_event.set()
+
+    def reschedule(self) -> None:
+        """
+        Recomputes the next deadline with the current interval. Only brings the next tick
+        closer, a longer interval takes effect after the next tick.
+
+        Returns
+        -------
+        None
+        """
+
+        self._wake_event.set()
 
 
 class Farm:
@@ -16,7 +228,18 @@ class Farm:
     connection to the cloud
     """
 
-    def __init__(self, debug: bool = False) -> None:
+    # The maximum number of sensors which can be read at the same time
+    MAX_READ_WORKERS = 8
+    # The maximum number of actuators which can be controlled at the same time
+    MAX_ACTUATOR_WORKERS = 4
+    # The number of seconds to wait for an actuator to execute a command
+    COMMAND_TIMEOUT = 5
+
+    def __init__(self, debug: bool = False, concurrent_reads: bool = True,
+                 client: Optional["IoTHubDeviceClient"] = None,
+                 buffer: Optional[TelemetryBuffer] = None,
+                 metrics_port: Optional[int] = None,
+                 metrics_host: str = MetricsServer.DEFAULT_HOST) -> None:
         """
         Initializes all the subsystems and the connection to the cloud.
 
@@ -24,6 +247,19 @@ class Farm:
         ----------
         debug: bool
             Represents whether the farm should be run in debug / verbose mode.
+        concurrent_reads: bool
+            Represents whether the sensors should be read at the same time on a thread
+            pool rather than one after the other.
+        client: IoTHubDeviceClient, optional
+            The client used to talk to the IoT hub, see ConnectionManager.
+        buffer: TelemetryBuffer, optional
+            The buffer which stores telemetry while offline, see ConnectionManager.
+        metrics_port: int, optional
+            The port the peripheral metrics are served on in the Prometheus text format.
+            The metrics aren't served if None.
+        metrics_host: str
+            The address the metrics are served on. Only reachable from the device itself
+            by default.
 
         Returns
         -------
@@ -36,42 +272,249 @@ class Farm:
             PlantSubsystem()
         ]
 
-        self._connection_manager = ConnectionManager(self, debug)
-        asyncio.run(self._connection_manager.connect())
+        # The subsystems which handle each type of command
+        self._command_index: dict[Command.Type, list[Subsystem]] = {}
+        for subsystem in self._subsystems:
+            for command_type in subsystem.command_types:
+                self._command_index.setdefault(command_type, []).append(subsystem)
+
+        self._debug = debug
+        self._events = EventChannel()
+        # Sends the events as they are published, while the farm runs
+        self._events_task: Optional[asyncio.Task] = None
+        # Batches of events which failed to send
+        self.event_errors = 0
+        self._instrumentation = Instrumentation()
+        for subsystem in self._subsystems:
+            subsystem.set_event_channel(self._events)
+            subsystem.set_instrumentation(self._instrumentation)
+        self._last_health = monotonic()
+        # The read and failure counts of each sensor class at the last health report
+        self._reported_failures: dict[str, tuple[int, int]] = {}
+        self._metrics_server = MetricsServer(self._instrumentation.to_prometheus,
+                                             metrics_port, metrics_host) \
+            if metrics_port is not None else None
+        self._aggregator = WindowAggregator()
+        self._deadband_filter = DeadbandFilter()
+        self._read_executor = ThreadPoolExecutor(max_workers=Farm.MAX_READ_WORKERS,
+                                                 thread_name_prefix="sensor-read") \
+            if concurrent_reads else None
+        self._actuator_executor = ThreadPoolExecutor(max_workers=Farm.MAX_ACTUATOR_WORKERS,
+                                                     thread_name_prefix="actuator")
+        # Importing connection manager here to avoid circular imports.
+        # Connection manager needs farm for type hinting so when it imports farm,
+        # this import won't break everything.
+        from connection_manager import ConnectionManager
+        self._connection_manager = ConnectionManager(self, debug, client, buffer)
+        self._scheduler = TelemetryScheduler(
+            self._send_readings_tick, self._tick_interval)
 
     async def start(self) -> None:
         """
         Starts running the farm. The farm will continously read and send telemetry data
-        as well as response to direct messages and device twin updates.
+        as well as response to direct messages and device twin updates. The connection
+        to the IoT hub is made and kept up in the background, telemetry is buffered
+        while the farm is offline.
 
         Returns
         -------
         None
         """
 
-        # Wait for the connection manager to be connected
-        while not self._connection_manager.is_connected:
-            pass
+        # Send on independent lanes so alarms don't wait behind routine telemetry
+        self._connection_manager.start_lanes()
+
+        # Apply device twin patches on this loop, between ticks
+        self._connection_manager.start_twin_patches()
 
-        # Loop while keeping the thread open for device twin logic and direct methods
-        async def stdin_listener():
+        # Connect and reconnect in the background so sampling never waits on the network
+        self._connection_manager.supervise()
+
+        # Send sensor events as soon as they happen, alongside the scheduled telemetry
+        self._events.bind(asyncio.get_running_loop())
+        self._events_task = asyncio.create_task(self._send_events())
+
+        if self._metrics_server is not None:
+            await self._metrics_server.start()
+
+        # Send telemetry on every tick. The scheduler only awaits so the event loop stays
+        # free for device twin logic and direct methods between ticks.
+        try:
+            await self._scheduler.run()
+        finally:
+            self._events_task.cancel()
             try:
-                while True:
-                    # Send Farm Telemetry
-                    await self.send_readings()
-                    sleep(self._connection_manager._telemetry_interval)
-            except KeyError:
+                await self._events_task
+            except asyncio.CancelledError:
                 pass
-            finally:
-                # Always close the connection manager and connection
-                await self._connection_manager.close()
+            except Exception as e:
+                print(f"Sending events stopped: {e!r}")
+            if self._metrics_server is not None:
+                await self._metrics_server.close()
+
+            # Send the windows which are still open so their samples aren't lost
+            summaries = self._aggregator.flush_due(force=True)
+            if summaries:
+                await self._connection_manager.send_telemetry(summaries)
+
+            # Always close the connection manager and connection
+            await self._connection_manager.close()
+            if self._read_executor is not None:
+                self._read_executor.shutdown(wait=False)
+            self._actuator_executor.shutdown(wait=False)
+
+    async def _send_events(self) -> None:
+        """
+        Sends sensor events to the cloud as they are published. Events which are published
+        while a message is being sent are sent together in the next message. Events which
+        fail to send are counted and dropped so the next ones are still sent.
+
+        Returns
+        -------
+        None
+        """
+
+        while True:
+            events = [await self._events.get()] + self._events.get_pending()
 
-        stdin_listener_task = asyncio.create_task(stdin_listener())
-        await stdin_listener_task
+            telemetry = {}
+            for subsystem_name, reading in events:
+                telemetry.setdefault(subsystem_name, []).append(reading)
+
+            if self._debug:
+                print(f"Sending {len(events)} events")
+            try:
+                await self._connection_manager.send_event(telemetry)
+            except Exception as e:
+                self.event_errors += 1
+                print(f"Sending events failed: {e!r}")
+
+    async def _send_readings_tick(self) -> None:
+        """
+        Sends the farm's readings for a single scheduler tick.
+
+        Returns
+        -------
+        None
+        """
+
+        await self.send_readings()
+        # Batches can time out on ticks where no sensor was due
+        await self._connection_manager.flush_due_telemetry()
+        await self._send_health_if_due()
+        await self._report_health_if_due()
+
+        if self._debug:
+            print(f"Tick stats: {self._scheduler.stats.to_dict()}")
+            print(f"Lane stats: {self._connection_manager.lane_stats}")
+            print(f"Connection stats: {self._connection_manager.connection_stats}")
+
+    async def _send_health_if_due(self) -> None:
+        """
+        Sends the peripheral statistics in a health message if the health interval
+        elapsed since the last one.
+
+        Returns
+        -------
+        None
+        """
+
+        interval = self._connection_manager.health_interval
+        now = monotonic()
+        if interval is None or now - self._last_health < interval:
+            return
+
+        self._last_health = now
+        await self._connection_manager.send_health(self._instrumentation.to_dict())
+
+    async def _report_health_if_due(self) -> None:
+        """
+        Reports the sensor error rates and cycle overruns in the device twin when the
+        connection manager allows it. Error rates are computed over the reads since the
+        last report, for the sensors which were read.
+
+        Returns
+        -------
+        None
+        """
+
+        if not self._connection_manager.health_report_due:
+            return
+
+        failures = self._instrumentation.failure_counts()
+        error_rates = {}
+        for name, (reads, failed) in failures.items():
+            previous_reads, previous_failed = self._reported_failures.get(name, (0, 0))
+            if reads > previous_reads:
+                error_rates[name] = round(
+                    (failed - previous_failed) / (reads - previous_reads), 3)
+        self._reported_failures = failures
+
+        await self._connection_manager.report_health({
+            "sensorErrorRates": error_rates,
+            "cycleOverruns": self._scheduler.stats.overruns
+        })
+
+    @property
+    def instrumentation(self) -> Instrumentation:
+        """
+        The latency and outcome statistics of the calls to every peripheral.
+
+        Returns
+        -------
+        Instrumentation
+            The instrumentation shared by the subsystems.
+        """
+
+        return self._instrumentation
+
+    def _tick_interval(self) -> float:
+        """
+        Gets the number of seconds between scheduler ticks, which is the shortest sampling
+        period of any sensor so that every sensor can be read when it is due.
+
+        Returns
+        -------
+        float
+            The tick interval in seconds.
+        """
+
+        sampling_intervals = self._connection_manager.sampling_intervals
+        telemetry_interval = self._connection_manager.telemetry_interval
+        return min([sensor.sampling_period(sampling_intervals, telemetry_interval)
+                    for subsystem in self._subsystems
+                    for sensor in subsystem.sensors],
+                   default=telemetry_interval)
+
+    def reschedule(self) -> None:
+        """
+        Lets the scheduler pick up a shorter tick interval right away, after the device
+        twin changed the sampling or telemetry intervals.
+
+        Returns
+        -------
+        None
+        """
+
+        self._scheduler.reschedule()
+
+    @property
+    def tick_stats(self) -> TickStats:
+        """
+        Statistics about the latency and jitter of the telemetry ticks.
+
+        Returns
+        -------
+        TickStats
+            The statistics of the telemetry scheduler.
+        """
+
+        return self._scheduler.stats
 
     async def send_readings(self) -> None:
         """
-        Loops through all of the three subsystems and get's their readings.
+        Loops through all of the three subsystems and get's the readings of every sensor
+        which is due to be sampled.
         Then it appends the readings to it's subsystem by name. And then it cleans 
         and sends the telemetry to the cloud.
 
@@ -82,20 +525,80 @@ class Farm:
         """
         telemetry = {}
 
-        for subsystem in self._subsystems:
-            readings = subsystem.read_sensors()
+        # Only read the sensors which are due on this tick
+        now = monotonic()
+        due_sensors = [subsystem.due_sensors(now,
+                                             self._connection_manager.sampling_intervals,
+                                             self._connection_manager.telemetry_interval)
+                       for subsystem in self._subsystems]
+
+        if self._read_executor is not None:
+            # A cycle only takes as long as the slowest sensor
+            all_readings = await asyncio.gather(
+                *[subsystem.read_sensors_concurrently(self._read_executor, sensors)
+                  for subsystem, sensors in zip(self._subsystems, due_sensors)])
+        else:
+            all_readings = [subsystem.read_sensors(sensors)
+                            for subsystem, sensors in zip(self._subsystems, due_sensors)]
+
+        for subsystem, sensors, readings in zip(self._subsystems, due_sensors, all_readings):
+            if not sensors:
+                continue
 
             # https://www.tutorialspoint.com/How-to-get-the-class-name-of-an-instance-in-Python#:~:text=Using%20__class__%20.&text=Python%27s%20__class__%20property,object%27s%20or%20instance%27s%20class%20name.
             #  We will be making the key the name of the class. The link helped
             #  me understand how to do this
-            telemetry[subsystem.__class__.__name__] = []
-            for reading in readings:
-                telemetry[subsystem.__class__.__name__].append(
-                    json.loads(reading.to_json()))
+            telemetry[subsystem.__class__.__name__] = readings
+
+        # Alarms go out right away on the high priority lane, before being aggregated
+        alarms, telemetry = self._connection_manager.split_alarms(telemetry)
+        if alarms:
+            await self._connection_manager.send_event(alarms)
+
+        # Replace the readings of aggregated types with a summary per telemetry interval
+        self._aggregator.configure(self._connection_manager.aggregated_types,
+                                   self._connection_manager.telemetry_interval)
+        telemetry = self._aggregator.add(telemetry)
 
-        payload = json.dumps(telemetry)
+        # Suppress slow changing readings which didn't change since they were last sent
+        self._deadband_filter.configure(self._connection_manager.deadbands,
+                                        self._connection_manager.deadband_max_silence)
+        telemetry = self._deadband_filter.filter(telemetry)
 
-        await self._connection_manager.send_the_d2c_message(payload)
+        # Add the summaries of the windows which ended
+        for subsystem_name, summaries in self._aggregator.flush_due().items():
+            telemetry.setdefault(subsystem_name, []).extend(summaries)
+
+        if not telemetry:
+            return
+
+        # The connection manager serializes the whole payload in one pass
+        await self._connection_manager.send_telemetry(telemetry)
+
+    @property
+    def direct_methods(self) -> list[DirectMethod]:
+        """
+        The direct methods advertised by the actuators of every subsystem.
+
+        Returns
+        -------
+        list[DirectMethod]
+            The direct methods.
+        """
+        return [method for subsystem in self._subsystems
+                for method in subsystem.direct_methods]
+
+    @property
+    def event_types(self) -> set[Reading.Type]:
+        """
+        The reading types which the sensors of every subsystem publish as events.
+
+        Returns
+        -------
+        set[Reading.Type]
+            The event reading types.
+        """
+        return set().union(*(subsystem.event_types for subsystem in self._subsystems))
 
     def control_subsystems(self, command: Command) -> None:
         """
@@ -110,21 +613,108 @@ class Farm:
             -------
             None
             """
-        for subsystem in self._subsystems:
-            subsystem.control_actuators([command])
+        self.apply_commands([command])
 
+    async def execute_commands(self, commands: list[Command],
+                               timeout: float = COMMAND_TIMEOUT) -> list[Command.Status]:
+        """
+        Controls the actuators associated with each command on worker threads, so slow
+        actuators don't block the event loop, and waits for them to confirm.
 
-if __name__ == "__main__":
+        Parameters
+        ----------
+        commands: list[Command]
+            The commands to execute, in order.
+        timeout: float
+            The number of seconds each command may take once it starts executing. A
+            command which takes longer keeps executing and is reported as timed out.
+
+        Returns
+        -------
+        list[Command.Status]
+            The status of each command, in the same order as the commands.
+        """
+
+        commands_by_subsystem: dict[Subsystem, list[int]] = {}
+        for index, command in enumerate(commands):
+            for subsystem in self._command_index.get(command.type, ()):
+                commands_by_subsystem.setdefault(subsystem, []).append(index)
+
+        results = await asyncio.gather(
+            *[subsystem.control_actuators_concurrently(
+                self._actuator_executor, [commands[index] for index in indexes], timeout)
+              for subsystem, indexes in commands_by_subsystem.items()])
+
+        # A command handled by several subsystems is applied if any of them applied it,
+        # unless another one failed or timed out
+        statuses: list[Optional[Command.Status]] = [None] * len(commands)
+        for indexes, subsystem_statuses in zip(commands_by_subsystem.values(), results):
+            for index, status in zip(indexes, subsystem_statuses):
+                if statuses[index] in (None, Command.Status.REJECTED) or \
+                        status in (Command.Status.FAILED, Command.Status.TIMED_OUT):
+                    statuses[index] = status
+
+        return [status or Command.Status.REJECTED for status in statuses]
+
+    def apply_commands(self, commands: list[Command]) -> list[bool]:
+        """
+        Controls the actuators associated with each command on the calling thread, sending
+        every command straight to the subsystems which handle its type. Commands for an
+        actuator which is executing a command from execute_commands wait for it.
 
-    # Importing connection manager only in main to avoid circular imports.
-    # Connection manager needs farm for type hinting so when it imports farm,
-    # this import won't break everything.
-    from connection_manager import ConnectionManager
+        Parameters
+        ----------
+        commands: list[Command]
+            The commands to apply, in order.
+
+        Returns
+        -------
+        list[bool]
+            Whether each command was applied by at least one actuator, in the same order
+            as the commands.
+        """
+
+        # Group the commands by subsystem so each subsystem is only called once
+        commands_by_subsystem: dict[Subsystem, list[int]] = {}
+        for index, command in enumerate(commands):
+            for subsystem in self._command_index.get(command.type, ()):
+                commands_by_subsystem.setdefault(subsystem, []).append(index)
+
+        applied = [False] * len(commands)
+        for subsystem, indexes in commands_by_subsystem.items():
+            results = subsystem.control_actuators([commands[index] for index in indexes])
+            for index, result in zip(indexes, results):
+                applied[index] = applied[index] or result
+
+        return applied
+
+
+if __name__ == "__main__":
     parser = ArgumentParser("A farming container device used to collect telemetry data "
                             "and respond to messages from a service.")
     parser.add_argument("--debug", action="store_true", help="Indicates that the script "
                         "should be run in debug mode.")
+    parser.add_argument("--sequential-reads", action="store_true", help="Indicates that "
+                        "sensors should be read one after the other instead of at the "
+                        "same time.")
+    parser.add_argument("--simulate", action="store_true", help="Indicates that the "
+                        "sensors and actuators should be simulated instead of using the "
+                        "real hardware.")
+    parser.add_argument("--nmea-replay", metavar="PATH", help="A file of NMEA sentences "
+                        "replayed by the simulated gps instead of the default route.")
+    parser.add_argument("--metrics-port", type=int, help="Serves the peripheral metrics "
+                        "in the Prometheus text format on this port.")
+    parser.add_argument("--metrics-host", default=MetricsServer.DEFAULT_HOST,
+                        help="The address the metrics are served on. Use 0.0.0.0 to "
+                        "expose them to the network.")
     args = parser.parse_args()
 
-    farm = Farm(args.debug)
+    # The backend must be selected before the subsystems create their peripherals
+    if args.simulate:
+        backend.select(backend.SIMULATED)
+        if args.nmea_replay is not None:
+            backend.load().replay_nmea(args.nmea_replay)
+
+    farm = Farm(args.debug, not args.sequential_reads, metrics_port=args.metrics_port,
+                metrics_host=args.metrics_host)
     asyncio.run(farm.start())
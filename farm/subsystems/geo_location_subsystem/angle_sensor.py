@@ -15,19 +15,17 @@ class AngleSensor(ISensor):
     PITCH_TYPE_INDEX = 0
     ROLL_TYPE_INDEX = 1
     TIMEOUT = 4
+    READ_TIMEOUT = TIMEOUT + 1
 
     def __init__(self, gpio=None) -> None:
-        self.accelerationSensor = AccelerationSensor()
+        self.accelerationSensor = AccelerationSensor.shared()
         self._reading_types = [Reading.Type.PITCH, Reading.Type.ROLL]
         self._reading_units = [Reading.Unit.DEGREES]
 
     def read(self) -> list[Reading]:
 
-        try:
-            accelX, accelY, accelZ = self.accelerationSensor.read(
-                timeout=AngleSensor.TIMEOUT)
-        except (BlockingIOError, TimeoutError):
-            return []
+        # BlockingIOError and TimeoutError are left to the caller, which counts them
+        accelX, accelY, accelZ = self.accelerationSensor.read(timeout=AngleSensor.TIMEOUT)
 
         # https://engineering.stackexchange.com/questions/3348/calculating-pitch-yaw-and-roll-from-mag-acc-and-gyro-data
         # Pitch and roll are the same whether they're flat or upside down. I can not find
@@ -1,25 +1,84 @@
 # Written by Jeffrey Bringolf
 
-from time import sleep, time
+from threading import Thread
+from time import monotonic, sleep
+from typing import Optional
 
 from ..interfaces.sensors import ISensor
 from ..interfaces.reading import Reading
+from ..hardware import backend
 from ..helpers.serial_connection import SerialConnection
 
-import serial.tools.list_ports
 import pynmea2
 
 
 class NMEASerialConnection(SerialConnection):
     """
-    An extended version of the SerialConnection class which parses serial data
-    in an nmea format.
+    An extended version of the SerialConnection class which continuously reads nmea data
+    from the serial port in a background thread and caches the latest fix.
     """
 
     _DESIRED_NMEA_PREFIX = "$GNGLL"
-    TIMEOUT = 4
+    _VALID_STATUS = "A"
+    # The number of seconds to wait before reading again after a serial error
+    ERROR_BACKOFF = 1
 
-    def readline(self) -> pynmea2.NMEASentence:
+    def __init__(self, serial_name: str) -> None:
+        """
+        Initializes the serial connection and starts reading from it in the background.
+
+        Parameters
+        ----------
+        serial_name: str
+            The name of the serial port the gps is attached to.
+
+        Returns
+        -------
+        None
+        """
+
+        super().__init__(serial_name)
+
+        # The latest fix and the monotonic time it was read at. Replaced as a single
+        # tuple so the reader thread never exposes a fix without its time.
+        self._fix: Optional[tuple[pynmea2.NMEASentence, float]] = None
+        # The latest sentence of every type, in case other nmea data is needed
+        self.sentences: dict[str, pynmea2.NMEASentence] = {}
+
+        self._running = True
+        self._thread = Thread(target=self._pump, name="gps", daemon=True)
+        self._thread.start()
+
+    def _pump(self) -> None:
+        """
+        Reads and parses lines from the serial port until the connection is stopped,
+        caching every valid fix.
+
+        Returns
+        -------
+        None
+        """
+
+        while self._running:
+            try:
+                sentence = self.readline()
+            except (pynmea2.ParseError, UnicodeDecodeError):
+                # Usually a partial line when the device first connects
+                continue
+            except self._serial.SerialException:
+                sleep(NMEASerialConnection.ERROR_BACKOFF)
+                continue
+
+            if sentence is None:
+                continue
+
+            self.sentences[sentence.sentence_type] = sentence
+            prefix = f"${getattr(sentence, 'talker', '')}{sentence.sentence_type}"
+            if prefix == NMEASerialConnection._DESIRED_NMEA_PREFIX and \
+                    getattr(sentence, "status", None) == NMEASerialConnection._VALID_STATUS:
+                self._fix = (sentence, monotonic())
+
+    def readline(self) -> Optional[pynmea2.NMEASentence]:
         """
         Reads a line of data coming from the serial port and parses it from nmea data.
 
@@ -33,44 +92,55 @@ class NMEASerialConnection(SerialConnection):
         UnicodeDecodeError
             Raised when the read message could not be decoded properly. Usually happens when
             The device first connects.
-        TimeoutError
-            Raised when the Serial Connection fails to receive data for a set amount of time.
 
         Returns
         -------
         pynmea2.NMEASentence
-            An NMEASentence object with location data read from the serial connection.
-            Returns None if the nmea line is not the type in the desired prefix.
+            An NMEASentence object with data read from the serial connection. Returns None
+            if the serial connection timed out without reading a line.
+        """
+
+        line = super().readline().strip()
+        if not line:
+            return None
+
+        return pynmea2.parse(line)
+
+    def latest_fix(self) -> Optional[tuple[pynmea2.NMEASentence, float]]:
+        """
+        Gets the latest valid fix without waiting for the serial port.
+
+        Returns
+        -------
+        tuple[pynmea2.NMEASentence, float]
+            The latest fix and its age in seconds. None if no valid fix has been read.
         """
 
-        try:
+        fix = self._fix
+        if fix is None:
+            return None
 
-            # If it doesn't read in the timeout amount of time just raise a pynmea.ParseError
-            # and let the parent catch it.
-            start_time = time()
+        sentence, read_time = fix
+        return sentence, monotonic() - read_time
 
-            # Read lines from the serial port until the right line is found
-            # and parse it as an NMEASentence
-            line = ""
-            while not line.startswith(NMEASerialConnection._DESIRED_NMEA_PREFIX):
-                if time() - start_time > NMEASerialConnection.TIMEOUT:
-                    raise TimeoutError("Serial connection timed out")
-                line = super().readline()
+    def stop(self) -> None:
+        """
+        Stops reading from the serial port once the current line has been read.
 
-            return pynmea2.parse(line)
+        Returns
+        -------
+        None
+        """
 
-        # Added try except for clarity
-        except serial.SerialException:
-            raise
-        except pynmea2.ParseError:
-            raise
-        except UnicodeDecodeError:
-            raise
+        self._running = False
 
 
 class GPS(ISensor):
 
     SERIAL_NAME = "/dev/ttyAMA0"
+    SAMPLING_PERIOD = 30
+    # Fixes older than this many seconds are not reported
+    MAX_FIX_AGE = 10
 
     def __init__(self, gpio=None) -> None:
         self.serial_connection = NMEASerialConnection(GPS.SERIAL_NAME)
@@ -79,21 +149,28 @@ class GPS(ISensor):
 
     def read(self) -> list[Reading]:
         """
-        Generates a list of readings based on sensor data.
+        Generates a list of readings from the latest fix read by the serial connection.
+        Never waits for the serial port.
 
         Returns
         -------
         list[Reading]
-            A list of reading objects generated from sensor data. Returns None
-            if the reading from the gps was invalid.
+            A list of reading objects generated from sensor data. Returns an empty list
+            if there is no valid fix or the latest fix is too old.
 
         """
-        try:
-            data = self.serial_connection.readline()
-        except (pynmea2.ParseError, serial.SerialException, UnicodeDecodeError, TimeoutError):
+        fix = self.serial_connection.latest_fix()
+        if fix is None:
+            return []
+
+        data, age = fix
+        if age > GPS.MAX_FIX_AGE:
             return []
 
-        return [Reading(GPS._nmea_to_dict(data),
+        location = GPS._nmea_to_dict(data)
+        location["Fix Age"] = round(age, 2)
+
+        return [Reading(location,
                         self.reading_types[0],
                         self.reading_units[0])
                 ]
@@ -145,7 +222,7 @@ if __name__ == "__main__":
 
     # Call this method if a new gps is attached and you need to find its name.
     def find_all_used_serial_ports():
-        ports = serial.tools.list_ports.comports()
+        ports = backend.load().serial.tools.list_ports.comports()
         print([port.name for port in ports])
 
     delay = 1
@@ -1,49 +1,72 @@
 # Written by Jeffrey Bringolf
 
 from time import sleep
+from typing import Union
 
 from ..helpers.acceleration_sensor import AccelerationSensor
 from ..interfaces.sensors import ISensor
-from ..interfaces.reading import Reading
+from ..interfaces.reading import Reading, ReadingBatch
 
 
 class VibrationSensor(ISensor):
+    """
+    Measures the vibration of every accelerometer sample buffered since the previous read,
+    so vibration is measured at the accelerometer's rate rather than once per read. By
+    default a read reports the strongest vibration as a single reading, with
+    REPORT_SAMPLES every sample is reported as a ReadingBatch.
+    """
 
     TIMEOUT = 4
+    READ_TIMEOUT = TIMEOUT + 1
+    SAMPLING_PERIOD = 1
+    # Whether every sample is sent instead of the strongest vibration of each read
+    REPORT_SAMPLES = False
 
     def __init__(self, gpio=None) -> None:
-        self.accelerationSensor = AccelerationSensor()
+        self.accelerationSensor = AccelerationSensor.shared()
         self._reading_types = [Reading.Type.VIBRATION]
         self._reading_units = [Reading.Unit.NONE]
         self.previousAccelerationX = 0
         self.previousAccelerationY = 0
         self.previousAccelerationZ = 0
+        self._last_sample_time = None
 
-    def read(self) -> list[Reading]:
+    def read(self) -> list[Union[Reading, ReadingBatch]]:
 
-        try:
-            accelX, accelY, accelZ = self.accelerationSensor.read(
-                timeout=VibrationSensor.TIMEOUT)
-        except (BlockingIOError, TimeoutError):
+        # Waits for the first sample and surfaces device errors. BlockingIOError and
+        # TimeoutError are left to the caller, which counts them.
+        self.accelerationSensor.read(timeout=VibrationSensor.TIMEOUT)
+
+        samples = self.accelerationSensor.samples(since=self._last_sample_time)
+        if not samples:
             return []
 
-        # Calculate vibration
-        vibrationX = accelX - self.previousAccelerationX
-        vibrationY = accelY - self.previousAccelerationY
-        vibrationZ = accelZ - self.previousAccelerationZ
+        batch = ReadingBatch(self.reading_types[0], self.reading_units[0])
+        for timestamp, accelX, accelY, accelZ in samples:
+            # Calculate vibration
+            vibrationX = accelX - self.previousAccelerationX
+            vibrationY = accelY - self.previousAccelerationY
+            vibrationZ = accelZ - self.previousAccelerationZ
+
+            axesCount = 3
+            meanVibration = (vibrationX + vibrationY + vibrationZ) / axesCount
+
+            # Store previous acceleration
+            self.previousAccelerationX = accelX
+            self.previousAccelerationY = accelY
+            self.previousAccelerationZ = accelZ
 
-        axesCount = 3
-        meanVibration = (vibrationX + vibrationY + vibrationZ) / axesCount
+            # Event timestamps are float seconds, keep them to the microsecond
+            batch.append(meanVibration, round(timestamp * 1_000_000) * 1000)
 
-        # Store previous acceleration
-        self.previousAccelerationX = accelX
-        self.previousAccelerationY = accelY
-        self.previousAccelerationZ = accelZ
+        self._last_sample_time = samples[-1][0]
+        if VibrationSensor.REPORT_SAMPLES:
+            return [batch]
 
-        return [
-            Reading(meanVibration,
-                    self.reading_types[0], self.reading_units[0])
-        ]
+        # The strongest vibration, positive or negative, at the time it was measured
+        peak = max(range(len(batch.values)), key=lambda index: abs(batch.values[index]))
+        return [Reading(batch.values[peak], self.reading_types[0], self.reading_units[0],
+                        batch.timestamps_ns[peak])]
 
     @property
     def reading_types(self) -> list[Reading.Type]:
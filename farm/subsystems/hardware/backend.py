@@ -0,0 +1,78 @@
+"""
+This module selects the hardware backend used by every sensor and actuator. The real
+backend wraps the libraries which drive the peripherals of the reTerminal and the grove
+hat, the simulated backend replaces them with synthetic devices so the farm can run on any
+machine. Peripherals load the backend when they are created rather than when their module
+is imported, so the backend must be selected before the subsystems are created.
+
+Functions:
+    select: Selects the hardware backend.
+    selected: Gets the name of the selected backend.
+    load: Imports the selected backend.
+
+Usage:
+    backend.select(backend.SIMULATED)
+    hardware = backend.load()
+    adc = hardware.ADC(0x04)
+"""
+
+from importlib import import_module
+from types import ModuleType
+
+REAL = "real"
+SIMULATED = "simulated"
+BACKENDS = (REAL, SIMULATED)
+
+_selected = REAL
+
+
+def select(name: str) -> None:
+    """
+    Selects the hardware backend used by the peripherals created from now on.
+
+    Parameters
+    ----------
+    name: str
+        The name of the backend, one of BACKENDS.
+
+    Raises
+    ------
+    ValueError
+        Raised when the backend doesn't exist.
+
+    Returns
+    -------
+    None
+    """
+
+    global _selected
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown hardware backend {name}, expected one of {BACKENDS}")
+    _selected = name
+
+
+def selected() -> str:
+    """
+    Gets the name of the selected hardware backend.
+
+    Returns
+    -------
+    str
+        The name of the backend.
+    """
+
+    return _selected
+
+
+def load() -> ModuleType:
+    """
+    Imports the selected hardware backend. Both backends define the same names, so
+    peripherals use whichever is returned without knowing which one it is.
+
+    Returns
+    -------
+    ModuleType
+        The backend module.
+    """
+
+    return import_module(f".{_selected}", __package__)
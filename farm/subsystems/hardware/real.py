@@ -0,0 +1,27 @@
+"""
+The real hardware backend. Re-exports the parts of the hardware libraries used by the
+peripherals, so importing this module requires every library to be installed.
+
+Usage:
+    from subsystems.hardware import real as hardware
+    adc = hardware.ADC(0x04)
+"""
+
+import seeed_python_reterminal.core as reterminal
+import seeed_python_reterminal.acceleration as acceleration
+import serial
+import serial.tools.list_ports
+from evdev import ecodes
+from gpiozero import Button, DigitalOutputDevice, Servo
+from gpiozero.pins.pigpio import PiGPIOFactory
+from grove.adc import ADC
+from grove.grove_mini_pir_motion_sensor import GroveMiniPIRMotionSensor
+from grove.grove_temperature_humidity_aht20 import GroveTemperatureHumidityAHT20
+from grove.grove_ws2813_rgb_led_strip import GroveWS2813RgbStrip
+from rpi_ws281x import Color
+
+__all__ = [
+    "reterminal", "acceleration", "ecodes", "serial", "Button", "DigitalOutputDevice",
+    "Servo", "PiGPIOFactory", "ADC", "GroveMiniPIRMotionSensor",
+    "GroveTemperatureHumidityAHT20", "GroveWS2813RgbStrip", "Color"
+]
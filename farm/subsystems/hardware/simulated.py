@@ -0,0 +1,648 @@
+"""
+The simulated hardware backend. Defines the same names as the real backend with devices
+which need no hardware: ADC channels and the temperature sensor produce synthetic signals,
+the GPS serial port replays NMEA sentences, the accelerometer emits a scripted event
+stream and GPIO pins are driven by background threads which open the door and trigger the
+motion sensor every so often. Every random source is seeded so runs are repeatable.
+
+Classes:
+    Signal: A sine wave with gaussian noise.
+    FakePin: A GPIO pin whose level is set by the simulation.
+    ADC: Synthetic analog to digital converter channels.
+    ReplaySerial: A serial port which replays NMEA sentences in a loop.
+    ScriptedAccelerometer: An accelerometer which replays a script of accelerations.
+
+Usage:
+    backend.select(backend.SIMULATED)
+    hardware = backend.load()
+    hardware.replay_nmea("drive.nmea")
+    farm = Farm()
+"""
+
+from enum import Enum
+from itertools import cycle
+from math import pi, sin
+from random import Random
+from threading import Lock, Thread
+from time import monotonic, sleep, time
+from types import SimpleNamespace
+from typing import Callable, Iterable, Optional
+
+# The seed every simulated random source is derived from
+SEED = 0
+
+
+class Signal:
+    """
+    A synthetic signal, a sine wave around an offset with gaussian noise.
+    """
+
+    __slots__ = ("offset", "amplitude", "period", "noise", "_random", "_start")
+
+    def __init__(self, offset: float, amplitude: float = 0, period: float = 60,
+                 noise: float = 0, seed: int = SEED) -> None:
+        """
+        Initializes the signal.
+
+        Parameters
+        ----------
+        offset: float
+            The mean of the signal.
+        amplitude: float
+            The amplitude of the sine wave.
+        period: float
+            The number of seconds of a period of the sine wave.
+        noise: float
+            The standard deviation of the noise.
+        seed: int
+            The seed of the noise.
+
+        Returns
+        -------
+        None
+        """
+
+        self.offset = offset
+        self.amplitude = amplitude
+        self.period = period
+        self.noise = noise
+        self._random = Random(seed)
+        self._start = monotonic()
+
+    def value(self) -> float:
+        """
+        Samples the signal.
+
+        Returns
+        -------
+        float
+            The value of the signal now.
+        """
+
+        phase = 2 * pi * (monotonic() - self._start) / self.period
+        return self.offset + self.amplitude * sin(phase) + \
+            self._random.gauss(0, self.noise)
+
+
+class FakePin:
+    """
+    A GPIO pin whose level is set by the simulation or by an output device. The devices
+    on the pin are notified of every change on the thread which changed it, like the
+    callbacks of the real GPIO library.
+    """
+
+    def __init__(self, number: int) -> None:
+        """
+        Initializes a low pin.
+
+        Parameters
+        ----------
+        number: int
+            The GPIO number of the pin.
+
+        Returns
+        -------
+        None
+        """
+
+        self.number = number
+        self.state = False
+        self._listeners: list[Callable[[bool], None]] = []
+        self._lock = Lock()
+        self._activity: Optional[Thread] = None
+
+    def subscribe(self, listener: Callable[[bool], None]) -> None:
+        """
+        Calls a listener with the new level every time the level changes.
+
+        Parameters
+        ----------
+        listener: Callable[[bool], None]
+            The listener.
+
+        Returns
+        -------
+        None
+        """
+
+        self._listeners.append(listener)
+
+    def drive(self, state: bool) -> None:
+        """
+        Sets the level of the pin.
+
+        Parameters
+        ----------
+        state: bool
+            The new level, True when high.
+
+        Returns
+        -------
+        None
+        """
+
+        with self._lock:
+            if state == self.state:
+                return
+            self.state = state
+
+        for listener in self._listeners:
+            listener(state)
+
+    def animate(self, idle: bool, mean_interval: float, duration: float) -> None:
+        """
+        Starts flipping the pin away from its idle level in the background, at random
+        intervals. Does nothing if the pin is already animated.
+
+        Parameters
+        ----------
+        idle: bool
+            The level the pin stays at between activity.
+        mean_interval: float
+            The mean number of seconds between the start of two activities.
+        duration: float
+            The number of seconds each activity lasts.
+
+        Returns
+        -------
+        None
+        """
+
+        if self._activity is not None:
+            return
+
+        self.drive(idle)
+        self._activity = Thread(target=self._animate, args=(idle, mean_interval, duration),
+                                name=f"pin-{self.number}", daemon=True)
+        self._activity.start()
+
+    def _animate(self, idle: bool, mean_interval: float, duration: float) -> None:
+        """
+        Flips the pin away from its idle level forever.
+
+        Parameters
+        ----------
+        idle: bool
+            The level the pin stays at between activity.
+        mean_interval: float
+            The mean number of seconds between the start of two activities.
+        duration: float
+            The number of seconds each activity lasts.
+
+        Returns
+        -------
+        None
+        """
+
+        random = Random(SEED + self.number)
+        while True:
+            sleep(random.expovariate(1 / mean_interval))
+            self.drive(not idle)
+            sleep(duration)
+            self.drive(idle)
+
+
+_pins: dict[int, FakePin] = {}
+_pins_lock = Lock()
+
+
+def pin(number: int) -> FakePin:
+    """
+    Gets a GPIO pin, creating it on first use. Lets a test drive the pins of devices.
+
+    Parameters
+    ----------
+    number: int
+        The GPIO number of the pin.
+
+    Returns
+    -------
+    FakePin
+        The pin.
+    """
+
+    with _pins_lock:
+        return _pins.setdefault(number, FakePin(number))
+
+
+class Button:
+    """
+    A button on a pin, pressed while the pin is high. Used for the magnetic door switch,
+    so the door is closed most of the time and opened every so often.
+    """
+
+    # The level of the pin between activity, the mean number of seconds between two
+    # activities and the number of seconds each activity lasts.
+    ACTIVITY = (True, 45, 5)
+
+    def __init__(self, gpio: int, **kwargs) -> None:
+        self.pin = pin(gpio)
+        self.when_pressed: Optional[Callable[[], None]] = None
+        self.when_released: Optional[Callable[[], None]] = None
+        self.pin.subscribe(self._changed)
+        self.pin.animate(*Button.ACTIVITY)
+
+    @property
+    def is_pressed(self) -> bool:
+        return self.pin.state
+
+    def _changed(self, state: bool) -> None:
+        callback = self.when_pressed if state else self.when_released
+        if callback is not None:
+            callback()
+
+
+class GroveMiniPIRMotionSensor:
+    """
+    A motion sensor on a pin, which detects motion when the pin goes high.
+    """
+
+    # The level of the pin between activity, the mean number of seconds between two
+    # detections and the number of seconds each detection lasts.
+    ACTIVITY = (False, 20, 1)
+
+    def __init__(self, gpio: int) -> None:
+        self.pin = pin(gpio)
+        self.on_detect: Optional[Callable[[], None]] = None
+        self.pin.subscribe(self._changed)
+        self.pin.animate(*GroveMiniPIRMotionSensor.ACTIVITY)
+
+    def _changed(self, state: bool) -> None:
+        if state and self.on_detect is not None:
+            self.on_detect()
+
+
+class DigitalOutputDevice:
+    """
+    An output device which drives its pin.
+    """
+
+    def __init__(self, gpio: int, **kwargs) -> None:
+        self.pin = pin(gpio)
+
+    def on(self) -> None:
+        self.pin.drive(True)
+
+    def off(self) -> None:
+        self.pin.drive(False)
+
+    @property
+    def value(self) -> int:
+        return int(self.pin.state)
+
+
+class PiGPIOFactory:
+    """
+    Stands in for the pigpio pin factory, which the simulated servo doesn't need.
+    """
+
+
+class Servo:
+    """
+    A servo whose value goes from -1 at its minimum position to 1 at its maximum.
+    """
+
+    def __init__(self, gpio: int, **kwargs) -> None:
+        self.pin = pin(gpio)
+        self.value = 0.0
+
+    def min(self) -> None:
+        self.value = -1.0
+
+    def mid(self) -> None:
+        self.value = 0.0
+
+    def max(self) -> None:
+        self.value = 1.0
+
+
+class ADC:
+    """
+    Synthetic analog to digital converter channels. Each channel is a signal in the
+    range of the sensor plugged into it on the farm.
+    """
+
+    # The (offset, amplitude, period, noise) of the signal of each channel
+    CHANNELS = {
+        # Soil moisture, read out of 1023
+        0: (520, 80, 600, 4),
+        # Water level, read in hundredths of centimeters
+        2: (1200, 150, 900, 10),
+        # Noise, read in millivolts. Peaks above the noise alarm threshold.
+        4: (600, 1500, 30, 150)
+    }
+
+    def __init__(self, address: Optional[int] = 0x04) -> None:
+        self.address = address
+        self._signals = {channel: Signal(*signal, seed=SEED + channel)
+                         for channel, signal in ADC.CHANNELS.items()}
+
+    def _sample(self, channel: int) -> float:
+        signal = self._signals.get(channel)
+        return 0 if signal is None else max(0.0, signal.value())
+
+    def read(self, channel: int) -> int:
+        return round(self._sample(channel))
+
+    def read_voltage(self, channel: int) -> int:
+        return round(self._sample(channel))
+
+
+class GroveTemperatureHumidityAHT20:
+    """
+    A temperature and humidity sensor following a daily cycle.
+    """
+
+    DAY = 24 * 60 * 60
+
+    def __init__(self, address: int = 0x38, bus: int = 4) -> None:
+        self._temperature = Signal(21, 4, GroveTemperatureHumidityAHT20.DAY, 0.1, SEED)
+        self._humidity = Signal(55, 10, GroveTemperatureHumidityAHT20.DAY, 0.5, SEED + 1)
+
+    def read(self) -> tuple[float, float]:
+        return round(self._temperature.value(), 2), round(self._humidity.value(), 2)
+
+
+def Color(red: int, green: int, blue: int) -> int:
+    """
+    Packs a color like rpi_ws281x does.
+
+    Parameters
+    ----------
+    red: int
+        The red component, from 0 to 255.
+    green: int
+        The green component, from 0 to 255.
+    blue: int
+        The blue component, from 0 to 255.
+
+    Returns
+    -------
+    int
+        The packed 24 bit color.
+    """
+
+    return (red << 16) | (green << 8) | blue
+
+
+class GroveWS2813RgbStrip:
+    """
+    An LED strip which keeps its pixels and brightness in memory.
+    """
+
+    def __init__(self, gpio: int = 18, count: int = 10, brightness: int = 255) -> None:
+        self._pixels = [0] * count
+        self._brightness = brightness
+
+    def numPixels(self) -> int:
+        return len(self._pixels)
+
+    def setPixelColor(self, index: int, color: int) -> None:
+        self._pixels[index] = color
+
+    def getBrightness(self) -> int:
+        return self._brightness
+
+    def setBrightness(self, brightness: int) -> None:
+        self._brightness = brightness
+
+    def show(self) -> None:
+        pass
+
+
+class InputEvent:
+    """
+    An input event in the format of evdev.
+    """
+
+    __slots__ = ("sec", "usec", "type", "code", "value")
+
+    def __init__(self, sec: int, usec: int, type: int, code: int, value: int) -> None:
+        self.sec = sec
+        self.usec = usec
+        self.type = type
+        self.code = code
+        self.value = value
+
+    def timestamp(self) -> float:
+        return self.sec + self.usec / 1_000_000
+
+
+ecodes = SimpleNamespace(EV_SYN=0, EV_ABS=3)
+
+
+class AccelerationName(Enum):
+    X = 0
+    Y = 1
+    Z = 2
+
+
+class AccelerationEvent:
+    """
+    Interprets an input event of the accelerometer like seeed_python_reterminal does.
+    """
+
+    def __init__(self, event: InputEvent) -> None:
+        self.name = AccelerationName(event.code) \
+            if event.type == ecodes.EV_ABS and event.code in (0, 1, 2) else None
+        self.value = event.value
+
+
+acceleration = SimpleNamespace(AccelerationName=AccelerationName,
+                               AccelerationEvent=AccelerationEvent)
+
+
+def default_acceleration_script(length: int = 500) -> list[tuple[int, int, int]]:
+    """
+    Creates the default accelerometer script, a slightly tilted container at rest with
+    a burst of vibration every second at the default rate.
+
+    Parameters
+    ----------
+    length: int
+        The number of (x, y, z) reports in the script.
+
+    Returns
+    -------
+    list[tuple[int, int, int]]
+        The reports, in the accelerometer's raw units.
+    """
+
+    random = Random(SEED)
+    script = []
+    for index in range(length):
+        shake = 120 if index % 100 < 10 else 8
+        script.append((round(random.gauss(60, shake)), round(random.gauss(-40, shake)),
+                       round(random.gauss(1000, shake))))
+    return script
+
+
+class ScriptedAccelerometer:
+    """
+    An accelerometer which replays a script of (x, y, z) reports at a fixed rate, forever.
+    Each report is emitted as an event per axis followed by a synchronization event.
+    """
+
+    # The number of reports per second
+    DEFAULT_RATE = 100
+
+    def __init__(self, script: Optional[Iterable[tuple[int, int, int]]] = None,
+                 rate: float = DEFAULT_RATE) -> None:
+        self.script = list(script) if script is not None else default_acceleration_script()
+        self.rate = rate
+
+    def read_loop(self) -> Iterable[InputEvent]:
+        interval = 1 / self.rate
+        deadline = monotonic()
+        for report in cycle(self.script):
+            deadline += interval
+            delay = deadline - monotonic()
+            if delay > 0:
+                sleep(delay)
+
+            now = time()
+            sec = int(now)
+            usec = int((now - sec) * 1_000_000)
+            for code, value in enumerate(report):
+                yield InputEvent(sec, usec, ecodes.EV_ABS, code, value)
+            yield InputEvent(sec, usec, ecodes.EV_SYN, 0, 0)
+
+
+class ReTerminal:
+    """
+    The reTerminal's built in peripherals, the buzzer, light sensor and accelerometer.
+    """
+
+    def __init__(self) -> None:
+        self.buzzer = False
+        self._illuminance = Signal(300, 250, 120, 10, SEED)
+        self.acceleration_script: Optional[list[tuple[int, int, int]]] = None
+
+    @property
+    def illuminance(self) -> int:
+        return max(0, round(self._illuminance.value()))
+
+    def get_acceleration_device(self) -> ScriptedAccelerometer:
+        return ScriptedAccelerometer(self.acceleration_script)
+
+
+reterminal = ReTerminal()
+
+
+def nmea_sentence(body: str) -> str:
+    """
+    Adds the start delimiter and checksum to the body of an NMEA sentence.
+
+    Parameters
+    ----------
+    body: str
+        The sentence between the $ and the *.
+
+    Returns
+    -------
+    str
+        The full sentence.
+    """
+
+    checksum = 0
+    for character in body:
+        checksum ^= ord(character)
+    return f"${body}*{checksum:02X}"
+
+
+def default_nmea_replay(length: int = 60) -> list[str]:
+    """
+    Creates the default NMEA replay, a container moving north east in a straight line
+    which loses its fix every now and then.
+
+    Parameters
+    ----------
+    length: int
+        The number of fixes.
+
+    Returns
+    -------
+    list[str]
+        The sentences.
+    """
+
+    sentences = []
+    for index in range(length):
+        latitude = f"4530.{1000 + index * 7:04d}"
+        longitude = f"07334.{5000 - index * 9:04d}"
+        status = "V" if index % 20 == 19 else "A"
+        seconds = f"1200{index % 60:02d}.00"
+        sentences.append(nmea_sentence(
+            f"GNRMC,{seconds},{status},{latitude},N,{longitude},W,0.5,45.0,010123,,,A"))
+        sentences.append(nmea_sentence(
+            f"GNGLL,{latitude},N,{longitude},W,{seconds},{status},A"))
+    return sentences
+
+
+class SerialException(IOError):
+    """
+    Raised when the simulated serial port is used after being closed.
+    """
+
+
+class ReplaySerial:
+    """
+    A serial port which replays NMEA sentences in a loop, at the rate of a GPS.
+    """
+
+    # The number of seconds between two lines
+    LINE_INTERVAL = 0.5
+
+    def __init__(self, port: str, timeout: Optional[float] = None, **kwargs) -> None:
+        self.port = port
+        self.timeout = timeout
+        self.closed = False
+        self._lines = cycle(_nmea_replay)
+
+    def reset_input_buffer(self) -> None:
+        pass
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def readline(self) -> bytes:
+        if self.closed:
+            raise SerialException("The port is closed")
+        sleep(ReplaySerial.LINE_INTERVAL)
+        return f"{next(self._lines)}\r\n".encode("utf-8")
+
+
+_nmea_replay = default_nmea_replay()
+
+
+def replay_nmea(path: str) -> None:
+    """
+    Replays the sentences of a file, one per line, on the serial ports opened from now on
+    instead of the default replay. Usually a capture of the real GPS.
+
+    Parameters
+    ----------
+    path: str
+        The path of the file.
+
+    Returns
+    -------
+    None
+    """
+
+    global _nmea_replay
+    with open(path) as replay:
+        lines = [line.strip() for line in replay if line.strip()]
+    if not lines:
+        raise ValueError(f"{path} does not contain any NMEA sentence")
+    _nmea_replay = lines
+
+
+serial = SimpleNamespace(
+    Serial=ReplaySerial,
+    SerialException=SerialException,
+    tools=SimpleNamespace(list_ports=SimpleNamespace(comports=lambda: []))
+)
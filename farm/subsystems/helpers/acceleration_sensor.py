@@ -1,33 +1,153 @@
 # Written by Jeffrey Bringolf
 
-from time import time
-import seeed_python_reterminal.core as rt
-import seeed_python_reterminal.acceleration as rt_accel
+from collections import deque
+from threading import Condition, Lock, Thread
+from time import sleep, time
+from typing import Optional
+from ..hardware import backend
 
 
 class AccelerationSensor:
+    """
+    Reads the accelerometer's event stream once in a background thread and keeps the
+    latest acceleration along with a ring buffer of recent samples. Sensors should use
+    AccelerationSensor.shared() so the device is only drained by one reader and every
+    sensor sees the same samples.
+    """
+
+    # The number of samples kept in the ring buffer
+    BUFFER_SIZE = 256
+    # The number of seconds after which the latest sample is too old to be read
+    MAX_SAMPLE_AGE = 1
+    # The number of seconds to wait before reopening the accelerometer after it fails
+    ERROR_BACKOFF = 1
+
+    _shared: Optional["AccelerationSensor"] = None
+    _shared_lock = Lock()
+
+    @classmethod
+    def shared(cls) -> "AccelerationSensor":
+        """
+        Gets the AccelerationSensor shared by every sensor, creating it on first use.
 
-    def __init__(self) -> None:
-        """Initializes the AccelerationSensor."""
-        self.accelerometer = rt.get_acceleration_device()
+        Returns
+        -------
+        AccelerationSensor
+            The shared acceleration sensor.
+        """
+
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def __init__(self, buffer_size: int = BUFFER_SIZE) -> None:
+        """
+        Initializes the AccelerationSensor and starts reading the accelerometer.
+
+        Parameters
+        ----------
+        buffer_size: int
+            The number of (timestamp, x, y, z) samples to keep in the ring buffer.
+
+        Returns
+        -------
+        None
+        """
+
+        self._hardware = backend.load()
+        self.accelerometer = self._hardware.reterminal.get_acceleration_device()
+        self._latest: list[Optional[float]] = [None, None, None]
+        self._samples: deque[tuple[float, float, float, float]] = deque(maxlen=buffer_size)
+        self._error: Optional[OSError] = None
+        self._condition = Condition()
+
+        self._thread = Thread(target=self._pump, name="accelerometer", daemon=True)
+        self._thread.start()
+
+    def _pump(self) -> None:
+        """
+        Reads events from the accelerometer, reopening the device after a backoff
+        whenever it fails. Each axis event updates the latest acceleration and every
+        synchronization event appends the latest acceleration to the ring buffer.
+
+        Returns
+        -------
+        None
+        """
+
+        while True:
+            try:
+                self._read_events()
+            except OSError as e:
+                with self._condition:
+                    self._error = e
+                    # A partial report from before the failure isn't completed
+                    self._latest = [None, None, None]
+                    self._condition.notify_all()
+
+            sleep(AccelerationSensor.ERROR_BACKOFF)
+            try:
+                self.accelerometer = self._hardware.reterminal.get_acceleration_device()
+            except OSError as e:
+                with self._condition:
+                    self._error = e
+
+    def _read_events(self) -> None:
+        """
+        Reads events from the accelerometer until the device fails. Clears the last
+        error once a complete sample is read.
+
+        Raises
+        ------
+        OSError
+            Raised when the accelerometer can not be read.
+
+        Returns
+        -------
+        None
+        """
+
+        rt_accel = self._hardware.acceleration
+        ecodes = self._hardware.ecodes
+        axis_indexes = {
+            rt_accel.AccelerationName.X: 0,
+            rt_accel.AccelerationName.Y: 1,
+            rt_accel.AccelerationName.Z: 2
+        }
+
+        for event in self.accelerometer.read_loop():
+            accelEvent = rt_accel.AccelerationEvent(event)
+
+            with self._condition:
+                # Filter out invalid events or yaw
+                if accelEvent.name in axis_indexes:
+                    self._latest[axis_indexes[accelEvent.name]] = accelEvent.value
+
+                # The device sends a synchronization event after each complete report
+                elif event.type == ecodes.EV_SYN and None not in self._latest:
+                    self._samples.append((event.timestamp(), *self._latest))
+                    self._error = None
+                    self._condition.notify_all()
 
     def read(self, timeout: int = None) -> tuple[float]:
         """
-        Reads acceleration data from the accelerometer. If a timeout is given, the method
-        will throw a AccelerationSensor.TimeoutError if all readings haven't been read in
+        Gets the latest acceleration data from the accelerometer without waiting for a
+        new sample. Only waits if no sample has been read in the last MAX_SAMPLE_AGE
+        seconds, in which case the method will throw a TimeoutError if none is read in
         the given amount of time.
 
         Parameters
         ----------
         timeout: int
-            The number of seconds to stay in the method for before raising a TimeoutError
+            The number of seconds to wait for a recent sample before raising a TimeoutError
 
         Raises
         ------
         TimeoutError
-            Raised when all three acceleration values haven't been read in the given timeout.
+            Raised when no recent acceleration sample has been read in the given timeout.
         BlockingIOError
-            Raised when the accelerometer can not read data.
+            Raised when the accelerometer failed and hasn't been read from since.
 
         Returns
         -------
@@ -35,35 +155,45 @@ class AccelerationSensor:
             A tuple of reading values from the accelerometer (x, y, z)
         """
 
-        accelX = None
-        accelY = None
-        accelZ = None
-        start_time = time()
+        def recent() -> bool:
+            return bool(self._samples) and \
+                time() - self._samples[-1][0] <= AccelerationSensor.MAX_SAMPLE_AGE
 
-        while None in (accelX, accelY, accelZ) and \
-                (timeout is None or (start_time - time()) < start_time + timeout):
+        with self._condition:
+            self._condition.wait_for(lambda: recent() or self._error is not None, timeout)
 
-            events = self.accelerometer.read()
+            # A cached sample would never change once the device failed
+            if self._error is not None:
+                raise BlockingIOError(str(self._error))
+            if recent():
+                return self._samples[-1][1:]
 
-            # Read accelerometer data
-            for event in events:
-                accelEvent = rt_accel.AccelerationEvent(event)
+        raise TimeoutError()
 
-                # Filter out invalid events or yaw
-                if accelEvent.name is not None:
-
-                    # Get appropriate reading type
-                    if accelEvent.name == rt_accel.AccelerationName.X:
-                        accelX = accelEvent.value
-                    # Get appropriate reading type
-                    elif accelEvent.name == rt_accel.AccelerationName.Y:
-                        accelY = accelEvent.value
-                    # Get appropriate reading type
-                    elif accelEvent.name == rt_accel.AccelerationName.Z:
-                        accelZ = accelEvent.value
-
-        accelerations = (accelX, accelY, accelZ)
-        if None in accelerations:
-            raise TimeoutError()
-
-        return accelerations
+    def samples(self, since: Optional[float] = None) -> list[tuple[float, float, float, float]]:
+        """
+        Gets the samples in the ring buffer.
+
+        Parameters
+        ----------
+        since: float, optional
+            Only return samples with a timestamp greater than this one. Returns every
+            buffered sample if None.
+
+        Returns
+        -------
+        list[tuple[float, float, float, float]]
+            The buffered samples as (timestamp, x, y, z), oldest first.
+        """
+
+        with self._condition:
+            if since is None:
+                return list(self._samples)
+            return [sample for sample in self._samples if sample[0] > since]
+
+
+if __name__ == "__main__":
+
+    sensor = AccelerationSensor.shared()
+    print(sensor.read(timeout=4))
+    print(f"{len(sensor.samples())} buffered samples")
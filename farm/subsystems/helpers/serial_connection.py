@@ -1,6 +1,10 @@
 # Written by Jeffrey Bringolf
 
-import serial
+from typing import TYPE_CHECKING
+from ..hardware import backend
+
+if TYPE_CHECKING:
+    import serial
 
 
 class SerialConnection:
@@ -13,13 +17,14 @@ class SerialConnection:
         """
         Initializes the serial connection and wraps it with a TextIOWrapper.
         """
-        serial_connection = serial.Serial(serial_name, timeout=2)
+        self._serial = backend.load().serial
+        serial_connection = self._serial.Serial(serial_name, timeout=2)
         serial_connection.reset_input_buffer()
         serial_connection.flush()
 
         self.connection = serial_connection
 
-    def __enter__(self) -> serial.Serial:
+    def __enter__(self) -> "serial.Serial":
         """
         The enter method called at the beginning of a context management critical section.
         Called at the beginning of a "with x as y:" block.
@@ -67,5 +72,5 @@ class SerialConnection:
             return self.connection.readline().decode('utf-8')
         except UnicodeDecodeError:
             raise
-        except serial.SerialException:
+        except self._serial.SerialException:
             raise
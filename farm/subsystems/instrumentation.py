@@ -0,0 +1,463 @@
+"""
+This module instruments the calls made to the peripherals. Every sensor read and actuator
+command goes through an Instrumentation, which records how long it took in a latency
+histogram along with how many calls failed, timed out or read nothing, per peripheral
+class. Failing reads are counted and turned into empty reads so one broken sensor doesn't
+stop the others from being sent.
+
+Classes:
+    LatencyHistogram: Counts latencies in fixed buckets.
+    PeripheralStats: The latency and outcomes of the calls to one peripheral class.
+    Instrumentation: Times the calls to the peripherals and keeps their statistics.
+
+Usage:
+    instrumentation = Instrumentation()
+    readings = instrumentation.read(sensor)
+    print(instrumentation.to_prometheus())
+"""
+
+from bisect import bisect_left
+from threading import Lock
+from time import perf_counter
+from typing import Optional
+
+from .interfaces.actuators import IActuator
+from .interfaces.command import Command
+from .interfaces.reading import Reading
+from .interfaces.sensors import ISensor
+
+
+class LatencyHistogram:
+    """
+    Counts latencies in buckets with fixed upper bounds, like a Prometheus histogram.
+    Recording a latency costs a binary search and an increment.
+    """
+
+    # The upper bound of each bucket in seconds. Latencies above the last bound are
+    # counted in an extra bucket.
+    BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1,
+               2.5, 5, 10)
+
+    __slots__ = ("counts", "count", "total")
+
+    def __init__(self) -> None:
+        """
+        Initializes an empty histogram.
+
+        Returns
+        -------
+        None
+        """
+
+        self.counts = [0] * (len(LatencyHistogram.BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, latency: float) -> None:
+        """
+        Counts a latency.
+
+        Parameters
+        ----------
+        latency: float
+            The latency in seconds.
+
+        Returns
+        -------
+        None
+        """
+
+        self.counts[bisect_left(LatencyHistogram.BUCKETS, latency)] += 1
+        self.count += 1
+        self.total += latency
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Estimates a quantile as the upper bound of the bucket it falls in.
+
+        Parameters
+        ----------
+        q: float
+            The quantile, between 0 and 1.
+
+        Returns
+        -------
+        float, optional
+            The estimate in seconds. None if nothing was counted, infinity if the quantile
+            is above the last bucket.
+        """
+
+        if self.count == 0:
+            return None
+
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(LatencyHistogram.BUCKETS, self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return float("inf")
+
+
+class PeripheralStats:
+    """
+    The latency and outcomes of the calls to one peripheral class. Safe to update from
+    the executor threads the peripherals are called on.
+    """
+
+    __slots__ = ("latency", "calls", "errors", "timeouts", "empty", "skipped", "_lock")
+
+    def __init__(self) -> None:
+        """
+        Initializes the statistics.
+
+        Returns
+        -------
+        None
+        """
+
+        self.latency = LatencyHistogram()
+        self.calls = 0
+        # The number of errors keyed by exception class name
+        self.errors: dict[str, int] = {}
+        self.timeouts = 0
+        self.empty = 0
+        self.skipped = 0
+        self._lock = Lock()
+
+    def record(self, latency: float, error: Optional[Exception] = None,
+               empty: bool = False) -> None:
+        """
+        Records a call.
+
+        Parameters
+        ----------
+        latency: float
+            The number of seconds the call took.
+        error: Exception, optional
+            The exception the call raised, if any.
+        empty: bool
+            Whether the call was a read which returned no reading.
+
+        Returns
+        -------
+        None
+        """
+
+        with self._lock:
+            self.calls += 1
+            self.latency.observe(latency)
+            if error is not None:
+                name = type(error).__name__
+                self.errors[name] = self.errors.get(name, 0) + 1
+            elif empty:
+                self.empty += 1
+
+    def record_timeout(self) -> None:
+        """
+        Records a call which the caller stopped waiting for.
+
+        Returns
+        -------
+        None
+        """
+
+        with self._lock:
+            self.timeouts += 1
+
+    def record_skipped(self) -> None:
+        """
+        Records a call which wasn't made because the previous one was still running.
+
+        Returns
+        -------
+        None
+        """
+
+        with self._lock:
+            self.skipped += 1
+
+    @property
+    def error_count(self) -> int:
+        """
+        The number of calls which raised an exception.
+
+        Returns
+        -------
+        int
+            The number of errors of every type.
+        """
+
+        return sum(self.errors.values())
+
+    def to_dict(self) -> dict:
+        """
+        Creates a compact dictionary of the statistics, used in health messages.
+
+        Returns
+        -------
+        dict
+            The number of calls, errors, timeouts, empty reads and skipped reads and the
+            estimated median and 99th percentile latency in milliseconds.
+        """
+
+        with self._lock:
+            p50 = self.latency.quantile(0.5)
+            p99 = self.latency.quantile(0.99)
+            return {
+                "n": self.calls,
+                "err": self.error_count,
+                "to": self.timeouts,
+                "empty": self.empty,
+                "skip": self.skipped,
+                "p50": None if p50 is None else p50 * 1000,
+                "p99": None if p99 is None else p99 * 1000
+            }
+
+
+class Instrumentation:
+    """
+    Times the calls to the peripherals and keeps their statistics per peripheral class.
+    """
+
+    # The prefix of every metric name
+    PROMETHEUS_PREFIX = "farm"
+
+    def __init__(self) -> None:
+        """
+        Initializes the instrumentation without any statistics.
+
+        Returns
+        -------
+        None
+        """
+
+        self._reads: dict[str, PeripheralStats] = {}
+        self._controls: dict[str, PeripheralStats] = {}
+        self._lock = Lock()
+
+    def _stats(self, table: dict[str, PeripheralStats], peripheral: object) -> PeripheralStats:
+        """
+        Gets the statistics of a peripheral's class, creating them on first use.
+
+        Parameters
+        ----------
+        table: dict[str, PeripheralStats]
+            The statistics of the reads or of the controls.
+        peripheral: object
+            The sensor or actuator.
+
+        Returns
+        -------
+        PeripheralStats
+            The statistics.
+        """
+
+        name = peripheral.__class__.__name__
+        stats = table.get(name)
+        if stats is None:
+            with self._lock:
+                stats = table.setdefault(name, PeripheralStats())
+        return stats
+
+    def read(self, sensor: ISensor) -> list[Reading]:
+        """
+        Reads a sensor and records the read.
+
+        Parameters
+        ----------
+        sensor: ISensor
+            The sensor to read.
+
+        Returns
+        -------
+        list[Reading]
+            The sensor's readings, an empty list if the read raised an exception.
+        """
+
+        stats = self._stats(self._reads, sensor)
+        start = perf_counter()
+        try:
+            readings = sensor.read()
+        except Exception as e:
+            stats.record(perf_counter() - start, error=e)
+            return []
+
+        stats.record(perf_counter() - start, empty=not readings)
+        return readings
+
+    def record_read_timeout(self, sensor: ISensor) -> None:
+        """
+        Records that a read took longer than the sensor's READ_TIMEOUT.
+
+        Parameters
+        ----------
+        sensor: ISensor
+            The sensor.
+
+        Returns
+        -------
+        None
+        """
+
+        self._stats(self._reads, sensor).record_timeout()
+
+    def record_read_skipped(self, sensor: ISensor) -> None:
+        """
+        Records that a sensor wasn't read because its previous read was still running.
+
+        Parameters
+        ----------
+        sensor: ISensor
+            The sensor.
+
+        Returns
+        -------
+        None
+        """
+
+        self._stats(self._reads, sensor).record_skipped()
+
+    def control(self, actuator: IActuator, command: Command) -> bool:
+        """
+        Controls an actuator and records the call. Exceptions are recorded then raised.
+
+        Parameters
+        ----------
+        actuator: IActuator
+            The actuator to control.
+        command: Command
+            The command to control it with.
+
+        Returns
+        -------
+        bool
+            What the actuator returned.
+        """
+
+        stats = self._stats(self._controls, actuator)
+        start = perf_counter()
+        try:
+            result = actuator.control_actuator(command)
+        except Exception as e:
+            stats.record(perf_counter() - start, error=e)
+            raise
+
+        stats.record(perf_counter() - start)
+        return result
+
+    def record_control_timeout(self, actuator: IActuator) -> None:
+        """
+        Records that a command took longer than the caller waited for.
+
+        Parameters
+        ----------
+        actuator: IActuator
+            The actuator.
+
+        Returns
+        -------
+        None
+        """
+
+        self._stats(self._controls, actuator).record_timeout()
+
+    @property
+    def reads(self) -> dict[str, PeripheralStats]:
+        """
+        The statistics of the reads keyed by sensor class name.
+
+        Returns
+        -------
+        dict[str, PeripheralStats]
+            The statistics.
+        """
+
+        return dict(self._reads)
+
+    @property
+    def controls(self) -> dict[str, PeripheralStats]:
+        """
+        The statistics of the actuator commands keyed by actuator class name.
+
+        Returns
+        -------
+        dict[str, PeripheralStats]
+            The statistics.
+        """
+
+        return dict(self._controls)
+
+    def failure_counts(self) -> dict[str, tuple[int, int]]:
+        """
+        Gets the number of reads and failed reads of every sensor class. A read failed if
+        it raised an exception or timed out.
+
+        Returns
+        -------
+        dict[str, tuple[int, int]]
+            The number of reads and failed reads keyed by sensor class name.
+        """
+
+        return {name: (stats.calls + stats.timeouts, stats.error_count + stats.timeouts)
+                for name, stats in self.reads.items()}
+
+    def to_dict(self) -> dict:
+        """
+        Creates a compact dictionary of every statistic, used in health messages.
+
+        Returns
+        -------
+        dict
+            The statistics of the reads and controls keyed by peripheral class name.
+        """
+
+        return {
+            "reads": {name: stats.to_dict() for name, stats in self.reads.items()},
+            "controls": {name: stats.to_dict() for name, stats in self.controls.items()}
+        }
+
+    def to_prometheus(self) -> str:
+        """
+        Renders every statistic in the Prometheus text exposition format.
+
+        Returns
+        -------
+        str
+            The metrics.
+        """
+
+        lines = []
+        for operation, table, label in (("read", self.reads, "sensor"),
+                                        ("control", self.controls, "actuator")):
+            name = f"{Instrumentation.PROMETHEUS_PREFIX}_{label}_{operation}"
+            lines.append(f"# TYPE {name}_seconds histogram")
+            for peripheral, stats in table.items():
+                with stats._lock:
+                    histogram = stats.latency
+                    cumulative = 0
+                    for bound, count in zip(LatencyHistogram.BUCKETS + ("+Inf",),
+                                            histogram.counts):
+                        cumulative += count
+                        lines.append(f'{name}_seconds_bucket{{{label}="{peripheral}",'
+                                     f'le="{bound}"}} {cumulative}')
+                    lines.append(f'{name}_seconds_sum{{{label}="{peripheral}"}} '
+                                 f'{histogram.total}')
+                    lines.append(f'{name}_seconds_count{{{label}="{peripheral}"}} '
+                                 f'{histogram.count}')
+
+            lines.append(f"# TYPE {name}_errors_total counter")
+            for peripheral, stats in table.items():
+                for error, count in dict(stats.errors).items():
+                    lines.append(f'{name}_errors_total{{{label}="{peripheral}",'
+                                 f'error="{error}"}} {count}')
+
+            for counter in ("timeouts", "empty", "skipped"):
+                if operation == "control" and counter != "timeouts":
+                    continue
+                lines.append(f"# TYPE {name}_{counter}_total counter")
+                for peripheral, stats in table.items():
+                    lines.append(f'{name}_{counter}_total{{{label}="{peripheral}"}} '
+                                 f'{getattr(stats, counter)}')
+
+        return "\n".join(lines) + "\n"
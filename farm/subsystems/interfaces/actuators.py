@@ -1,5 +1,6 @@
-from abc import ABC, abstractmethod
+from abc import ABC, abstractmethod, abstractproperty
 from .command import Command
+from .direct_method import DirectMethod
 from typing import Optional
 
 
@@ -51,6 +52,31 @@ class IActuator(ABC):
             True if the actuator is being controlled, False otherwise.
         """
 
+    @abstractproperty
+    def command_types(self) -> list[Command.Type]:
+        """
+        Returns the types of command this actuator can be controlled with. Used to route
+        commands straight to the actuators which handle them.
+
+        Returns
+        -------
+        list[Command.Type]
+            This actuator's command types.
+        """
+
+    @property
+    def direct_methods(self) -> list[DirectMethod]:
+        """
+        Returns the direct methods which the IoT hub can call to control this actuator.
+        Actuators which can't be controlled from the IoT hub advertise none.
+
+        Returns
+        -------
+        list[DirectMethod]
+            This actuator's direct methods.
+        """
+        return []
+
     @abstractmethod
     def validate_command(self, command: Command) -> bool:
         """
@@ -32,6 +32,16 @@ class Command:
         MOTION_LIGHT_OFF = 'Motion-light-off'
         BOOL = 'Bool'
 
+    class Status(Enum):
+        """
+        The outcome of executing a command
+        """
+        APPLIED = 'Applied'
+        REJECTED = 'Rejected'
+        TIMED_OUT = 'Timed-Out'
+        FAILED = 'Failed'
+
+    __slots__ = ("type", "value", "unit")
 
     def __init__(self, command_type: Type, command_unit: Unit,
                  command_value: Union[int, float, bool, str]) -> None:
@@ -0,0 +1,151 @@
+"""
+This module defines the direct methods which actuators advertise to the IoT hub. Each
+direct method creates one type of command from the payload of a direct method request and
+describes that payload with a JSON schema, so the connection manager can build its method
+table once and the cloud can discover which methods the device supports.
+
+Classes:
+    DirectMethod: A direct method which controls an actuator with a single command.
+
+Usage:
+    method = DirectMethod("fan-on", Command.Type.FAN)
+    error = method.validate({"value": True})
+    if error is None:
+        command = method.create_command({"value": True})
+"""
+
+from typing import Any, Optional
+
+from .command import Command
+
+
+class DirectMethod:
+    """
+    A direct method whose payload contains the value of a single command, along with an
+    optional "wait" flag which tells whether to respond only once the command is applied.
+    """
+
+    # The JSON schema name of each supported value type
+    SCHEMA_TYPES = {
+        bool: "boolean",
+        int: "integer",
+        float: "number",
+        str: "string"
+    }
+
+    __slots__ = ("name", "command_type", "command_unit", "value_types")
+
+    def __init__(self, name: str, command_type: Command.Type,
+                 command_unit: Command.Unit = Command.Unit.BOOL,
+                 value_types: tuple[type, ...] = (bool,)) -> None:
+        """
+        Initializes the direct method.
+
+        Parameters
+        ----------
+        name: str
+            The name of the method, as called from the IoT hub.
+        command_type: Command.Type
+            The type of command the method creates.
+        command_unit: Command.Unit
+            The unit of the command the method creates.
+        value_types: tuple[type, ...]
+            The types the value in the payload can have. Must be keys of SCHEMA_TYPES.
+
+        Returns
+        -------
+        None
+        """
+
+        self.name = name
+        self.command_type = command_type
+        self.command_unit = command_unit
+        self.value_types = value_types
+
+    def validate_value(self, value: Any) -> bool:
+        """
+        Checks whether a value has one of the method's value types. Bools are only valid
+        when bool is one of the value types, even though they are ints in python.
+
+        Parameters
+        ----------
+        value: Any
+            The value from the payload.
+
+        Returns
+        -------
+        bool
+            True if the value is valid.
+        """
+
+        if isinstance(value, bool):
+            return bool in self.value_types
+        return isinstance(value, self.value_types)
+
+    def validate(self, payload: Any) -> Optional[str]:
+        """
+        Validates the payload of a direct method request.
+
+        Parameters
+        ----------
+        payload: Any
+            The payload of the request.
+
+        Returns
+        -------
+        str, optional
+            Why the payload is invalid, None if it is valid.
+        """
+
+        if not isinstance(payload, dict) or "value" not in payload:
+            return "No value was found in the payload"
+
+        if not self.validate_value(payload["value"]):
+            return f"Invalid value for {self.name}, expected {self.schema['properties']['value']}"
+
+        if not isinstance(payload.get("wait", True), bool):
+            return "wait must be a boolean"
+
+        return None
+
+    def create_command(self, payload: dict) -> Command:
+        """
+        Creates the command of a validated payload.
+
+        Parameters
+        ----------
+        payload: dict
+            The payload of the request.
+
+        Returns
+        -------
+        Command
+            The command to execute.
+        """
+
+        return Command(self.command_type, self.command_unit, payload["value"])
+
+    @property
+    def schema(self) -> dict:
+        """
+        The JSON schema of the method's payload.
+
+        Returns
+        -------
+        dict
+            The schema.
+        """
+
+        value_types = [DirectMethod.SCHEMA_TYPES[value_type]
+                       for value_type in self.value_types]
+        return {
+            "type": "object",
+            "properties": {
+                "value": {"type": value_types[0] if len(value_types) == 1 else value_types},
+                "wait": {"type": "boolean"}
+            },
+            "required": ["value"]
+        }
+
+    def __repr__(self) -> str:
+        return f"(DirectMethod: {self.name} -> {self.command_type.value})"
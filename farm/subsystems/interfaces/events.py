@@ -0,0 +1,212 @@
+"""
+This module defines the event channel which lets interrupt driven sensors report events as
+soon as they happen instead of waiting for their next read. Sensor callbacks run on the
+GPIO library's threads, so events are handed to the event loop with call_soon_threadsafe
+and read from an asyncio queue by the farm, which sends them right away.
+
+Classes:
+    EventChannel: A thread safe queue of (subsystem name, reading) events.
+    EventCounter: Counts the events of a sensor between two reads.
+
+Usage:
+    channel = EventChannel()
+    channel.bind(asyncio.get_running_loop())
+    subsystem.set_event_channel(channel)
+    subsystem_name, reading = await channel.get()
+"""
+
+import asyncio
+from threading import Lock
+from typing import Optional
+
+from .reading import Reading
+
+
+class EventChannel:
+    """
+    A queue of events published from any thread and consumed on the event loop. Events
+    published before the channel is bound to a loop are dropped, as are the oldest events
+    when the queue is full.
+    """
+
+    MAX_PENDING = 100
+
+    def __init__(self, max_pending: int = MAX_PENDING) -> None:
+        """
+        Initializes an unbound channel.
+
+        Parameters
+        ----------
+        max_pending: int
+            The number of events kept while the consumer is busy.
+
+        Returns
+        -------
+        None
+        """
+
+        self.max_pending = max_pending
+        self.dropped = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+
+    def bind(self, loop: asyncio.AbstractEventLoop) -> None:
+        """
+        Binds the channel to the event loop its events are consumed on.
+
+        Parameters
+        ----------
+        loop: asyncio.AbstractEventLoop
+            The running event loop.
+
+        Returns
+        -------
+        None
+        """
+
+        self._loop = loop
+        self._queue = asyncio.Queue(self.max_pending)
+
+    def publish(self, subsystem: str, reading: Reading) -> None:
+        """
+        Publishes an event. Safe to call from any thread.
+
+        Parameters
+        ----------
+        subsystem: str
+            The name of the subsystem the event comes from.
+        reading: Reading
+            The event, timestamped when it happened.
+
+        Returns
+        -------
+        None
+        """
+
+        loop = self._loop
+        if loop is None:
+            self.dropped += 1
+            return
+
+        try:
+            loop.call_soon_threadsafe(self._put, subsystem, reading)
+        except RuntimeError:
+            # The loop was closed
+            self.dropped += 1
+
+    def _put(self, subsystem: str, reading: Reading) -> None:
+        """
+        Adds an event to the queue on the event loop, dropping the oldest event if full.
+
+        Parameters
+        ----------
+        subsystem: str
+            The name of the subsystem the event comes from.
+        reading: Reading
+            The event.
+
+        Returns
+        -------
+        None
+        """
+
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait((subsystem, reading))
+
+    async def get(self) -> tuple[str, Reading]:
+        """
+        Waits for the next event.
+
+        Returns
+        -------
+        tuple[str, Reading]
+            The name of the subsystem the event comes from and the event.
+        """
+
+        return await self._queue.get()
+
+    def get_pending(self) -> list[tuple[str, Reading]]:
+        """
+        Gets the events which are already queued without waiting.
+
+        Returns
+        -------
+        list[tuple[str, Reading]]
+            The queued events, oldest first.
+        """
+
+        events = []
+        while self._queue is not None and not self._queue.empty():
+            events.append(self._queue.get_nowait())
+        return events
+
+
+class EventCounter:
+    """
+    Counts the events of a sensor between two reads along with the first and last event,
+    so events which happen within the same interval aren't collapsed into one.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initializes the counter.
+
+        Returns
+        -------
+        None
+        """
+
+        self._lock = Lock()
+        self._count = 0
+        self._first: Optional[Reading] = None
+        self._last: Optional[Reading] = None
+
+    def record(self, reading: Reading) -> None:
+        """
+        Counts an event. Safe to call from any thread.
+
+        Parameters
+        ----------
+        reading: Reading
+            The event.
+
+        Returns
+        -------
+        None
+        """
+
+        with self._lock:
+            self._count += 1
+            if self._first is None:
+                self._first = reading
+            self._last = reading
+
+    def take(self, reading_type: Reading.Type) -> Optional[Reading]:
+        """
+        Creates a summary of the events since the last call and resets the counter.
+
+        Parameters
+        ----------
+        reading_type: Reading.Type
+            The reading type of the summary.
+
+        Returns
+        -------
+        Reading, optional
+            A reading timestamped at the last event whose value contains the number of
+            events and the time of the first and last event. None if there was no event.
+        """
+
+        with self._lock:
+            count, first, last = self._count, self._first, self._last
+            self._count = 0
+            self._first = self._last = None
+
+        if count == 0:
+            return None
+
+        return Reading({"count": count, "first": str(first.timestamp),
+                        "last": str(last.timestamp)},
+                       reading_type, Reading.Unit.NONE, last.timestamp_ns)
@@ -1,9 +1,30 @@
 # Written by Jeffrey Bringolf
 
 import datetime
+from array import array
 from enum import Enum
 from json import dumps
-from typing import Union
+from time import time_ns
+from typing import Iterable, Optional, Union
+
+
+def _local_datetime(timestamp_ns: int) -> datetime.datetime:
+    """
+    Converts a timestamp to a local datetime without losing precision to floats.
+
+    Parameters
+    ----------
+    timestamp_ns: int
+        The number of nanoseconds since the unix epoch.
+
+    Returns
+    -------
+    datetime.datetime
+        The timestamp in local time with microsecond precision.
+    """
+
+    seconds, nanoseconds = divmod(timestamp_ns, 1_000_000_000)
+    return datetime.datetime.fromtimestamp(seconds).replace(microsecond=nanoseconds // 1000)
 
 
 class Reading:
@@ -29,6 +50,8 @@ class Reading:
         DOOR_LOCKED = "Door-Locked"
         MOTION = "Motion"
         NOISE = "Noise"
+        MOTION_EVENTS = "Motion-Events"
+        DOOR_EVENTS = "Door-Events"
 
     class Unit(Enum):
         """
@@ -46,12 +69,17 @@ class Reading:
         def __str__(self):
             return str(self.value)
 
+    # Readings are created every cycle, slots avoid allocating a dict for each one
+    __slots__ = ("reading_type", "value", "reading_unit", "timestamp_ns")
+
     def __init__(self,
                  value: Union[int, float, str],
                  reading_type: Type,
-                 reading_unit: Unit) -> None:
+                 reading_unit: Unit,
+                 timestamp_ns: Optional[int] = None) -> None:
         """
-        Initializes a new reading.
+        Initializes a new reading. The timestamp is stored as an integer and only
+        converted to a datetime when it's serialized.
 
         Parameters
         ----------
@@ -61,6 +89,8 @@ class Reading:
             The type of reading this sensor produces.
         reading_unit: Unit
             The unit that the value of this reading is measured in.
+        timestamp_ns: int, optional
+            The time the reading was taken in nanoseconds since the unix epoch. Now if None.
 
         Returns
         -------
@@ -70,7 +100,39 @@ class Reading:
         self.reading_type = reading_type
         self.value = value
         self.reading_unit = reading_unit
-        self.timestamp = datetime.datetime.now()
+        self.timestamp_ns = time_ns() if timestamp_ns is None else timestamp_ns
+
+    @property
+    def timestamp(self) -> datetime.datetime:
+        """
+        The time the reading was taken, in local time.
+
+        Returns
+        -------
+        datetime.datetime
+            The timestamp with microsecond precision.
+        """
+
+        return _local_datetime(self.timestamp_ns)
+
+    def to_dict(self) -> dict:
+        """
+        Creates a dictionary with the reading value, type, unit and timestamp which can
+        be serialized directly as part of a larger payload.
+
+        Returns
+        -------
+        dict
+            A dictionary containing the reading value, reading type, reading unit and
+            timestamp.
+        """
+
+        return {
+            "value": self.value,
+            "reading_type": self.reading_type.value,
+            "reading_unit": self.reading_unit.value,
+            "timestamp": str(self.timestamp)
+        }
 
     def to_json(self) -> str:
         """
@@ -84,22 +146,210 @@ class Reading:
             parsed as a string.
         """
 
-        data = {
+        return dumps(self.to_dict())
+
+    def __repr__(self) -> str:
+        """
+        Returns a string representation of the Reading object.
+
+        Returns
+        -------
+        str
+            A string representation of the Reading object.
+        """
+
+        return self.to_json()
+
+
+class ReadingBatch:
+    """
+    Many samples of a single reading type stored as parallel columns of timestamps and
+    values, for high rate sensors which would otherwise need a Reading per sample.
+
+    A batch serializes like the Reading of its latest sample, with the other samples added
+    under "samples", so consumers which only understand single readings keep working. A
+    batch must contain at least one sample to be serialized.
+    """
+
+    __slots__ = ("reading_type", "reading_unit", "timestamps_ns", "values")
+
+    def __init__(self,
+                 reading_type: Reading.Type,
+                 reading_unit: Reading.Unit,
+                 timestamps_ns: Iterable[int] = (),
+                 values: Iterable[float] = ()) -> None:
+        """
+        Initializes a new batch of samples.
+
+        Parameters
+        ----------
+        reading_type: Reading.Type
+            The type of reading of every sample.
+        reading_unit: Reading.Unit
+            The unit every sample is measured in.
+        timestamps_ns: Iterable[int]
+            The time each sample was taken in nanoseconds since the unix epoch, oldest first.
+        values: Iterable[float]
+            The value of each sample.
+
+        Raises
+        ------
+        ValueError
+            Raised when there aren't as many timestamps as values.
+
+        Returns
+        -------
+        None
+        """
+
+        self.reading_type = reading_type
+        self.reading_unit = reading_unit
+        self.timestamps_ns = array("q", timestamps_ns)
+        self.values = array("d", values)
+
+        if len(self.timestamps_ns) != len(self.values):
+            raise ValueError("A reading batch needs a timestamp for every value")
+
+    def append(self, value: float, timestamp_ns: Optional[int] = None) -> None:
+        """
+        Adds a sample to the batch.
+
+        Parameters
+        ----------
+        value: float
+            The value of the sample.
+        timestamp_ns: int, optional
+            The time the sample was taken in nanoseconds since the unix epoch. Now if None.
+
+        Returns
+        -------
+        None
+        """
+
+        self.timestamps_ns.append(time_ns() if timestamp_ns is None else timestamp_ns)
+        self.values.append(value)
+
+    @property
+    def value(self) -> float:
+        """
+        The value of the latest sample.
+
+        Returns
+        -------
+        float
+            The latest value.
+        """
+
+        return self.values[-1]
+
+    @property
+    def timestamp_ns(self) -> int:
+        """
+        The time the latest sample was taken in nanoseconds since the unix epoch.
+
+        Returns
+        -------
+        int
+            The latest timestamp.
+        """
+
+        return self.timestamps_ns[-1]
+
+    @property
+    def timestamp(self) -> datetime.datetime:
+        """
+        The time the latest sample was taken, in local time.
+
+        Returns
+        -------
+        datetime.datetime
+            The latest timestamp with microsecond precision.
+        """
+
+        return _local_datetime(self.timestamp_ns)
+
+    def sample_offsets_us(self) -> list[int]:
+        """
+        Gets the time of every sample relative to the latest sample.
+
+        Returns
+        -------
+        list[int]
+            The number of microseconds between each sample and the latest sample, which
+            are zero or negative.
+        """
+
+        latest = self.timestamp_ns // 1000
+        return [timestamp // 1000 - latest for timestamp in self.timestamps_ns]
+
+    def __len__(self) -> int:
+        """
+        The number of samples in the batch.
+
+        Returns
+        -------
+        int
+            The number of samples.
+        """
+
+        return len(self.values)
+
+    def __iter__(self):
+        """
+        Iterates over the samples as individual readings.
+
+        Returns
+        -------
+        Iterator[Reading]
+            A reading per sample, oldest first.
+        """
+
+        for timestamp, value in zip(self.timestamps_ns, self.values):
+            yield Reading(value, self.reading_type, self.reading_unit, timestamp)
+
+    def to_dict(self) -> dict:
+        """
+        Creates a dictionary like Reading.to_dict for the latest sample, with the columns
+        of every sample under "samples".
+
+        Returns
+        -------
+        dict
+            A dictionary containing the latest value, reading type, reading unit,
+            timestamp and the offsets and values of every sample.
+        """
+
+        return {
             "value": self.value,
             "reading_type": self.reading_type.value,
             "reading_unit": self.reading_unit.value,
-            "timestamp": str(self.timestamp)
+            "timestamp": str(self.timestamp),
+            "samples": {
+                "offsets_us": self.sample_offsets_us(),
+                "values": self.values.tolist()
+            }
         }
-        return dumps(data)
+
+    def to_json(self) -> str:
+        """
+        Creates a json object of the batch parsed as a string.
+
+        Returns
+        -------
+        str
+            The batch as returned by to_dict, parsed as a string.
+        """
+
+        return dumps(self.to_dict())
 
     def __repr__(self) -> str:
         """
-        Returns a string representation of the Reading object.
+        Returns a string representation of the ReadingBatch object.
 
         Returns
         -------
         str
-            A string representation of the Reading object.
+            A string representation of the ReadingBatch object.
         """
 
-        return dumps(self.to_json())
+        return self.to_json()
@@ -1,6 +1,6 @@
 from abc import ABC, abstractmethod, abstractproperty
-from .reading import Reading
-from typing import Optional
+from .reading import Reading, ReadingBatch
+from typing import Callable, Optional, Union
 
 
 class ISensor(ABC):
@@ -14,6 +14,19 @@ class ISensor(ABC):
         actuator does not require a GPIO port.
     """
 
+    # The maximum number of seconds a single read may take when sensors are read
+    # concurrently. Sensors which block for longer should override this.
+    READ_TIMEOUT = 5
+
+    # The default number of seconds between each read of this sensor. None means the
+    # sensor is read at the telemetry interval. Can be overridden per reading type by
+    # the device twin.
+    SAMPLING_PERIOD = None
+
+    # The reading types this sensor publishes as events as soon as they happen, see
+    # set_event_publisher. Their polled readings aren't sent again as alarms.
+    EVENT_TYPES = ()
+
     @abstractmethod
     def __init__(self, gpio: Optional[int] = None) -> None:
         """
@@ -39,10 +52,57 @@ class ISensor(ABC):
         """
         self.__gpio = gpio
 
+    def sampling_period(self, sampling_intervals: dict[Reading.Type, float],
+                        default_period: float) -> float:
+        """
+        Gets the number of seconds between each read of this sensor. If the sampling
+        intervals contain any of this sensor's reading types, the shortest of those
+        intervals is used so every reading type is sampled at least as often as configured.
+
+        Parameters
+        ----------
+        sampling_intervals: dict[Reading.Type, float]
+            The configured sampling interval in seconds of each reading type.
+        default_period: float
+            The number of seconds to use when neither the sampling intervals nor the
+            sensor's SAMPLING_PERIOD specify a period.
+
+        Returns
+        -------
+        float
+            The sampling period of this sensor in seconds.
+        """
+
+        configured = [sampling_intervals[reading_type] for reading_type in self.reading_types
+                      if reading_type in sampling_intervals]
+        if configured:
+            return min(configured)
+
+        if self.SAMPLING_PERIOD is not None:
+            return self.SAMPLING_PERIOD
+
+        return default_period
+
+    def set_event_publisher(self, publish: Callable[[Reading], None]) -> None:
+        """
+        Gives the sensor a function to publish events with as soon as they happen.
+        Sensors which don't produce events ignore it.
+
+        Parameters
+        ----------
+        publish: Callable[[Reading], None]
+            Publishes a timestamped event. Safe to call from any thread.
+
+        Returns
+        -------
+        None
+        """
+
     @abstractmethod
-    def read(self) -> list[Reading]:
+    def read(self) -> list[Union[Reading, ReadingBatch]]:
         """
-        Generates a list of readings based on sensor data.
+        Generates a list of readings based on sensor data. High rate sensors can return a
+        ReadingBatch holding many samples of a reading type instead of a Reading per sample.
 
         Raises
         ------
@@ -51,7 +111,7 @@ class ISensor(ABC):
 
         Returns
         -------
-        list[Reading]
+        list[Union[Reading, ReadingBatch]]
             A list of reading objects generated from sensor data.
         """
 
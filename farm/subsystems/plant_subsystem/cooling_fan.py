@@ -40,11 +40,12 @@ Usage:
         # Turn off when done
         fan.control_actuator(off_command)
 """
-from gpiozero import DigitalOutputDevice
 from time import sleep
+from ..hardware import backend
 from ..interfaces.actuators import IActuator
 from ..interfaces.sensors import ISensor
 from ..interfaces.command import Command
+from ..interfaces.direct_method import DirectMethod
 from ..interfaces.reading import Reading
 from enum import Enum
 
@@ -78,6 +79,8 @@ class Fan(IActuator, ISensor):
         The unit of measurement for the readings provided by the fan actuator.
     """
 
+    SAMPLING_PERIOD = 30
+
     class State(Enum):
         """
         Represents the state of the fan actuator, either ON or OFF.
@@ -87,13 +90,13 @@ class Fan(IActuator, ISensor):
 
         @classmethod
         def contains(cls, value: "Fan.State") -> bool:
-            return len([x for x in iter(cls) if x.value == value]) > 0
+            return value in cls._value2member_map_
 
     def __init__(self, gpio: int) -> None:
         """
         Represents the state of the fan actuator, either ON or OFF.
         """
-        self.fan = DigitalOutputDevice(gpio)
+        self.fan = backend.load().DigitalOutputDevice(gpio)
         self._reading_types = [Reading.Type.FAN]
         self._reading_units = [Reading.Unit.BOOL]
 
@@ -164,6 +167,20 @@ class Fan(IActuator, ISensor):
         """
         return self._reading_units
 
+    @property
+    def command_types(self) -> list[Command.Type]:
+        """
+        The types of command which control the fan actuator.
+        """
+        return [Command.Type.FAN]
+
+    @property
+    def direct_methods(self) -> list[DirectMethod]:
+        """
+        The direct method which turns the fan actuator on or off.
+        """
+        return [DirectMethod("fan-on", Command.Type.FAN)]
+
 
 if __name__ == "__main__":
     # Example usage
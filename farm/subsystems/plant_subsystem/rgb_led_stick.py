@@ -20,7 +20,7 @@ Attributes:
                     or off.
 
 Usage:
-    led_strip = RGBLedStick(count=10, color=Color(255, 0, 0))
+    led_strip = RGBLedStick(count=10, color=backend.load().Color(255, 0, 0))
     delay = 3
     while True:
         readings = led_strip.read()
@@ -32,18 +32,19 @@ Usage:
 """
 from enum import Enum
 from time import sleep
-from rpi_ws281x import Color
-from grove.grove_ws2813_rgb_led_strip import GroveWS2813RgbStrip, LED_BRIGHTNESS
+from ..hardware import backend
 from ..interfaces.sensors import ISensor
 from ..interfaces.actuators import IActuator
 from ..interfaces.reading import Reading
 from ..interfaces.command import Command
+from ..interfaces.direct_method import DirectMethod
 from typing import Optional
 
 
 class RGBLedStick(ISensor, IActuator):
     LED_ON_BRIGHTNESS = 255
     LED_OFF_BRIGHTNESS = 0
+    SAMPLING_PERIOD = 30
     """
     Represents a RGB LED Stick connected to a Raspberry Pi.
 
@@ -91,9 +92,12 @@ class RGBLedStick(ISensor, IActuator):
             """
             Returns True if the given value is a member of the RGBLedStick.State Enum.
             """
-            return len([x for x in iter(cls) if x.value == value]) > 0
+            return value in cls._value2member_map_
 
-    def __init__(self, gpio: Optional[int] = 18, count: int = 10, color: Optional[Color] = Color(255, 0, 0)):
+    # The default color, red
+    DEFAULT_COLOR = (255, 0, 0)
+
+    def __init__(self, gpio: Optional[int] = 18, count: int = 10, color: Optional[int] = None):
         """
         Initializes the RGBLedStick object.
 
@@ -103,11 +107,14 @@ class RGBLedStick(ISensor, IActuator):
             The GPIO pin number used to communicate with the RGB LED Strip. Default is 12.
         count: int
             The number of pixels in the RGB LED Strip. Default is 10.
-        color: Color
-            The default color of the RGB LED Strip. Default is red.
+        color: int
+            The default color of the RGB LED Strip, created with Color. Default is red.
 
         """
-        self.__strip = GroveWS2813RgbStrip(gpio, count)
+        hardware = backend.load()
+        if color is None:
+            color = hardware.Color(*RGBLedStick.DEFAULT_COLOR)
+        self.__strip = hardware.GroveWS2813RgbStrip(gpio, count)
         self.__reading_types = [Reading.Type.RGB_LED_STICK]
         self.__reading_units = [Reading.Unit.BOOL]
         for i in range(self.__strip.numPixels()):
@@ -134,6 +141,20 @@ class RGBLedStick(ISensor, IActuator):
         """
         return self.__reading_units
 
+    @property
+    def command_types(self) -> list[Command.Type]:
+        """
+        Returns the types of command which control this actuator.
+        """
+        return [Command.Type.RGB_LED_STICK]
+
+    @property
+    def direct_methods(self) -> list[DirectMethod]:
+        """
+        Returns the direct method which turns this actuator on or off.
+        """
+        return [DirectMethod("led-on", Command.Type.RGB_LED_STICK)]
+
     def validate_command(self, command: Command) -> bool:
         """
         Validates a command object to ensure it is appropriate for controlling the 
@@ -180,7 +201,7 @@ if __name__ == "__main__":
     # initialize the RGBLedStick object with the specified parameters
     PIN = 18
     COUNT = 10
-    strip = RGBLedStick(PIN, COUNT, Color(255, 0, 0))
+    strip = RGBLedStick(PIN, COUNT, backend.load().Color(255, 0, 0))
 
     delay = 5
 
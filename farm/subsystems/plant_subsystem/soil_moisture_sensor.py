@@ -24,7 +24,7 @@ Usage:
         sleep(delay)
 """
 from time import sleep
-from grove.adc import ADC
+from ..hardware import backend
 from ..interfaces.sensors import ISensor
 from ..interfaces.reading import Reading
 from typing import Optional
@@ -40,6 +40,8 @@ class SoilMoistureSensor(ISensor):
         The GPIO pin number used to connect the sensor. Default is None.
     """
 
+    SAMPLING_PERIOD = 60
+
     def __init__(self, gpio: Optional[int] = 0) -> None:
         """
         Initializes a SoilMoistureSensor object.
@@ -50,7 +52,7 @@ class SoilMoistureSensor(ISensor):
             The GPIO pin number used to connect the sensor. Default is None.
         """
 
-        self.soil_moisture_sensor = ADC(0x04)
+        self.soil_moisture_sensor = backend.load().ADC(0x04)
         self.moisture_channel = gpio
         self._reading_types = [Reading.Type.SOIL_MOISTURE]
         self._reading_units = [Reading.Unit.PERCENTAGE]
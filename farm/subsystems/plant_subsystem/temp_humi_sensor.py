@@ -31,7 +31,7 @@ from time import sleep
 from typing import Optional
 from ..interfaces.sensors import ISensor
 from ..interfaces.reading import Reading
-from grove.grove_temperature_humidity_aht20 import GroveTemperatureHumidityAHT20
+from ..hardware import backend
 
 
 class TemperatureHumiditySensor(ISensor):
@@ -47,6 +47,8 @@ class TemperatureHumiditySensor(ISensor):
         humidity.
     """
 
+    SAMPLING_PERIOD = 30
+
     def __init__(self, gpio: Optional[int] = None,
                  reading_types: Optional[list[Reading.Type]] = [Reading.Type.TEMPERATURE, Reading.Type.HUMIDITY]):
         """
@@ -58,7 +60,7 @@ class TemperatureHumiditySensor(ISensor):
             - temperature,
                 humidity or both. Defaults to both.
         """
-        self.sensor = GroveTemperatureHumidityAHT20(0x38, 4)
+        self.sensor = backend.load().GroveTemperatureHumidityAHT20(0x38, 4)
         self._reading_types = reading_types
 
         self._reading_units = []
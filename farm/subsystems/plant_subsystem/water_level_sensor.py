@@ -22,7 +22,7 @@ Usage:
         sleep(delay)
 """
 from time import sleep
-from grove.adc import ADC
+from ..hardware import backend
 from ..interfaces.sensors import ISensor
 from ..interfaces.reading import Reading
 from typing import Optional
@@ -38,6 +38,8 @@ class WaterLevelSensor(ISensor):
         The GPIO pin number used to connect the sensor. Default is None.
     """
 
+    SAMPLING_PERIOD = 60
+
     def __init__(self, gpio: Optional[int] = 2) -> None:
         """
         Initializes a WaterLevelSensor object.
@@ -48,7 +50,7 @@ class WaterLevelSensor(ISensor):
             The GPIO pin number used to connect the sensor. Default is None.
         """
 
-        self.water_level_sensor = ADC(0x04)
+        self.water_level_sensor = backend.load().ADC(0x04)
         self.water_channel = gpio
         self._reading_types = [Reading.Type.WATER_LEVEL]
         self._reading_units = [Reading.Unit.CENTIMETERS]
@@ -1,7 +1,6 @@
-import seeed_python_reterminal.core as rt
-
 from ..interfaces.sensors import ISensor
 from ..interfaces.reading import Reading
+from ..hardware import backend
 from time import sleep
 
 
@@ -11,9 +10,10 @@ class SecurityLumonisitySensor(ISensor):
         self._reading_types = [Reading.Type.LUMINOSITY]
         self._reading_units = [Reading.Unit.LUX]
         self._current_value = 0
+        self._reterminal = backend.load().reterminal
 
     def read(self) -> list[Reading]:
-        return [Reading(rt.illuminance, self._reading_types[0], self._reading_units[0])]
+        return [Reading(self._reterminal.illuminance, self._reading_types[0], self._reading_units[0])]
 
     @property
     def reading_types(self) -> Reading.Type:
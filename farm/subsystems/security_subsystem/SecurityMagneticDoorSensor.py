@@ -1,24 +1,55 @@
-from gpiozero import Button
+from ..hardware import backend
+from ..interfaces.events import EventCounter
 from ..interfaces.sensors import ISensor
 from ..interfaces.reading import Reading
 
 
 class SecurityMagneticDoorSensor(ISensor):
+    """
+    Tracks the door from the magnetic switch's interrupts instead of polling it. The
+    switch is pressed while the door is closed. Every time the door opens or closes a
+    Door-Opened event is published, and reads report the door state along with the number
+    of openings since the previous read and the time of the first and last one.
+    """
+
+    EVENT_TYPES = (Reading.Type.DOOR_OPENED,)
 
     def __init__(self, gpio: int = None) -> None:
-        self._sensor_ = Button(gpio)
-        self._reading_types = [Reading.Type.DOOR_LOCKED]
-        self._reading_units = [Reading.Unit.BOOL]
+        self._sensor_ = backend.load().Button(gpio)
+        self._reading_types = [Reading.Type.DOOR_LOCKED, Reading.Type.DOOR_OPENED,
+                               Reading.Type.DOOR_EVENTS]
+        self._reading_units = [Reading.Unit.BOOL, Reading.Unit.BOOL, Reading.Unit.NONE]
+        self._openings = EventCounter()
+        self._publish = None
+        self._reading_value = self._sensor_.is_pressed
+        self._sensor_.when_pressed = self.__closed__
+        self._sensor_.when_released = self.__opened__
+
+    def set_event_publisher(self, publish) -> None:
+        self._publish = publish
+
+    def __opened__(self) -> None:
+        self._reading_value = False
+        event = Reading(True, self._reading_types[1], self._reading_units[1])
+        self._openings.record(event)
+        if self._publish is not None:
+            self._publish(event)
+
+    def __closed__(self) -> None:
+        self._reading_value = True
+        if self._publish is not None:
+            self._publish(Reading(False, self._reading_types[1], self._reading_units[1]))
 
     def read(self) -> list[Reading]:
-        if self._sensor_.is_pressed:
-            self._reading_value = True
-        else:
-            self._reading_value = False
-
-        return [Reading(value=self._reading_value,
-                        reading_type=self._reading_types[0],
-                        reading_unit=self._reading_units[0])]
+        readings = [Reading(value=self._reading_value,
+                            reading_type=self._reading_types[0],
+                            reading_unit=self._reading_units[0])]
+
+        summary = self._openings.take(self._reading_types[2])
+        if summary is not None:
+            readings.append(summary)
+
+        return readings
 
     @property
     def reading_types(self) -> Reading.Type:
@@ -1,4 +1,5 @@
-from grove.grove_mini_pir_motion_sensor import GroveMiniPIRMotionSensor
+from ..hardware import backend
+from ..interfaces.events import EventCounter
 from ..interfaces.sensors import ISensor
 from ..interfaces.reading import Reading
 
@@ -6,23 +7,39 @@ from time import sleep
 
 
 class SecurityMotionSensor(ISensor):
+    """
+    Publishes a motion event as soon as the PIR sensor detects motion. Reads report
+    whether motion was detected since the previous read, along with the number of
+    detections and the time of the first and last one.
+    """
+
+    EVENT_TYPES = (Reading.Type.MOTION,)
 
     def __init__(self, gpio=int) -> None:
-        self._sensor_ = GroveMiniPIRMotionSensor(gpio)
+        self._sensor_ = backend.load().GroveMiniPIRMotionSensor(gpio)
         self._sensor_.on_detect = self.__callback__
-        self._reading_types = [Reading.Type.MOTION]
-        self._reading_units = [Reading.Unit.BOOL]
-        self._current_value = False
+        self._reading_types = [Reading.Type.MOTION, Reading.Type.MOTION_EVENTS]
+        self._reading_units = [Reading.Unit.BOOL, Reading.Unit.NONE]
+        self._detections = EventCounter()
+        self._publish = None
+
+    def set_event_publisher(self, publish) -> None:
+        self._publish = publish
 
     def __callback__(self) -> None:
-        self._current_value = True
+        event = Reading(True, self._reading_types[0], self._reading_units[0])
+        self._detections.record(event)
+        if self._publish is not None:
+            self._publish(event)
         print("Motion Detected")
 
     def read(self) -> list[Reading]:
-        reading = [Reading(value=self._current_value,
-                        reading_type=self._reading_types[0],
-                        reading_unit=self._reading_units[0])]
-        self._current_value = False
+        summary = self._detections.take(self._reading_types[1])
+        reading = [Reading(value=summary is not None,
+                           reading_type=self._reading_types[0],
+                           reading_unit=self._reading_units[0])]
+        if summary is not None:
+            reading.append(summary)
         return reading
 
     @property
@@ -1,6 +1,6 @@
 from ..interfaces.sensors import ISensor
 from ..interfaces.reading import Reading
-from grove.adc import ADC
+from ..hardware import backend
 from time import sleep
 import math
 from typing import Optional
@@ -9,7 +9,7 @@ from typing import Optional
 class SecurityNoiseSensor(ISensor):
 
     def __init__(self, i2c_address: Optional[int] = None, adc_channel: Optional[int] = 4) -> None:
-        self._sensor_ = ADC(i2c_address)
+        self._sensor_ = backend.load().ADC(i2c_address)
         self._channel = adc_channel
         self._reading_types = [Reading.Type.NOISE]
         self._reading_units = [Reading.Unit.DECIBEL]
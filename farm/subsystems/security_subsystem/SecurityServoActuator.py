@@ -1,9 +1,9 @@
 from time import sleep
-from gpiozero import Servo
-from gpiozero.pins.pigpio import PiGPIOFactory
 
+from ..hardware import backend
 from ..interfaces.actuators import IActuator
 from ..interfaces.command import Command
+from ..interfaces.direct_method import DirectMethod
 from ..interfaces.sensors import ISensor
 from ..interfaces.reading import Reading
 
@@ -19,11 +19,12 @@ class SecurityServoActuator(IActuator, ISensor):
 
         @classmethod
         def contains(cls, value: bool) -> bool:
-            return value in [member.value for member in cls]
+            return value in cls._value2member_map_
 
     def __init__(self, gpio: int) -> None:
-        self._factory_ = PiGPIOFactory()
-        self._servo_ = Servo(gpio, min_pulse_width=0.5/1000,
+        hardware = backend.load()
+        self._factory_ = hardware.PiGPIOFactory()
+        self._servo_ = hardware.Servo(gpio, min_pulse_width=0.5/1000,
                              max_pulse_width=2.5/1500,
                              pin_factory=self._factory_)
 
@@ -54,6 +55,14 @@ class SecurityServoActuator(IActuator, ISensor):
     def reading_units(self) -> list[Reading.Unit]:
         return self._reading_units
 
+    @property
+    def command_types(self) -> list[Command.Type]:
+        return [Command.Type.MICRO_SERVO_MOTOR]
+
+    @property
+    def direct_methods(self) -> list[DirectMethod]:
+        return [DirectMethod("door-lock", Command.Type.MICRO_SERVO_MOTOR)]
+
 
 if __name__ == "__main__":
     servo = SecurityServoActuator(12)
@@ -2,15 +2,18 @@
 
 from enum import Enum
 from time import sleep
-import seeed_python_reterminal.core as rt
+from ..hardware import backend
 from ..interfaces.reading import Reading
 from ..interfaces.sensors import ISensor
 from ..interfaces.command import Command
+from ..interfaces.direct_method import DirectMethod
 from ..interfaces.actuators import IActuator
 
 
 class Buzzer(ISensor, IActuator):
 
+    SAMPLING_PERIOD = 30
+
     class State(Enum):
         ON = True
         OFF = False
@@ -31,7 +34,7 @@ class Buzzer(ISensor, IActuator):
                 True if the state is in the enum. False otherwise.
             """
 
-            return len([x for x in iter(cls) if x.value == value]) > 0
+            return value in cls._value2member_map_
 
         @classmethod
         def has_value(cls, value: bool) -> bool:
@@ -52,11 +55,12 @@ class Buzzer(ISensor, IActuator):
             return value in cls._value2member_map_
 
     def __init__(self, gpio=None) -> None:
+        self._reterminal = backend.load().reterminal
         self._reading_types = [Reading.Type.BUZZER]
         self._reading_units = [Reading.Unit.BOOL]
 
     def read(self) -> list[Reading]:
-        return [Reading(rt.buzzer, self.reading_types[0], self.reading_units[0])]
+        return [Reading(self._reterminal.buzzer, self.reading_types[0], self.reading_units[0])]
 
     @property
     def reading_types(self) -> list[Reading.Type]:
@@ -66,6 +70,14 @@ class Buzzer(ISensor, IActuator):
     def reading_units(self) -> list[Reading.Unit]:
         return self._reading_units
 
+    @property
+    def command_types(self) -> list[Command.Type]:
+        return [Command.Type.BUZZER]
+
+    @property
+    def direct_methods(self) -> list[DirectMethod]:
+        return [DirectMethod("buzzer-on", Command.Type.BUZZER)]
+
     def control_actuator(self, command: Command) -> bool:
 
         # Guard on command validity
@@ -74,10 +86,10 @@ class Buzzer(ISensor, IActuator):
 
         if command.value == Buzzer.State.ON.value:
             # Buzzer on
-            rt.buzzer = True
+            self._reterminal.buzzer = True
         elif command.value == Buzzer.State.OFF.value:
             # Buzzer off
-            rt.buzzer = False
+            self._reterminal.buzzer = False
         else:
             return False
 
@@ -1,8 +1,16 @@
 # Written by Jeffrey Bringolf
 
+import asyncio
 from abc import ABC, abstractmethod
+from concurrent.futures import Executor, Future
+from functools import partial
+from threading import Event, Lock
+from typing import Optional
 from .interfaces.actuators import IActuator
 from .interfaces.command import Command
+from .interfaces.direct_method import DirectMethod
+from .interfaces.events import EventChannel
+from .instrumentation import Instrumentation
 from .interfaces.sensors import ISensor
 from .interfaces.reading import Reading
 
@@ -10,6 +18,10 @@ from .interfaces.reading import Reading
 class Subsystem(object):
     """A subsystem which is responsible for one portion of the farm."""
 
+    # The fraction of a sensor's sampling period it can be read early by. Prevents a
+    # sensor from skipping a tick because the tick started slightly before it was due.
+    DUE_TOLERANCE = 0.1
+
     def __init__(self) -> None:
         """
         Initializes the controller.
@@ -19,6 +31,20 @@ class Subsystem(object):
         None
         """
 
+        # Reads which are still running in an executor, keyed by sensor. Used to avoid
+        # starting a second read of a sensor whose previous read timed out.
+        self._pending_reads: dict[ISensor, asyncio.Future] = {}
+        # The time each sensor was scheduled to be sampled at the last time it was due.
+        self._last_samples: dict[ISensor, float] = {}
+        # The actuators which handle each type of command, built as actuators are added
+        self._command_routes: dict[Command.Type, list[IActuator]] = {}
+        # Held while an actuator executes a command so commands don't interleave
+        self._actuator_locks: dict[IActuator, Lock] = {}
+        # The last command of each actuator which timed out, the actuator is busy until
+        # it's done
+        self._timed_out_commands: dict[IActuator, Future] = {}
+        # Records the latency and outcome of every call to the peripherals
+        self._instrumentation = Instrumentation()
         self.set_default_periferals()
 
     # Forward referencing allows us to return type hinting for a class that we are currently inside.
@@ -50,6 +76,25 @@ class Subsystem(object):
         """
 
         self.actuators.append(actuator)
+        self._route_commands(actuator)
+
+    def _route_commands(self, actuator: IActuator) -> None:
+        """
+        Adds an actuator to the routing table of the command types it handles.
+
+        Parameters
+        ----------
+        actuator: IActuator
+            The actuator to route commands to.
+
+        Returns
+        -------
+        None
+        """
+
+        self._actuator_locks.setdefault(actuator, Lock())
+        for command_type in actuator.command_types:
+            self._command_routes.setdefault(command_type, []).append(actuator)
 
     def add_sensor(self, sensor: ISensor) -> None:
         """
@@ -67,38 +112,365 @@ class Subsystem(object):
 
         self.sensors.append(sensor)
 
-    def read_sensors(self) -> list[Reading]:
+    def set_event_channel(self, channel: EventChannel) -> None:
+        """
+        Lets the sensors of this subsystem publish their events on a channel, under this
+        subsystem's name.
+
+        Parameters
+        ----------
+        channel: EventChannel
+            The channel to publish events on.
+
+        Returns
+        -------
+        None
+        """
+
+        for sensor in self._sensors:
+            sensor.set_event_publisher(partial(channel.publish, self.__class__.__name__))
+
+    def set_instrumentation(self, instrumentation: Instrumentation) -> None:
+        """
+        Records the calls to this subsystem's peripherals in an instrumentation, usually
+        shared by every subsystem.
+
+        Parameters
+        ----------
+        instrumentation: Instrumentation
+            The instrumentation to record the calls in.
+
+        Returns
+        -------
+        None
+        """
+
+        self._instrumentation = instrumentation
+
+    def due_sensors(self, now: float, sampling_intervals: dict[Reading.Type, float],
+                    default_period: float) -> list[ISensor]:
+        """
+        Gets the sensors which are due to be sampled and marks them as sampled. Sensors
+        keep to their own cadence so a late tick doesn't push their later samples back.
+
+        Parameters
+        ----------
+        now: float
+            The current time in seconds, from a monotonic clock.
+        sampling_intervals: dict[Reading.Type, float]
+            The configured sampling interval in seconds of each reading type.
+        default_period: float
+            The sampling period of sensors which don't have one of their own.
+
+        Returns
+        -------
+        list[ISensor]
+            The sensors which should be read now.
+        """
+
+        due = []
+        for sensor in self._sensors:
+            period = sensor.sampling_period(sampling_intervals, default_period)
+            last_sample = self._last_samples.get(sensor)
+
+            if last_sample is not None:
+                next_sample = last_sample + period
+                if now < next_sample - period * Subsystem.DUE_TOLERANCE:
+                    continue
+
+                # Start a new cadence if the sensor fell a whole period behind
+                self._last_samples[sensor] = next_sample if now - next_sample < period else now
+            else:
+                self._last_samples[sensor] = now
+
+            due.append(sensor)
+
+        return due
+
+    def read_sensors(self, sensors: Optional[list[ISensor]] = None) -> list[Reading]:
         """
         Reads from all the sensors in the controller and returns their readings.
 
+        Parameters
+        ----------
+        sensors: list[ISensor], optional
+            The sensors to read from. Reads every sensor in the controller if None.
+
         Returns
         -------
         list[Reading]
             A list of all the readings from the sensors.
         """
 
+        if sensors is None:
+            sensors = self._sensors
+
         readings = []
-        for sensor in self._sensors:
-            readings.extend(sensor.read())
+        for sensor in sensors:
+            readings.extend(self._instrumentation.read(sensor))
 
         return readings
 
-    def control_actuators(self, commands: list[Command]) -> None:
+    async def read_sensors_concurrently(self, executor: Executor,
+                                        sensors: Optional[list[ISensor]] = None
+                                        ) -> list[Reading]:
         """
-        Controls the appropriate actuators in this controller depending on the commands
+        Reads from all the sensors in the controller at the same time, running each
+        blocking read in the executor. A sensor which takes longer than its READ_TIMEOUT
+        contributes no readings, and it is skipped until its previous read finishes.
+
+        Parameters
+        ----------
+        executor: Executor
+            The executor used to run the blocking sensor reads.
+        sensors: list[ISensor], optional
+            The sensors to read from. Reads every sensor in the controller if None.
+
+        Returns
+        -------
+        list[Reading]
+            A list of all the readings from the sensors, in the same order as read_sensors.
+        """
+
+        if sensors is None:
+            sensors = self._sensors
+
+        loop = asyncio.get_running_loop()
+
+        async def read(sensor: ISensor) -> list[Reading]:
+            pending = self._pending_reads.get(sensor)
+            if pending is not None and not pending.done():
+                self._instrumentation.record_read_skipped(sensor)
+                return []
+
+            future = loop.run_in_executor(executor, self._instrumentation.read, sensor)
+            self._pending_reads[sensor] = future
+            try:
+                # Shield the future so a timeout doesn't cancel it, the thread can't be
+                # interrupted anyways and the future is how we know it's still running.
+                return await asyncio.wait_for(asyncio.shield(future), sensor.READ_TIMEOUT)
+            except asyncio.TimeoutError:
+                self._instrumentation.record_read_timeout(sensor)
+                return []
+
+        results = await asyncio.gather(*[read(sensor) for sensor in sensors])
+
+        readings = []
+        for result in results:
+            readings.extend(result)
+
+        return readings
+
+    def control_actuators(self, commands: list[Command]) -> list[bool]:
+        """
+        Controls the appropriate actuators in this controller depending on the commands.
+        Each command only goes to the actuators which handle its type. Waits for the
+        actuator's lock so commands don't interleave with control_actuators_concurrently.
 
         Parameters
         ----------
         commands: list[Command]
             The list of commands used to control the actuators.
+
+        Returns
+        -------
+        list[bool]
+            Whether each command was valid for at least one actuator, in the same order
+            as the commands.
         """
 
-        # Attempt to use each command on each actuator
+        applied = []
         for command in commands:
-            for actuator in self._actuators:
+            handled = False
+            for actuator in self._command_routes.get(command.type, ()):
                 # Control the actuator if the command is valid.
                 if actuator.validate_command(command):
-                    actuator.control_actuator(command)
+                    with self._actuator_locks[actuator]:
+                        self._instrumentation.control(actuator, command)
+                    handled = True
+            applied.append(handled)
+
+        return applied
+
+    async def control_actuators_concurrently(self, executor: Executor,
+                                             commands: list[Command],
+                                             timeout: float) -> list[Command.Status]:
+        """
+        Controls the appropriate actuators on an executor so slow actuators don't block
+        the event loop. Different actuators are controlled at the same time while the
+        commands of a single actuator are executed one at a time, in order.
+
+        Parameters
+        ----------
+        executor: Executor
+            The executor to control the actuators on.
+        commands: list[Command]
+            The commands used to control the actuators.
+        timeout: float
+            The number of seconds each command may take, counted from when it starts
+            executing. A command which takes longer keeps executing in the background,
+            and the commands after it for the same actuator are rejected until it's done.
+
+        Returns
+        -------
+        list[Command.Status]
+            The status of each command, in the same order as the commands.
+        """
+
+        loop = asyncio.get_running_loop()
+
+        # The commands of each actuator, each with the future completed once it starts
+        # executing and the future completed with whether it was executed
+        jobs: dict[IActuator, list[tuple[Command, Future, Future]]] = {}
+        # The actuators which handle each command
+        routes: list[list[IActuator]] = []
+        for command in commands:
+            actuators = [actuator for actuator in self._command_routes.get(command.type, ())
+                         if actuator.validate_command(command)]
+            for actuator in actuators:
+                jobs.setdefault(actuator, []).append((command, Future(), Future()))
+            routes.append(actuators)
+
+        async def run(actuator: IActuator,
+                      job: list[tuple[Command, Future, Future]]) -> list[Command.Status]:
+            timed_out = self._timed_out_commands.get(actuator)
+            if timed_out is not None and not timed_out.done():
+                # Don't tie up another executor thread waiting for a stuck actuator
+                return [Command.Status.REJECTED] * len(job)
+
+            cancelled = Event()
+            loop.run_in_executor(executor, self._execute_commands, actuator, job, timeout,
+                                 cancelled)
+
+            statuses = []
+            for command, started, executed in job:
+                executed_future = asyncio.wrap_future(executed)
+                # Each command's timeout starts once it starts executing, not while it
+                # waits for the actuator's previous commands
+                await asyncio.wait([asyncio.wrap_future(started), executed_future],
+                                   return_when=asyncio.FIRST_COMPLETED)
+                try:
+                    # Shield the future so a timeout doesn't cancel it, it's completed by
+                    # the actuator's thread once it's done.
+                    applied = await asyncio.wait_for(asyncio.shield(executed_future),
+                                                     timeout)
+                except asyncio.TimeoutError:
+                    self._instrumentation.record_control_timeout(actuator)
+                    self._timed_out_commands[actuator] = executed
+                    # The actuator's thread skips the commands after a stuck one
+                    cancelled.set()
+                    statuses.append(Command.Status.TIMED_OUT)
+                    statuses.extend([Command.Status.REJECTED] * (len(job) - len(statuses)))
+                    break
+                except Exception:
+                    statuses.append(Command.Status.FAILED)
+                else:
+                    # The actuator was still busy with a command which timed out
+                    statuses.append(Command.Status.APPLIED if applied
+                                    else Command.Status.REJECTED)
+
+            return statuses
+
+        actuator_statuses = dict(zip(jobs, await asyncio.gather(
+            *[run(actuator, job) for actuator, job in jobs.items()])))
+
+        # The status of a command sent to several actuators is the worst of their statuses
+        results = []
+        for actuators in routes:
+            statuses = {actuator_statuses[actuator].pop(0) for actuator in actuators}
+            if not statuses:
+                results.append(Command.Status.REJECTED)
+                continue
+            results.append(next((status for status in (Command.Status.TIMED_OUT,
+                                                       Command.Status.FAILED,
+                                                       Command.Status.REJECTED)
+                                 if status in statuses), Command.Status.APPLIED))
+
+        return results
+
+    def _execute_commands(self, actuator: IActuator,
+                          job: list[tuple[Command, Future, Future]], timeout: float,
+                          cancelled: Event) -> None:
+        """
+        Executes the commands of an actuator in order while holding its lock. Runs on an
+        executor thread. The commands are skipped if the actuator is still busy with a
+        previous command after the timeout, so a stuck actuator only holds a single
+        executor thread.
+
+        Parameters
+        ----------
+        actuator: IActuator
+            The actuator to control.
+        job: list[tuple[Command, Future, Future]]
+            Each command along with the future to complete once it starts executing and
+            the future to complete with whether it was executed.
+        timeout: float
+            The number of seconds to wait for the actuator's previous commands.
+        cancelled: Event
+            Set when a command of the job timed out, the commands after it are skipped.
+
+        Returns
+        -------
+        None
+        """
+
+        lock = self._actuator_locks[actuator]
+        if not lock.acquire(timeout=timeout):
+            for _, _, executed in job:
+                executed.set_result(False)
+            return
+
+        try:
+            for command, started, executed in job:
+                if cancelled.is_set():
+                    executed.set_result(False)
+                    continue
+
+                started.set_result(None)
+                try:
+                    self._instrumentation.control(actuator, command)
+                except Exception as e:
+                    executed.set_exception(e)
+                else:
+                    executed.set_result(True)
+        finally:
+            lock.release()
+
+    @property
+    def command_types(self) -> list[Command.Type]:
+        """
+        The types of command which this subsystem's actuators handle.
+
+        Returns
+        -------
+        list[Command.Type]
+            The routed command types.
+        """
+        return list(self._command_routes)
+
+    @property
+    def direct_methods(self) -> list[DirectMethod]:
+        """
+        The direct methods which this subsystem's actuators advertise.
+
+        Returns
+        -------
+        list[DirectMethod]
+            The direct methods of every actuator.
+        """
+        return [method for actuator in self.actuators for method in actuator.direct_methods]
+
+    @property
+    def event_types(self) -> set[Reading.Type]:
+        """
+        The reading types which this subsystem's sensors publish as events.
+
+        Returns
+        -------
+        set[Reading.Type]
+            The event reading types of every sensor.
+        """
+        return {reading_type for sensor in self.sensors for reading_type in sensor.EVENT_TYPES}
 
     @property
     def sensors(self) -> list[ISensor]:
@@ -147,3 +519,6 @@ class Subsystem(object):
         """
 
         self._actuators = value
+        self._command_routes = {}
+        for actuator in value:
+            self._route_commands(actuator)
@@ -0,0 +1,475 @@
+"""
+This module defines the on-device aggregation stage. Readings of the aggregated reading
+types are folded into per type window statistics as they are read instead of being sent,
+and a single summary reading per type is sent at the end of every window. Every statistic
+is updated in constant time and memory per sample: Welford's algorithm for the mean and
+variance and the P² algorithm for the percentiles, so sensors can be sampled at a high
+rate without buffering their samples.
+
+A summary is a Reading of the aggregated type whose value is a dictionary of statistics
+and whose timestamp is the time of the window's last sample.
+
+Classes:
+    RunningStats: Count, mean, standard deviation, minimum and maximum of a stream.
+    P2Quantile: A streaming estimate of a single quantile.
+    WindowAggregator: Aggregates readings per subsystem and reading type into windows.
+
+Usage:
+    aggregator = WindowAggregator()
+    aggregator.configure({Reading.Type.NOISE}, window=5)
+    telemetry = aggregator.add(telemetry)
+    for subsystem, summaries in aggregator.flush_due().items():
+        telemetry.setdefault(subsystem, []).extend(summaries)
+"""
+
+from math import sqrt
+from time import monotonic
+from typing import Iterable, Optional, Union
+
+from subsystems.interfaces.reading import Reading, ReadingBatch
+
+
+class RunningStats:
+    """Welford's online algorithm for the mean and variance, along with the extremes."""
+
+    __slots__ = ("count", "mean", "minimum", "maximum", "_m2")
+
+    def __init__(self) -> None:
+        """
+        Initializes empty statistics.
+
+        Returns
+        -------
+        None
+        """
+
+        self.count = 0
+        self.mean = 0.0
+        self.minimum = None
+        self.maximum = None
+        self._m2 = 0.0
+
+    def add(self, value: float) -> None:
+        """
+        Adds a sample to the statistics.
+
+        Parameters
+        ----------
+        value: float
+            The sample.
+
+        Returns
+        -------
+        None
+        """
+
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+
+    @property
+    def stddev(self) -> float:
+        """
+        The sample standard deviation.
+
+        Returns
+        -------
+        float
+            The standard deviation, 0 with fewer than two samples.
+        """
+
+        if self.count < 2:
+            return 0.0
+
+        return sqrt(self._m2 / (self.count - 1))
+
+
+class P2Quantile:
+    """
+    The P² algorithm by Jain and Chlamtac, which estimates a quantile of a stream with
+    five markers whose heights are adjusted with a piecewise parabolic formula.
+    """
+
+    __slots__ = ("quantile", "_heights", "_positions", "_desired", "_increments")
+
+    def __init__(self, quantile: float) -> None:
+        """
+        Initializes the estimator.
+
+        Parameters
+        ----------
+        quantile: float
+            The quantile to estimate, between 0 and 1.
+
+        Returns
+        -------
+        None
+        """
+
+        self.quantile = quantile
+        self._heights: list[float] = []
+        self._positions = [1, 2, 3, 4, 5]
+        self._desired = [1, 1 + 2 * quantile, 1 + 4 * quantile, 3 + 2 * quantile, 5]
+        self._increments = [0, quantile / 2, quantile, (1 + quantile) / 2, 1]
+
+    def add(self, value: float) -> None:
+        """
+        Adds a sample to the estimate.
+
+        Parameters
+        ----------
+        value: float
+            The sample.
+
+        Returns
+        -------
+        None
+        """
+
+        heights = self._heights
+        if len(heights) < 5:
+            heights.append(value)
+            if len(heights) == 5:
+                heights.sort()
+            return
+
+        # Find the cell the sample falls in, extending the extremes if needed
+        if value < heights[0]:
+            heights[0] = value
+            cell = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            cell = 3
+        else:
+            cell = 0
+            while value >= heights[cell + 1]:
+                cell += 1
+
+        positions = self._positions
+        for index in range(cell + 1, 5):
+            positions[index] += 1
+        for index in range(5):
+            self._desired[index] += self._increments[index]
+
+        # Move the middle markers towards their desired positions
+        for index in range(1, 4):
+            offset = self._desired[index] - positions[index]
+            if (offset >= 1 and positions[index + 1] - positions[index] > 1) or \
+                    (offset <= -1 and positions[index - 1] - positions[index] < -1):
+                step = 1 if offset > 0 else -1
+                height = self._parabolic(index, step)
+                if not heights[index - 1] < height < heights[index + 1]:
+                    height = self._linear(index, step)
+                heights[index] = height
+                positions[index] += step
+
+    def _parabolic(self, index: int, step: int) -> float:
+        """
+        Predicts a marker's height with the piecewise parabolic formula.
+
+        Parameters
+        ----------
+        index: int
+            The marker to move.
+        step: int
+            The direction the marker moves in, 1 or -1.
+
+        Returns
+        -------
+        float
+            The new height of the marker.
+        """
+
+        heights = self._heights
+        positions = self._positions
+        return heights[index] + step / (positions[index + 1] - positions[index - 1]) * (
+            (positions[index] - positions[index - 1] + step) *
+            (heights[index + 1] - heights[index]) / (positions[index + 1] - positions[index]) +
+            (positions[index + 1] - positions[index] - step) *
+            (heights[index] - heights[index - 1]) / (positions[index] - positions[index - 1]))
+
+    def _linear(self, index: int, step: int) -> float:
+        """
+        Predicts a marker's height linearly, used when the parabolic prediction would put
+        the markers out of order.
+
+        Parameters
+        ----------
+        index: int
+            The marker to move.
+        step: int
+            The direction the marker moves in, 1 or -1.
+
+        Returns
+        -------
+        float
+            The new height of the marker.
+        """
+
+        heights = self._heights
+        positions = self._positions
+        return heights[index] + step * (heights[index + step] - heights[index]) / \
+            (positions[index + step] - positions[index])
+
+    @property
+    def value(self) -> Optional[float]:
+        """
+        The current estimate of the quantile. Exact while fewer than five samples were
+        added.
+
+        Returns
+        -------
+        float
+            The estimate, None if no sample was added.
+        """
+
+        if not self._heights:
+            return None
+
+        if len(self._heights) < 5:
+            ordered = sorted(self._heights)
+            rank = self.quantile * (len(ordered) - 1)
+            lower = int(rank)
+            upper = min(lower + 1, len(ordered) - 1)
+            return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+        return self._heights[2]
+
+
+class _Window:
+    """The statistics of a single reading type over a window."""
+
+    __slots__ = ("reading_unit", "started", "stats", "quantiles", "first_ns", "last_ns")
+
+    def __init__(self, reading_unit: Reading.Unit, percentiles: Iterable[float]) -> None:
+        """
+        Starts an empty window.
+
+        Parameters
+        ----------
+        reading_unit: Reading.Unit
+            The unit of the aggregated readings.
+        percentiles: Iterable[float]
+            The quantiles to estimate, between 0 and 1.
+
+        Returns
+        -------
+        None
+        """
+
+        self.reading_unit = reading_unit
+        self.started = monotonic()
+        self.stats = RunningStats()
+        self.quantiles = [P2Quantile(percentile) for percentile in percentiles]
+        self.first_ns = None
+        self.last_ns = None
+
+    def add(self, value: float, timestamp_ns: int) -> None:
+        """
+        Adds a sample to the window.
+
+        Parameters
+        ----------
+        value: float
+            The sample's value.
+        timestamp_ns: int
+            The time the sample was taken in nanoseconds since the unix epoch.
+
+        Returns
+        -------
+        None
+        """
+
+        self.stats.add(value)
+        for quantile in self.quantiles:
+            quantile.add(value)
+
+        if self.first_ns is None:
+            self.first_ns = timestamp_ns
+        self.last_ns = timestamp_ns
+
+    def summary(self) -> dict:
+        """
+        Creates the summary of the window.
+
+        Returns
+        -------
+        dict
+            The count, mean, standard deviation, minimum, maximum, percentiles keyed as
+            "p50" and so on, and the seconds between the first and last sample.
+        """
+
+        summary = {
+            "count": self.stats.count,
+            "mean": self.stats.mean,
+            "stddev": self.stats.stddev,
+            "min": self.stats.minimum,
+            "max": self.stats.maximum
+        }
+        for quantile in self.quantiles:
+            summary[f"p{quantile.quantile * 100:g}"] = quantile.value
+        summary["window_s"] = (self.last_ns - self.first_ns) / 1e9
+
+        return summary
+
+
+class WindowAggregator:
+    """
+    Replaces the readings of the aggregated reading types with a summary per subsystem and
+    reading type at the end of every window. Readings of other types, and readings whose
+    values aren't numbers, are passed through untouched.
+    """
+
+    PERCENTILES = (0.5, 0.9, 0.99)
+
+    def __init__(self, reading_types: Iterable[Reading.Type] = (), window: float = 5,
+                 percentiles: Iterable[float] = PERCENTILES) -> None:
+        """
+        Initializes the aggregator. Nothing is aggregated without reading types.
+
+        Parameters
+        ----------
+        reading_types: Iterable[Reading.Type]
+            The reading types to aggregate.
+        window: float
+            The number of seconds in a window.
+        percentiles: Iterable[float]
+            The quantiles to estimate, between 0 and 1.
+
+        Returns
+        -------
+        None
+        """
+
+        self.reading_types = set(reading_types)
+        self.window = window
+        self.percentiles = tuple(percentiles)
+        self._windows: dict[tuple[str, Reading.Type], _Window] = {}
+
+    def configure(self, reading_types: Iterable[Reading.Type], window: float) -> None:
+        """
+        Changes the aggregated reading types and the window length. Windows of reading
+        types which are no longer aggregated are flushed on the next flush_due.
+
+        Parameters
+        ----------
+        reading_types: Iterable[Reading.Type]
+            The reading types to aggregate.
+        window: float
+            The number of seconds in a window.
+
+        Returns
+        -------
+        None
+        """
+
+        self.reading_types = set(reading_types)
+        self.window = window
+
+    def add(self, readings_by_subsystem: dict[str, list[Union[Reading, ReadingBatch]]]
+            ) -> dict[str, list[Union[Reading, ReadingBatch]]]:
+        """
+        Adds the readings of the aggregated types to their windows.
+
+        Parameters
+        ----------
+        readings_by_subsystem: dict[str, list[Union[Reading, ReadingBatch]]]
+            The readings of each subsystem keyed by subsystem name.
+
+        Returns
+        -------
+        dict[str, list[Union[Reading, ReadingBatch]]]
+            The readings which were not aggregated, keyed by subsystem name. Subsystems
+            whose readings were all aggregated are left out.
+        """
+
+        if not self.reading_types and not self._windows:
+            return readings_by_subsystem
+
+        remaining = {}
+        for subsystem, readings in readings_by_subsystem.items():
+            passed = []
+            for reading in readings:
+                if reading.reading_type not in self.reading_types or \
+                        not self._aggregate(subsystem, reading):
+                    passed.append(reading)
+            if passed:
+                remaining[subsystem] = passed
+
+        return remaining
+
+    def _aggregate(self, subsystem: str, reading: Union[Reading, ReadingBatch]) -> bool:
+        """
+        Adds a reading or every sample of a batch to its window. Empty batches are dropped
+        without starting a window.
+
+        Parameters
+        ----------
+        subsystem: str
+            The name of the subsystem the reading comes from.
+        reading: Union[Reading, ReadingBatch]
+            The reading.
+
+        Returns
+        -------
+        bool
+            True if the reading was aggregated, False if its value isn't a number.
+        """
+
+        if isinstance(reading, ReadingBatch):
+            if not reading.timestamps_ns:
+                return True
+            samples = zip(reading.values, reading.timestamps_ns)
+        elif isinstance(reading.value, (int, float)) and not isinstance(reading.value, bool):
+            samples = ((reading.value, reading.timestamp_ns),)
+        else:
+            return False
+
+        key = (subsystem, reading.reading_type)
+        window = self._windows.get(key)
+        if window is None:
+            window = self._windows[key] = _Window(reading.reading_unit, self.percentiles)
+
+        for value, timestamp_ns in samples:
+            window.add(value, timestamp_ns)
+
+        return True
+
+    def flush_due(self, force: bool = False) -> dict[str, list[Reading]]:
+        """
+        Creates the summaries of the windows which ended and starts new windows for them.
+        Windows without samples are dropped.
+
+        Parameters
+        ----------
+        force: bool
+            Flushes every window, even the ones which haven't ended.
+
+        Returns
+        -------
+        dict[str, list[Reading]]
+            The summary readings keyed by subsystem name.
+        """
+
+        now = monotonic()
+        summaries: dict[str, list[Reading]] = {}
+
+        for key, window in list(self._windows.items()):
+            subsystem, reading_type = key
+            if not force and reading_type in self.reading_types and \
+                    now - window.started < self.window:
+                continue
+
+            del self._windows[key]
+            if window.stats.count == 0:
+                continue
+            summaries.setdefault(subsystem, []).append(
+                Reading(window.summary(), reading_type, window.reading_unit, window.last_ns))
+
+        return summaries
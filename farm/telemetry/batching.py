@@ -0,0 +1,167 @@
+"""
+This module defines the TelemetryBatcher class which groups the telemetry of several
+cycles into a single device to cloud message to reduce the per message overhead on the
+IoT hub.
+
+How the cycles of a batch are combined is up to the batcher's encoding. With the default
+json encoding a batch containing a single cycle is sent as that cycle's telemetry object,
+so the default policy produces exactly the same messages as sending every cycle on its
+own, and a batch with more than one cycle is sent as a json array, oldest first.
+
+Classes:
+    TelemetryBatcher: Accumulates serialized telemetry cycles until N cycles, T seconds
+    or a byte cap is reached, whichever comes first.
+
+Usage:
+    batcher = TelemetryBatcher(max_cycles=10, max_seconds=60)
+    for payload in batcher.add(batcher.encoding.encode({"PlantSubsystem": readings})):
+        await connection_manager.send_the_d2c_message(payload)
+"""
+
+from time import monotonic
+from typing import Optional, Union
+
+from .serialization import JsonEncoding
+
+
+class TelemetryBatcher:
+    """
+    Accumulates serialized telemetry cycles and produces batched payloads according to
+    its flush policy.
+    """
+
+    DEFAULT_MAX_CYCLES = 1
+    DEFAULT_MAX_SECONDS = 60
+    # IoT hub messages are limited to 256 KB, leave room for the message properties
+    DEFAULT_MAX_BYTES = 240 * 1024
+
+    def __init__(self, max_cycles: int = DEFAULT_MAX_CYCLES,
+                 max_seconds: float = DEFAULT_MAX_SECONDS,
+                 max_bytes: int = DEFAULT_MAX_BYTES,
+                 encoding: Optional[object] = None) -> None:
+        """
+        Initializes an empty batcher.
+
+        Parameters
+        ----------
+        max_cycles: int
+            The number of cycles after which a batch is flushed.
+        max_seconds: float
+            The number of seconds after the first cycle of a batch at which it's flushed.
+        max_bytes: int
+            The maximum size of a batched payload.
+        encoding: JsonEncoding or BinaryEncoding, optional
+            The encoding of the cycles, which decides how they are combined. Json if None.
+
+        Returns
+        -------
+        None
+        """
+
+        self.max_cycles = max_cycles
+        self.max_seconds = max_seconds
+        self.max_bytes = max_bytes
+        self.encoding = encoding if encoding is not None else JsonEncoding()
+
+        self._cycles: list[Union[str, bytes]] = []
+        self._size = 0
+        self._started: Optional[float] = None
+
+    def add(self, cycle: Union[str, bytes]) -> list[Union[str, bytes]]:
+        """
+        Adds the serialized telemetry of a cycle to the batch.
+
+        Parameters
+        ----------
+        cycle: Union[str, bytes]
+            The telemetry of a single cycle, serialized with the batcher's encoding.
+
+        Returns
+        -------
+        list[Union[str, bytes]]
+            The payloads which are ready to be sent. Usually empty or a single payload, but
+            the current batch is flushed first if the cycle would push it past max_bytes.
+        """
+
+        payloads = []
+
+        cycle_size = len(cycle.encode("utf-8") if isinstance(cycle, str) else cycle)
+        if self._cycles and self._batched_size(cycle_size) > self.max_bytes:
+            payloads.append(self.flush())
+
+        if not self._cycles:
+            self._started = monotonic()
+        self._cycles.append(cycle)
+        self._size += cycle_size
+
+        if self.is_due():
+            payloads.append(self.flush())
+
+        return payloads
+
+    def _batched_size(self, cycle_size: int) -> int:
+        """
+        Calculates the size of the batched payload if a cycle was added to it.
+
+        Parameters
+        ----------
+        cycle_size: int
+            The size of the cycle to add.
+
+        Returns
+        -------
+        int
+            The number of bytes the payload would take.
+        """
+
+        count = len(self._cycles) + 1
+        return self._size + cycle_size + self.encoding.join_overhead(count)
+
+    def is_due(self) -> bool:
+        """
+        Checks whether the current batch should be flushed.
+
+        Returns
+        -------
+        bool
+            True if the batch reached max_cycles or is older than max_seconds.
+        """
+
+        if not self._cycles:
+            return False
+
+        return len(self._cycles) >= self.max_cycles or \
+            monotonic() - self._started >= self.max_seconds
+
+    def flush(self) -> Optional[Union[str, bytes]]:
+        """
+        Creates the payload of the current batch and starts a new batch.
+
+        Returns
+        -------
+        Union[str, bytes]
+            The batched payload. None if the batch is empty.
+        """
+
+        if not self._cycles:
+            return None
+
+        payload = self.encoding.join(self._cycles)
+
+        self._cycles = []
+        self._size = 0
+        self._started = None
+
+        return payload
+
+    def __len__(self) -> int:
+        """
+        The number of cycles in the current batch.
+
+        Returns
+        -------
+        int
+            The number of batched cycles.
+        """
+
+        return len(self._cycles)
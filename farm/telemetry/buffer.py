@@ -0,0 +1,271 @@
+"""
+This module defines the TelemetryBuffer class, a persistent first-in first-out queue of
+telemetry messages backed by SQLite. The connection manager stores messages in the buffer
+while it can't reach the IoT hub and drains them once the connection returns.
+
+Classes:
+    TelemetryBuffer: A size and age bounded on-disk queue of telemetry messages which
+    evicts the oldest messages first.
+
+Usage:
+    buffer = TelemetryBuffer("telemetry_buffer.sqlite3")
+    buffer.push('{"PlantSubsystem": []}')
+    for message_id, payload, content_type, content_encoding, properties in buffer.peek(10):
+        send(payload)
+        buffer.remove([message_id])
+"""
+
+import sqlite3
+from json import dumps, loads
+from time import time
+from typing import Optional, Union
+
+
+class TelemetryBuffer:
+    """
+    A persistent queue of telemetry messages. Messages older than max_age are dropped and
+    the oldest messages are evicted whenever the buffer grows past max_bytes.
+    """
+
+    DEFAULT_PATH = "telemetry_buffer.sqlite3"
+    # 50 MB
+    DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+    # 7 days
+    DEFAULT_MAX_AGE = 7 * 24 * 60 * 60
+
+    def __init__(self, path: str = DEFAULT_PATH, max_bytes: int = DEFAULT_MAX_BYTES,
+                 max_age: float = DEFAULT_MAX_AGE) -> None:
+        """
+        Opens the buffer, creating the database if it doesn't exist.
+
+        Parameters
+        ----------
+        path: str
+            The path of the SQLite database. ":memory:" keeps the buffer in memory.
+        max_bytes: int
+            The maximum total size of the buffered payloads.
+        max_age: float
+            The maximum number of seconds a message is kept for.
+
+        Returns
+        -------
+        None
+        """
+
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+
+        self._db = sqlite3.connect(path, isolation_level=None)
+        # WAL avoids an fsync of the whole database on every push
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS messages ("
+                         "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                         "created_at REAL NOT NULL, "
+                         "size INTEGER NOT NULL, "
+                         "payload BLOB NOT NULL, "
+                         "content_type TEXT, "
+                         "content_encoding TEXT, "
+                         "custom_properties TEXT)")
+        # Buffers created before messages had custom properties
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(messages)")]
+        if "custom_properties" not in columns:
+            self._db.execute("ALTER TABLE messages ADD COLUMN custom_properties TEXT")
+
+        count, size = self._db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM messages").fetchone()
+        self._count = count
+        self._size = size
+
+        # Backpressure metrics
+        self.pushed = 0
+        self.drained = 0
+        self.evicted_for_size = 0
+        self.evicted_for_age = 0
+
+    def push(self, payload: Union[str, bytes], content_type: Optional[str] = None,
+             content_encoding: Optional[str] = None,
+             custom_properties: Optional[dict[str, str]] = None) -> None:
+        """
+        Adds a message to the end of the buffer, evicting old messages if needed.
+
+        Parameters
+        ----------
+        payload: Union[str, bytes]
+            The telemetry message to store.
+        content_type: str, optional
+            The content type the message should be sent with.
+        content_encoding: str, optional
+            The content encoding the message should be sent with.
+        custom_properties: dict[str, str], optional
+            The application properties the message should be sent with, like its
+            routing priority.
+
+        Returns
+        -------
+        None
+        """
+
+        size = len(payload.encode("utf-8") if isinstance(payload, str) else payload)
+        self._db.execute("INSERT INTO messages (created_at, size, payload, content_type, "
+                         "content_encoding, custom_properties) VALUES (?, ?, ?, ?, ?, ?)",
+                         (time(), size, payload, content_type, content_encoding,
+                          dumps(custom_properties) if custom_properties else None))
+        self._count += 1
+        self._size += size
+        self.pushed += 1
+
+        self._evict()
+
+    def peek(self, limit: int) -> list[tuple[int, Union[str, bytes], Optional[str],
+                                             Optional[str], Optional[dict[str, str]]]]:
+        """
+        Gets the oldest messages without removing them from the buffer.
+
+        Parameters
+        ----------
+        limit: int
+            The maximum number of messages to get.
+
+        Returns
+        -------
+        list[tuple[int, Union[str, bytes], Optional[str], Optional[str], Optional[dict]]]
+            The (id, payload, content type, content encoding, custom properties) of each
+            message, oldest first.
+        """
+
+        self._evict()
+        rows = self._db.execute("SELECT id, payload, content_type, content_encoding, "
+                                "custom_properties FROM messages ORDER BY id LIMIT ?",
+                                (limit,)).fetchall()
+        return [(message_id, payload, content_type, content_encoding,
+                 loads(properties) if properties is not None else None)
+                for message_id, payload, content_type, content_encoding, properties in rows]
+
+    def remove(self, message_ids: list[int]) -> None:
+        """
+        Removes sent messages from the buffer.
+
+        Parameters
+        ----------
+        message_ids: list[int]
+            The ids of the messages to remove, as returned by peek.
+
+        Returns
+        -------
+        None
+        """
+
+        if not message_ids:
+            return
+
+        placeholders = ",".join("?" * len(message_ids))
+        count, size = self._db.execute(
+            f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM messages WHERE id IN ({placeholders})",
+            message_ids).fetchone()
+        self._db.execute(f"DELETE FROM messages WHERE id IN ({placeholders})", message_ids)
+
+        self._count -= count
+        self._size -= size
+        self.drained += count
+
+    def _evict(self) -> None:
+        """
+        Drops messages which are too old, then the oldest messages until the buffer fits
+        in max_bytes.
+
+        Returns
+        -------
+        None
+        """
+
+        if self._count == 0:
+            return
+
+        cutoff = time() - self.max_age
+        count, size = self._db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM messages WHERE created_at < ?",
+            (cutoff,)).fetchone()
+        if count:
+            self._db.execute("DELETE FROM messages WHERE created_at < ?", (cutoff,))
+            self._count -= count
+            self._size -= size
+            self.evicted_for_age += count
+
+        if self._size <= self.max_bytes:
+            return
+
+        # Find the newest message which has to go for the rest to fit
+        excess = self._size - self.max_bytes
+        count = 0
+        size = 0
+        last_id = None
+        for message_id, message_size in self._db.execute(
+                "SELECT id, size FROM messages ORDER BY id"):
+            count += 1
+            size += message_size
+            last_id = message_id
+            if size >= excess:
+                break
+
+        self._db.execute("DELETE FROM messages WHERE id <= ?", (last_id,))
+        self._count -= count
+        self._size -= size
+        self.evicted_for_size += count
+
+    def __len__(self) -> int:
+        """
+        The number of messages in the buffer.
+
+        Returns
+        -------
+        int
+            The number of buffered messages.
+        """
+
+        return self._count
+
+    @property
+    def size(self) -> int:
+        """
+        The total size of the buffered payloads.
+
+        Returns
+        -------
+        int
+            The number of bytes in the buffer.
+        """
+
+        return self._size
+
+    def to_dict(self) -> dict:
+        """
+        Creates a dictionary containing the buffer's backpressure metrics.
+
+        Returns
+        -------
+        dict
+            The buffer metrics keyed by name.
+        """
+
+        oldest = self._db.execute("SELECT MIN(created_at) FROM messages").fetchone()[0]
+        return {
+            "depth": self._count,
+            "bytes": self._size,
+            "oldest_age": time() - oldest if oldest is not None else 0,
+            "pushed": self.pushed,
+            "drained": self.drained,
+            "evicted_for_size": self.evicted_for_size,
+            "evicted_for_age": self.evicted_for_age
+        }
+
+    def close(self) -> None:
+        """
+        Closes the database.
+
+        Returns
+        -------
+        None
+        """
+
+        self._db.close()
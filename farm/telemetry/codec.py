@@ -0,0 +1,680 @@
+"""
+This module defines a compact binary encoding for the farm's telemetry and the matching
+decoder. It only depends on the standard library so it can be copied as-is to the cloud
+side to decode the messages.
+
+Reading types, units and subsystem names are sent as their index in the schema tables
+below instead of as strings, integers and timestamps are sent as variable length integers
+and every timestamp is sent as the number of microseconds since the previous reading. The
+tables are append only: changing the position of an entry breaks every decoder which
+already uses that version of the schema.
+
+Message layout, every cycle is a self contained frame and a batch is a concatenation of
+frames:
+    frame:      MAGIC, SCHEMA_VERSION, base timestamp, utc offset, subsystem count,
+                subsystems
+    subsystem:  name index, reading count, readings
+    reading:    type index, unit index, value tag, value, timestamp delta
+    samples:    sample count, then per sample a float64 value and the microseconds until
+                the next sample, the last sample being the reading's value and timestamp
+
+A reading batch is sent as a reading whose value is tagged as samples. Value tags are also
+append only.
+
+Indexes are single bytes where ESCAPE is followed by the string itself. Timestamps are in
+microseconds since the unix epoch. The utc offset is the device's local time zone at the
+base timestamp, in minutes, so the decoder formats timestamps in the same local time as
+the json telemetry. Version 1 frames have no utc offset and are decoded in utc.
+
+Classes:
+    BinaryEncoding: The binary wire format, used by the connection manager.
+
+Functions:
+    encode_cycle(readings_by_subsystem): Encodes the readings of a single cycle.
+    decode(data): Decodes a message into the telemetry dictionary of every cycle.
+
+Usage:
+    data = encode_cycle({"PlantSubsystem": readings})
+    for telemetry in decode(data):
+        print(telemetry["PlantSubsystem"])
+"""
+
+import json
+import struct
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional
+
+MAGIC = 0xB5
+SCHEMA_VERSION = 2
+# The versions decode can read
+SUPPORTED_VERSIONS = (1, 2)
+ESCAPE = 0xFF
+
+READING_TYPES = (
+    "Geo-Location", "Pitch", "Roll", "Buzzer", "Vibration", "Fan", "Soil-Moisture",
+    "Water-Level", "Temperature", "Humidity", "RGB-LED-Stick", "Luminosity",
+    "Door-Opened", "Door-Locked", "Motion", "Noise", "Motion-Events", "Door-Events"
+)
+READING_UNITS = (None, "°", "Bool", "%", "cm", "°C", "Decibel", "Lux")
+SUBSYSTEMS = ("GeoLocationSubsystem", "SecuritySubsystem", "PlantSubsystem")
+
+_READING_TYPE_INDEXES = {name: index for index, name in enumerate(READING_TYPES)}
+_READING_UNIT_INDEXES = {name: index for index, name in enumerate(READING_UNITS)}
+_SUBSYSTEM_INDEXES = {name: index for index, name in enumerate(SUBSYSTEMS)}
+
+# Value tags
+_NONE = 0
+_FALSE = 1
+_TRUE = 2
+_INT = 3
+_FLOAT = 4
+_STRING = 5
+_JSON = 6
+_SAMPLES = 7
+
+_DOUBLE = struct.Struct("<d")
+
+
+def _write_varint(buffer: bytearray, value: int) -> None:
+    """
+    Appends an unsigned variable length integer, 7 bits per byte, least significant first.
+
+    Parameters
+    ----------
+    buffer: bytearray
+        The buffer to append to.
+    value: int
+        The non-negative integer to append.
+
+    Returns
+    -------
+    None
+    """
+
+    while value > 0x7F:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def _write_signed(buffer: bytearray, value: int) -> None:
+    """
+    Appends a signed variable length integer using zigzag encoding so small negative
+    numbers stay small.
+
+    Parameters
+    ----------
+    buffer: bytearray
+        The buffer to append to.
+    value: int
+        The integer to append.
+
+    Returns
+    -------
+    None
+    """
+
+    _write_varint(buffer, value * 2 if value >= 0 else -value * 2 - 1)
+
+
+def _write_string(buffer: bytearray, value: str) -> None:
+    """
+    Appends a length prefixed utf-8 string.
+
+    Parameters
+    ----------
+    buffer: bytearray
+        The buffer to append to.
+    value: str
+        The string to append.
+
+    Returns
+    -------
+    None
+    """
+
+    encoded = value.encode("utf-8")
+    _write_varint(buffer, len(encoded))
+    buffer += encoded
+
+
+def _write_index(buffer: bytearray, indexes: dict, value: Any) -> None:
+    """
+    Appends the schema index of a value, or the value itself after ESCAPE if it isn't in
+    the schema.
+
+    Parameters
+    ----------
+    buffer: bytearray
+        The buffer to append to.
+    indexes: dict
+        The schema table's indexes keyed by value.
+    value: Any
+        The value to append.
+
+    Returns
+    -------
+    None
+    """
+
+    index = indexes.get(value)
+    if index is not None:
+        buffer.append(index)
+    else:
+        buffer.append(ESCAPE)
+        _write_string(buffer, json.dumps(value))
+
+
+def _write_value(buffer: bytearray, value: Any) -> None:
+    """
+    Appends a tagged reading value.
+
+    Parameters
+    ----------
+    buffer: bytearray
+        The buffer to append to.
+    value: Any
+        The reading value to append.
+
+    Returns
+    -------
+    None
+    """
+
+    if value is None:
+        buffer.append(_NONE)
+    elif value is True:
+        buffer.append(_TRUE)
+    elif value is False:
+        buffer.append(_FALSE)
+    elif isinstance(value, int):
+        buffer.append(_INT)
+        _write_signed(buffer, value)
+    elif isinstance(value, float):
+        buffer.append(_FLOAT)
+        buffer += _DOUBLE.pack(value)
+    elif isinstance(value, str):
+        buffer.append(_STRING)
+        _write_string(buffer, value)
+    else:
+        # Structured values like gps fixes
+        buffer.append(_JSON)
+        _write_string(buffer, json.dumps(value, separators=(",", ":")))
+
+
+def _write_samples(buffer: bytearray, batch: Any) -> None:
+    """
+    Appends the samples of a reading batch.
+
+    Parameters
+    ----------
+    buffer: bytearray
+        The buffer to append to.
+    batch: ReadingBatch
+        The batch, which must contain at least one sample.
+
+    Returns
+    -------
+    None
+    """
+
+    buffer.append(_SAMPLES)
+    _write_varint(buffer, len(batch.values))
+
+    timestamps = [timestamp // 1000 for timestamp in batch.timestamps_ns]
+    for index, value in enumerate(batch.values):
+        buffer += _DOUBLE.pack(value)
+        if index + 1 < len(timestamps):
+            _write_signed(buffer, timestamps[index + 1] - timestamps[index])
+
+
+def _timestamp_us(reading: Any) -> int:
+    """
+    Gets the timestamp of a reading in microseconds since the unix epoch.
+
+    Parameters
+    ----------
+    reading: Reading
+        The reading.
+
+    Returns
+    -------
+    int
+        The reading's timestamp.
+    """
+
+    return reading.timestamp_ns // 1000
+
+
+def _utc_offset_minutes(timestamp_us: int) -> int:
+    """
+    Gets the offset of the local time zone at a moment, like the json telemetry's
+    timestamps use.
+
+    Parameters
+    ----------
+    timestamp_us: int
+        The number of microseconds since the unix epoch.
+
+    Returns
+    -------
+    int
+        The number of minutes local time is ahead of utc.
+    """
+
+    offset = datetime.fromtimestamp(timestamp_us // 1_000_000).astimezone().utcoffset()
+    return int(offset.total_seconds()) // 60
+
+
+def encode_cycle(readings_by_subsystem: dict[str, list]) -> bytes:
+    """
+    Encodes the readings of a single cycle as a frame.
+
+    Parameters
+    ----------
+    readings_by_subsystem: dict[str, list[Union[Reading, ReadingBatch]]]
+        The readings of each subsystem keyed by subsystem name.
+
+    Returns
+    -------
+    bytes
+        The encoded frame.
+    """
+
+    buffer = bytearray((MAGIC, SCHEMA_VERSION))
+
+    timestamps = [_timestamp_us(reading)
+                  for readings in readings_by_subsystem.values() for reading in readings]
+    previous = timestamps[0] if timestamps else 0
+    _write_varint(buffer, previous)
+    _write_signed(buffer, _utc_offset_minutes(previous))
+
+    _write_varint(buffer, len(readings_by_subsystem))
+    index = 0
+    for subsystem, readings in readings_by_subsystem.items():
+        _write_index(buffer, _SUBSYSTEM_INDEXES, subsystem)
+        _write_varint(buffer, len(readings))
+
+        for reading in readings:
+            _write_index(buffer, _READING_TYPE_INDEXES, reading.reading_type.value)
+            _write_index(buffer, _READING_UNIT_INDEXES, reading.reading_unit.value)
+            if hasattr(reading, "timestamps_ns"):
+                _write_samples(buffer, reading)
+            else:
+                _write_value(buffer, reading.value)
+
+            _write_signed(buffer, timestamps[index] - previous)
+            previous = timestamps[index]
+            index += 1
+
+    return bytes(buffer)
+
+
+class _Samples(dict):
+    """The decoded samples of a reading batch, told apart from json values by type."""
+
+
+class _Reader:
+    """Reads the primitives of the binary format from a buffer."""
+
+    def __init__(self, data: bytes) -> None:
+        """
+        Initializes the reader at the start of the data.
+
+        Parameters
+        ----------
+        data: bytes
+            The data to read.
+
+        Returns
+        -------
+        None
+        """
+
+        self.data = memoryview(data)
+        self.position = 0
+
+    def at_end(self) -> bool:
+        """
+        Checks whether all the data was read.
+
+        Returns
+        -------
+        bool
+            True if there is nothing left to read.
+        """
+
+        return self.position >= len(self.data)
+
+    def byte(self) -> int:
+        """
+        Reads a single byte.
+
+        Raises
+        ------
+        ValueError
+            Raised when the data ends unexpectedly.
+
+        Returns
+        -------
+        int
+            The byte's value.
+        """
+
+        if self.position >= len(self.data):
+            raise ValueError("Unexpected end of telemetry data")
+        value = self.data[self.position]
+        self.position += 1
+        return value
+
+    def varint(self) -> int:
+        """
+        Reads an unsigned variable length integer.
+
+        Returns
+        -------
+        int
+            The integer.
+        """
+
+        value = 0
+        shift = 0
+        while True:
+            byte = self.byte()
+            value |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return value
+            shift += 7
+
+    def signed(self) -> int:
+        """
+        Reads a zigzag encoded signed variable length integer.
+
+        Returns
+        -------
+        int
+            The integer.
+        """
+
+        value = self.varint()
+        return value // 2 if value % 2 == 0 else -(value + 1) // 2
+
+    def raw(self, size: int) -> bytes:
+        """
+        Reads a number of bytes.
+
+        Parameters
+        ----------
+        size: int
+            The number of bytes to read.
+
+        Raises
+        ------
+        ValueError
+            Raised when the data ends unexpectedly.
+
+        Returns
+        -------
+        bytes
+            The bytes read.
+        """
+
+        if self.position + size > len(self.data):
+            raise ValueError("Unexpected end of telemetry data")
+        value = bytes(self.data[self.position:self.position + size])
+        self.position += size
+        return value
+
+    def string(self) -> str:
+        """
+        Reads a length prefixed utf-8 string.
+
+        Returns
+        -------
+        str
+            The string.
+        """
+
+        return self.raw(self.varint()).decode("utf-8")
+
+    def index(self, table: tuple) -> Any:
+        """
+        Reads a schema index and looks it up.
+
+        Parameters
+        ----------
+        table: tuple
+            The schema table the index belongs to.
+
+        Raises
+        ------
+        ValueError
+            Raised when the index is not in the table.
+
+        Returns
+        -------
+        Any
+            The value at the index.
+        """
+
+        index = self.byte()
+        if index == ESCAPE:
+            return json.loads(self.string())
+        if index >= len(table):
+            raise ValueError(f"Unknown schema index {index}")
+        return table[index]
+
+    def value(self) -> Any:
+        """
+        Reads a tagged reading value.
+
+        Raises
+        ------
+        ValueError
+            Raised when the tag is unknown.
+
+        Returns
+        -------
+        Any
+            The reading value.
+        """
+
+        tag = self.byte()
+        if tag == _NONE:
+            return None
+        if tag == _FALSE:
+            return False
+        if tag == _TRUE:
+            return True
+        if tag == _INT:
+            return self.signed()
+        if tag == _FLOAT:
+            return _DOUBLE.unpack(self.raw(_DOUBLE.size))[0]
+        if tag == _STRING:
+            return self.string()
+        if tag == _JSON:
+            return json.loads(self.string())
+        if tag == _SAMPLES:
+            return self.samples()
+        raise ValueError(f"Unknown value tag {tag}")
+
+    def samples(self) -> "_Samples":
+        """
+        Reads the samples of a reading batch, after their tag.
+
+        Returns
+        -------
+        _Samples
+            The offset in microseconds of each sample from the last sample and the value of
+            each sample, like ReadingBatch.to_dict.
+        """
+
+        values = []
+        intervals = []
+        count = self.varint()
+        for index in range(count):
+            values.append(_DOUBLE.unpack(self.raw(_DOUBLE.size))[0])
+            if index + 1 < count:
+                intervals.append(self.signed())
+
+        offsets = [0]
+        for interval in reversed(intervals):
+            offsets.append(offsets[-1] - interval)
+        offsets.reverse()
+
+        return _Samples(offsets_us=offsets, values=values)
+
+
+def _format_timestamp(timestamp_us: int, tz: timezone) -> str:
+    """
+    Formats a timestamp the same way the json telemetry does.
+
+    Parameters
+    ----------
+    timestamp_us: int
+        The number of microseconds since the unix epoch.
+    tz: timezone
+        The time zone to format the timestamp in.
+
+    Returns
+    -------
+    str
+        The timestamp as "YYYY-MM-DD HH:MM:SS.ffffff".
+    """
+
+    moment = datetime.fromtimestamp(timestamp_us / 1_000_000, tz)
+    return str(moment.replace(tzinfo=None))
+
+
+def decode(data: bytes, tz: Optional[timezone] = None) -> list[dict]:
+    """
+    Decodes a binary telemetry message into the same dictionaries as the json telemetry.
+
+    Parameters
+    ----------
+    data: bytes
+        The message, made of one frame per cycle.
+    tz: timezone, optional
+        The time zone to format the timestamps in. The device's local time zone, sent in
+        each frame, if None.
+
+    Raises
+    ------
+    ValueError
+        Raised when the data is not valid binary telemetry.
+
+    Returns
+    -------
+    list[dict]
+        The telemetry of every cycle in the message, oldest first.
+    """
+
+    reader = _Reader(data)
+    cycles = []
+
+    while not reader.at_end():
+        if reader.byte() != MAGIC:
+            raise ValueError("Not binary telemetry")
+        version = reader.byte()
+        if version not in SUPPORTED_VERSIONS:
+            raise ValueError(f"Unsupported telemetry schema version {version}")
+
+        timestamp = reader.varint()
+        frame_tz = tz
+        if version >= 2:
+            offset = reader.signed()
+            if frame_tz is None:
+                frame_tz = timezone(timedelta(minutes=offset))
+        elif frame_tz is None:
+            frame_tz = timezone.utc
+
+        telemetry = {}
+        for _ in range(reader.varint()):
+            subsystem = reader.index(SUBSYSTEMS)
+            readings = []
+            for _ in range(reader.varint()):
+                reading_type = reader.index(READING_TYPES)
+                reading_unit = reader.index(READING_UNITS)
+                value = reader.value()
+                timestamp += reader.signed()
+
+                samples = None
+                if isinstance(value, _Samples):
+                    samples = value
+                    value = samples["values"][-1]
+
+                reading = {
+                    "value": value,
+                    "reading_type": reading_type,
+                    "reading_unit": reading_unit,
+                    "timestamp": _format_timestamp(timestamp, frame_tz)
+                }
+                if samples is not None:
+                    reading["samples"] = dict(samples)
+                readings.append(reading)
+            telemetry[subsystem] = readings
+        cycles.append(telemetry)
+
+    return cycles
+
+
+class BinaryEncoding:
+    """
+    The binary wire format. Every cycle is a frame and a batch is the concatenation of its
+    cycles' frames.
+    """
+
+    name = "binary"
+    content_type = "application/vnd.shft.telemetry"
+    content_encoding = None
+
+    def encode(self, readings_by_subsystem: dict[str, list]) -> bytes:
+        """
+        Encodes the readings of a single cycle.
+
+        Parameters
+        ----------
+        readings_by_subsystem: dict[str, list[Reading]]
+            The readings of each subsystem keyed by subsystem name.
+
+        Returns
+        -------
+        bytes
+            The encoded cycle.
+        """
+
+        return encode_cycle(readings_by_subsystem)
+
+    def join(self, cycles: list[bytes]) -> bytes:
+        """
+        Combines encoded cycles into a single payload.
+
+        Parameters
+        ----------
+        cycles: list[bytes]
+            The encoded cycles, oldest first.
+
+        Returns
+        -------
+        bytes
+            The batched payload.
+        """
+
+        return b"".join(cycles)
+
+    def join_overhead(self, count: int) -> int:
+        """
+        The number of bytes join adds on top of the cycles themselves.
+
+        Parameters
+        ----------
+        count: int
+            The number of cycles being joined.
+
+        Returns
+        -------
+        int
+            The number of extra bytes.
+        """
+
+        return 0
@@ -0,0 +1,180 @@
+"""
+This module defines the optional compression stage applied to telemetry messages before
+they are sent to the IoT hub. gzip is always available. zstd is available when the
+zstandard package is installed and can use a dictionary trained on typical payloads, which
+is what makes compressing small telemetry messages worthwhile.
+
+Payloads smaller than the compressor's threshold are sent as-is since the compression
+headers would eat most of the savings.
+
+Classes:
+    Compressor: Compresses payloads with the configured algorithm and reports the content
+    encoding the message should be sent with.
+
+Functions:
+    train_dictionary(samples, size): Trains a zstd dictionary on sample payloads.
+
+Usage:
+    compressor = Compressor("gzip", threshold=512)
+    payload, content_encoding = compressor.compress(payload, "utf-8")
+
+    # Train a dictionary from payload files, one payload per file
+    python -m telemetry.compression telemetry.zstd.dict samples/*.json
+"""
+
+import gzip
+from argparse import ArgumentParser
+from typing import Optional, Union
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class Compressor:
+    """
+    Compresses telemetry payloads. Supports "none", "gzip" and, when zstandard is
+    installed, "zstd".
+    """
+
+    NONE = "none"
+    GZIP = "gzip"
+    ZSTD = "zstd"
+
+    DEFAULT_THRESHOLD = 512
+    DEFAULT_GZIP_LEVEL = 6
+    DEFAULT_ZSTD_LEVEL = 3
+
+    def __init__(self, algorithm: str = NONE, threshold: int = DEFAULT_THRESHOLD,
+                 dictionary: Optional[bytes] = None) -> None:
+        """
+        Initializes the compressor.
+
+        Parameters
+        ----------
+        algorithm: str
+            The compression algorithm, one of Compressor.NONE, GZIP or ZSTD.
+        threshold: int
+            Payloads smaller than this number of bytes are not compressed.
+        dictionary: bytes, optional
+            A zstd dictionary trained on typical payloads. Only used by zstd.
+
+        Raises
+        ------
+        ValueError
+            Raised when the algorithm is unknown or zstd is requested without zstandard
+            being installed.
+
+        Returns
+        -------
+        None
+        """
+
+        if algorithm not in Compressor.available_algorithms():
+            raise ValueError(f"Compression algorithm {algorithm} is not available")
+
+        self.algorithm = algorithm
+        self.threshold = threshold
+
+        self._zstd = None
+        if algorithm == Compressor.ZSTD:
+            zstd_dictionary = zstandard.ZstdCompressionDict(dictionary) \
+                if dictionary is not None else None
+            self._zstd = zstandard.ZstdCompressor(level=Compressor.DEFAULT_ZSTD_LEVEL,
+                                                  dict_data=zstd_dictionary)
+
+    @staticmethod
+    def available_algorithms() -> list[str]:
+        """
+        Gets the algorithms which can be used on this device.
+
+        Returns
+        -------
+        list[str]
+            The names of the available algorithms.
+        """
+
+        algorithms = [Compressor.NONE, Compressor.GZIP]
+        if zstandard is not None:
+            algorithms.append(Compressor.ZSTD)
+
+        return algorithms
+
+    def compress(self, payload: Union[str, bytes],
+                 content_encoding: Optional[str]) -> tuple[Union[str, bytes], Optional[str]]:
+        """
+        Compresses a payload if it's large enough.
+
+        Parameters
+        ----------
+        payload: Union[str, bytes]
+            The payload to compress. Strings are compressed as utf-8.
+        content_encoding: str, optional
+            The content encoding of the uncompressed payload.
+
+        Returns
+        -------
+        tuple[Union[str, bytes], Optional[str]]
+            The payload and the content encoding it should be sent with. Both are returned
+            unchanged if the payload was not compressed.
+        """
+
+        if self.algorithm == Compressor.NONE:
+            return payload, content_encoding
+
+        data = payload.encode("utf-8") if isinstance(payload, str) else payload
+        if len(data) < self.threshold:
+            return payload, content_encoding
+
+        if self.algorithm == Compressor.ZSTD:
+            return self._zstd.compress(data), Compressor.ZSTD
+
+        # mtime=0 keeps the output deterministic
+        return gzip.compress(data, Compressor.DEFAULT_GZIP_LEVEL, mtime=0), Compressor.GZIP
+
+
+def train_dictionary(samples: list[bytes], size: int = 16 * 1024) -> bytes:
+    """
+    Trains a zstd dictionary on sample payloads. The same dictionary must be used to
+    decompress the messages on the cloud side.
+
+    Parameters
+    ----------
+    samples: list[bytes]
+        Typical payloads, ideally a few hundred real messages.
+    size: int
+        The maximum size of the dictionary in bytes.
+
+    Raises
+    ------
+    RuntimeError
+        Raised when zstandard is not installed.
+
+    Returns
+    -------
+    bytes
+        The trained dictionary.
+    """
+
+    if zstandard is None:
+        raise RuntimeError("zstandard must be installed to train a dictionary")
+
+    return zstandard.train_dictionary(size, samples).as_bytes()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser("Trains a zstd dictionary on sample telemetry payloads.")
+    parser.add_argument("output", help="The file to write the dictionary to.")
+    parser.add_argument("samples", nargs="+", help="Files which each contain a payload.")
+    parser.add_argument("--size", type=int, default=16 * 1024,
+                        help="The maximum size of the dictionary in bytes.")
+    args = parser.parse_args()
+
+    samples = []
+    for path in args.samples:
+        with open(path, "rb") as sample:
+            samples.append(sample.read())
+
+    with open(args.output, "wb") as output:
+        output.write(train_dictionary(samples, args.size))
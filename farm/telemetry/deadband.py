@@ -0,0 +1,226 @@
+"""
+This module defines report by exception filtering. A reading of a reading type with a
+deadband is only sent when its value moved outside the deadband around the last value
+which was sent, or when nothing was sent for that reading type for longer than the max
+silence, which acts as a heartbeat so the cloud can tell a quiet sensor from a dead one.
+
+Classes:
+    Deadband: The change needed before a reading is sent again.
+    DeadbandFilter: Suppresses unchanged readings per subsystem and reading type.
+
+Usage:
+    deadband_filter = DeadbandFilter()
+    telemetry = deadband_filter.filter(telemetry)
+"""
+
+from time import monotonic
+from typing import Any, Optional, Union
+
+from subsystems.interfaces.reading import Reading, ReadingBatch
+
+
+class Deadband:
+    """
+    The change needed before a reading is sent again. A numeric value is sent when it
+    moved by more than the absolute deadband or by more than the percentage deadband of
+    the last sent value, or on any change if neither is set. Any change of a non numeric
+    value, like a bool, is sent.
+    """
+
+    __slots__ = ("absolute", "percentage")
+
+    def __init__(self, absolute: Optional[float] = None,
+                 percentage: Optional[float] = None) -> None:
+        """
+        Initializes the deadband.
+
+        Parameters
+        ----------
+        absolute: float, optional
+            The change in the reading's unit which must be exceeded. Ignored if None.
+        percentage: float, optional
+            The change in percent of the last sent value which must be exceeded. Ignored if
+            None.
+
+        Returns
+        -------
+        None
+        """
+
+        self.absolute = absolute
+        self.percentage = percentage
+
+    def exceeded(self, value: Any, last_value: Any) -> bool:
+        """
+        Checks whether a value moved outside the deadband around the last sent value.
+
+        Parameters
+        ----------
+        value: Any
+            The new value.
+        last_value: Any
+            The last value which was sent.
+
+        Returns
+        -------
+        bool
+            True if the new value should be sent.
+        """
+
+        numbers = (int, float)
+        if isinstance(value, bool) or isinstance(last_value, bool) or \
+                not isinstance(value, numbers) or not isinstance(last_value, numbers):
+            return value != last_value
+
+        change = abs(value - last_value)
+        if self.absolute is None and self.percentage is None:
+            return change > 0
+
+        if self.absolute is not None and change > self.absolute:
+            return True
+
+        return self.percentage is not None and \
+            change > abs(last_value) * self.percentage / 100
+
+    def to_dict(self) -> dict:
+        """
+        Creates a dictionary of the deadband, in the format of the device twin.
+
+        Returns
+        -------
+        dict
+            The absolute and percentage deadbands.
+        """
+
+        return {"absolute": self.absolute, "percentage": self.percentage}
+
+
+class DeadbandFilter:
+    """
+    Suppresses the readings which didn't change since they were last sent. Readings of
+    types without a deadband and reading batches are always sent.
+    """
+
+    # Slow changing readings, which otherwise repeat the same value almost every cycle
+    DEFAULT_DEADBANDS = {
+        Reading.Type.WATER_LEVEL: Deadband(absolute=0.5),
+        Reading.Type.SOIL_MOISTURE: Deadband(absolute=1),
+        Reading.Type.DOOR_LOCKED: Deadband(),
+        Reading.Type.BUZZER: Deadband(),
+        Reading.Type.FAN: Deadband()
+    }
+    # The number of seconds after which a reading is sent even if it didn't change
+    DEFAULT_MAX_SILENCE = 300
+
+    def __init__(self, deadbands: Optional[dict[Reading.Type, Deadband]] = None,
+                 max_silence: float = DEFAULT_MAX_SILENCE) -> None:
+        """
+        Initializes the filter.
+
+        Parameters
+        ----------
+        deadbands: dict[Reading.Type, Deadband], optional
+            The deadband of each filtered reading type. DEFAULT_DEADBANDS if None.
+        max_silence: float
+            The number of seconds after which a reading is sent even if it didn't change.
+
+        Returns
+        -------
+        None
+        """
+
+        self.deadbands = dict(DeadbandFilter.DEFAULT_DEADBANDS) if deadbands is None \
+            else deadbands
+        self.max_silence = max_silence
+        self.suppressed = 0
+
+        # The last sent value and when it was sent, per subsystem and reading type
+        self._last_sent: dict[tuple[str, Reading.Type], tuple[Any, float]] = {}
+
+    def configure(self, deadbands: dict[Reading.Type, Deadband], max_silence: float) -> None:
+        """
+        Changes the deadbands and the max silence.
+
+        Parameters
+        ----------
+        deadbands: dict[Reading.Type, Deadband]
+            The deadband of each filtered reading type.
+        max_silence: float
+            The number of seconds after which a reading is sent even if it didn't change.
+
+        Returns
+        -------
+        None
+        """
+
+        self.deadbands = deadbands
+        self.max_silence = max_silence
+
+    def filter(self, readings_by_subsystem: dict[str, list[Union[Reading, ReadingBatch]]]
+               ) -> dict[str, list[Union[Reading, ReadingBatch]]]:
+        """
+        Removes the readings which are within their deadband and were sent recently.
+
+        Parameters
+        ----------
+        readings_by_subsystem: dict[str, list[Union[Reading, ReadingBatch]]]
+            The readings of each subsystem keyed by subsystem name.
+
+        Returns
+        -------
+        dict[str, list[Union[Reading, ReadingBatch]]]
+            The readings to send keyed by subsystem name. Subsystems without any reading
+            left are removed.
+        """
+
+        if not self.deadbands:
+            return readings_by_subsystem
+
+        now = monotonic()
+        remaining = {}
+        for subsystem, readings in readings_by_subsystem.items():
+            passed = []
+            for reading in readings:
+                if self._should_send(subsystem, reading, now):
+                    passed.append(reading)
+                else:
+                    self.suppressed += 1
+            if passed:
+                remaining[subsystem] = passed
+
+        return remaining
+
+    def _should_send(self, subsystem: str, reading: Union[Reading, ReadingBatch],
+                     now: float) -> bool:
+        """
+        Checks whether a reading should be sent and remembers it if it is.
+
+        Parameters
+        ----------
+        subsystem: str
+            The name of the subsystem the reading comes from.
+        reading: Union[Reading, ReadingBatch]
+            The reading.
+        now: float
+            The current monotonic time.
+
+        Returns
+        -------
+        bool
+            True if the reading should be sent.
+        """
+
+        deadband = self.deadbands.get(reading.reading_type)
+        if deadband is None or isinstance(reading, ReadingBatch):
+            return True
+
+        key = (subsystem, reading.reading_type)
+        last = self._last_sent.get(key)
+        if last is not None:
+            last_value, last_time = last
+            if now - last_time < self.max_silence and \
+                    not deadband.exceeded(reading.value, last_value):
+                return False
+
+        self._last_sent[key] = (reading.value, now)
+        return True
@@ -0,0 +1,126 @@
+"""
+This module rate limits the health summary reported in the device twin. Every twin write
+counts against the hub's quota, so the summary is reported at most once per interval and
+only with the keys whose value changed since the last report, which is how twin patches
+are merged anyways.
+
+Classes:
+    HealthReport: Debounces the health summary and computes the changed keys.
+
+Usage:
+    report = HealthReport(interval=300)
+    if report.is_due():
+        patch = report.changes(summary)
+        if patch:
+            await client.patch_twin_reported_properties({"health": patch})
+"""
+
+from time import monotonic
+from typing import Any, Optional
+
+from .twin import merge_patch
+
+
+class HealthReport:
+    """
+    Debounces the health summary and computes the keys which changed since it was last
+    reported.
+    """
+
+    # The number of seconds between two reports
+    DEFAULT_INTERVAL = 300
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL) -> None:
+        """
+        Initializes the report. The first report is due right away.
+
+        Parameters
+        ----------
+        interval: float
+            The minimum number of seconds between two reports.
+
+        Returns
+        -------
+        None
+        """
+
+        self.interval = interval
+        self.reports = 0
+        self._reported: dict[str, Any] = {}
+        self._last_report: Optional[float] = None
+
+    def is_due(self) -> bool:
+        """
+        Checks whether the interval elapsed since the last report.
+
+        Returns
+        -------
+        bool
+            True if the summary can be reported.
+        """
+
+        return self._last_report is None or monotonic() - self._last_report >= self.interval
+
+    def changes(self, summary: dict[str, Any]) -> dict[str, Any]:
+        """
+        Computes the keys of the summary which changed since the last report and starts a
+        new interval. Nested dictionaries are compared key by key.
+
+        Parameters
+        ----------
+        summary: dict[str, Any]
+            The current health summary.
+
+        Returns
+        -------
+        dict[str, Any]
+            The changed keys, empty if nothing changed.
+        """
+
+        self._last_report = monotonic()
+        patch = HealthReport._diff(self._reported, summary)
+        if patch:
+            merge_patch(self._reported, patch)
+            self.reports += 1
+        return patch
+
+    def invalidate(self) -> None:
+        """
+        Forgets what was reported, so the next report contains every key. Used when a
+        report failed to reach the twin.
+
+        Returns
+        -------
+        None
+        """
+
+        self._reported = {}
+
+    @staticmethod
+    def _diff(reported: dict[str, Any], summary: dict[str, Any]) -> dict[str, Any]:
+        """
+        Computes the values of a summary which differ from the reported ones.
+
+        Parameters
+        ----------
+        reported: dict[str, Any]
+            The reported values.
+        summary: dict[str, Any]
+            The current values.
+
+        Returns
+        -------
+        dict[str, Any]
+            The values which differ. Keys missing from the summary are kept as reported.
+        """
+
+        patch = {}
+        for key, value in summary.items():
+            previous = reported.get(key)
+            if isinstance(value, dict) and isinstance(previous, dict):
+                nested = HealthReport._diff(previous, value)
+                if nested:
+                    patch[key] = nested
+            elif key not in reported or previous != value:
+                patch[key] = value
+        return patch
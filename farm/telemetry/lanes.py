@@ -0,0 +1,183 @@
+"""
+This module defines the outbound lanes of the connection manager. Each lane has its own
+queue, its own number of concurrent sends and its own latency metrics, so alarms sent on
+the high priority lane never wait behind routine telemetry on the bulk lane.
+
+Classes:
+    SendLane: A queue of messages sent by a fixed number of worker tasks.
+
+Usage:
+    lane = SendLane("high", connection_manager.send_the_d2c_message, concurrency=2)
+    lane.start()
+    await lane.submit(payload, content_type, content_encoding)
+    await lane.close()
+"""
+
+import asyncio
+from time import monotonic
+from typing import Any, Awaitable, Callable, Optional
+
+from .aggregation import P2Quantile, RunningStats
+
+
+class SendLane:
+    """
+    A queue of messages sent by worker tasks. Until the lane is started, messages are sent
+    directly by the caller.
+    """
+
+    DEFAULT_MAX_PENDING = 1000
+
+    def __init__(self, name: str, send: Callable[..., Awaitable[None]],
+                 concurrency: int = 1, max_pending: int = DEFAULT_MAX_PENDING) -> None:
+        """
+        Initializes the lane.
+
+        Parameters
+        ----------
+        name: str
+            The name of the lane, used in its metrics.
+        send: Callable[..., Awaitable[None]]
+            Sends a message, called with the arguments given to submit.
+        concurrency: int
+            The number of messages which can be sent at the same time. Messages are sent
+            in order when it's 1.
+        max_pending: int
+            The number of queued messages after which submit waits for room.
+
+        Returns
+        -------
+        None
+        """
+
+        self.name = name
+        self.concurrency = concurrency
+        self.max_pending = max_pending
+        self.sent = 0
+        self.errors = 0
+
+        self._send = send
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: list[asyncio.Task] = []
+        self._latency = RunningStats()
+        self._latency_p99 = P2Quantile(0.99)
+
+    def start(self) -> None:
+        """
+        Starts the lane's workers on the running event loop.
+
+        Returns
+        -------
+        None
+        """
+
+        if self._queue is not None:
+            return
+
+        self._queue = asyncio.Queue(self.max_pending)
+        self._workers = [asyncio.create_task(self._work())
+                         for _ in range(self.concurrency)]
+
+    async def submit(self, *message: Any) -> None:
+        """
+        Queues a message, waiting only if the queue is full.
+
+        Parameters
+        ----------
+        message: Any
+            The arguments to send the message with.
+
+        Returns
+        -------
+        None
+        """
+
+        if self._queue is None:
+            await self._deliver(monotonic(), message)
+        else:
+            await self._queue.put((monotonic(), message))
+
+    async def _work(self) -> None:
+        """
+        Sends queued messages until the lane is closed.
+
+        Returns
+        -------
+        None
+        """
+
+        while True:
+            submitted, message = await self._queue.get()
+            try:
+                await self._deliver(submitted, message)
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, submitted: float, message: tuple) -> None:
+        """
+        Sends a message and records how long it took since it was submitted.
+
+        Parameters
+        ----------
+        submitted: float
+            The monotonic time the message was submitted at.
+        message: tuple
+            The arguments to send the message with.
+
+        Returns
+        -------
+        None
+        """
+
+        try:
+            await self._send(*message)
+        except Exception as e:
+            # Keep the worker alive, the message is lost but the next ones aren't
+            self.errors += 1
+            print(f"Failed to send a message on the {self.name} lane: {e}")
+            return
+
+        latency = monotonic() - submitted
+        self.sent += 1
+        self._latency.add(latency)
+        self._latency_p99.add(latency)
+
+    async def close(self) -> None:
+        """
+        Waits for the queued messages to be sent and stops the workers.
+
+        Returns
+        -------
+        None
+        """
+
+        if self._queue is None:
+            return
+
+        await self._queue.join()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+
+        self._queue = None
+        self._workers = []
+
+    def to_dict(self) -> dict:
+        """
+        Creates a dictionary of the lane's metrics.
+
+        Returns
+        -------
+        dict
+            The number of queued, sent and failed messages and the mean, 99th percentile
+            and maximum number of seconds between submitting and sending a message.
+        """
+
+        return {
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "sent": self.sent,
+            "errors": self.errors,
+            "latency_mean": self._latency.mean,
+            "latency_p99": self._latency_p99.value,
+            "latency_max": self._latency.maximum
+        }
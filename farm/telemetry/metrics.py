@@ -0,0 +1,117 @@
+"""
+This module serves the farm's metrics locally over HTTP in the Prometheus text format, so
+a scraper or a person with curl can see what the device is doing without going through
+the IoT hub. The server only answers GET /metrics and renders the metrics on every
+request.
+
+Classes:
+    MetricsServer: A minimal HTTP server for the Prometheus text format.
+
+Usage:
+    server = MetricsServer(instrumentation.to_prometheus, 9100)
+    await server.start()
+    await server.close()
+"""
+
+import asyncio
+from typing import Callable, Optional
+
+
+class MetricsServer:
+    """
+    A minimal HTTP server which serves the metrics on GET /metrics.
+    """
+
+    PATH = "/metrics"
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+    # The number of seconds a client has to send its request
+    REQUEST_TIMEOUT = 5
+    # Only the device itself can reach the metrics unless another address is given
+    DEFAULT_HOST = "127.0.0.1"
+
+    def __init__(self, render: Callable[[], str], port: int,
+                 host: str = DEFAULT_HOST) -> None:
+        """
+        Initializes the server without starting it.
+
+        Parameters
+        ----------
+        render: Callable[[], str]
+            Renders the metrics in the Prometheus text format.
+        port: int
+            The port to listen on.
+        host: str
+            The address to listen on. "0.0.0.0" exposes the metrics to the whole network.
+
+        Returns
+        -------
+        None
+        """
+
+        self.port = port
+        self.host = host
+        self._render = render
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> None:
+        """
+        Starts listening on the running event loop.
+
+        Returns
+        -------
+        None
+        """
+
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+
+    async def _handle(self, reader: asyncio.StreamReader,
+                      writer: asyncio.StreamWriter) -> None:
+        """
+        Answers a single request and closes the connection.
+
+        Parameters
+        ----------
+        reader: asyncio.StreamReader
+            The request stream.
+        writer: asyncio.StreamWriter
+            The response stream.
+
+        Returns
+        -------
+        None
+        """
+
+        try:
+            request = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"),
+                                             MetricsServer.REQUEST_TIMEOUT)
+            method, path, *_ = request.split(b"\r\n", 1)[0].decode("latin-1").split(" ")
+
+            if method != "GET" or path.split("?", 1)[0] != MetricsServer.PATH:
+                status, body = "404 Not Found", b""
+            else:
+                status, body = "200 OK", self._render().encode("utf-8")
+
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: {MetricsServer.CONTENT_TYPE}"
+                         f"\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n"
+                         .encode("latin-1") + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError,
+                asyncio.LimitOverrunError, ValueError, ConnectionError):
+            # Malformed or abandoned request, nothing to answer
+            pass
+        finally:
+            writer.close()
+
+    async def close(self) -> None:
+        """
+        Stops listening.
+
+        Returns
+        -------
+        None
+        """
+
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
@@ -0,0 +1,143 @@
+"""
+This module serializes telemetry payloads to json in a single pass. orjson is used when it
+is installed since it's several times faster than the standard library on the small
+dictionaries the farm produces, otherwise the standard library json module is used.
+
+Classes:
+    JsonEncoding: The default json wire format, used by the connection manager.
+
+Functions:
+    dumps(data): Serializes a telemetry payload to a compact json string.
+    readings_to_telemetry(readings_by_subsystem): Builds the telemetry dictionary sent to
+    the IoT hub from the readings of each subsystem.
+
+Usage:
+    payload = dumps(readings_to_telemetry({"PlantSubsystem": readings}))
+"""
+
+import json
+from typing import Any
+
+from subsystems.interfaces.reading import Reading
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Whether the fast encoder is being used. Useful when comparing benchmarks.
+USING_ORJSON = orjson is not None
+
+
+def dumps(data: Any) -> str:
+    """
+    Serializes a telemetry payload to a compact json string.
+
+    Parameters
+    ----------
+    data: Any
+        The payload to serialize. Must only contain json compatible types.
+
+    Returns
+    -------
+    str
+        The json payload.
+    """
+
+    if orjson is not None:
+        return orjson.dumps(data).decode("utf-8")
+
+    return json.dumps(data, separators=(",", ":"))
+
+
+def readings_to_telemetry(readings_by_subsystem: dict[str, list[Reading]]) -> dict:
+    """
+    Builds the telemetry dictionary sent to the IoT hub, converting every reading to a
+    dictionary without going through json.
+
+    Parameters
+    ----------
+    readings_by_subsystem: dict[str, list[Reading]]
+        The readings of each subsystem keyed by subsystem name.
+
+    Returns
+    -------
+    dict
+        The readings of each subsystem as dictionaries, keyed by subsystem name.
+    """
+
+    return {subsystem: [reading.to_dict() for reading in readings]
+            for subsystem, readings in readings_by_subsystem.items()}
+
+
+class JsonEncoding:
+    """
+    The json wire format. A batch containing a single cycle is sent as that cycle's
+    telemetry object and a batch with more than one cycle is sent as a json array of
+    telemetry objects.
+    """
+
+    name = "json"
+    content_type = "application/json"
+    content_encoding = "utf-8"
+
+    # Bytes added around the cycles of a batch, "[" + "]" and a "," between cycles
+    _ARRAY_OVERHEAD = 2
+    _SEPARATOR_SIZE = 1
+
+    def encode(self, readings_by_subsystem: dict[str, list[Reading]]) -> str:
+        """
+        Serializes the readings of a single cycle.
+
+        Parameters
+        ----------
+        readings_by_subsystem: dict[str, list[Reading]]
+            The readings of each subsystem keyed by subsystem name.
+
+        Returns
+        -------
+        str
+            The json telemetry of the cycle.
+        """
+
+        return dumps(readings_to_telemetry(readings_by_subsystem))
+
+    def join(self, cycles: list[str]) -> str:
+        """
+        Combines serialized cycles into a single payload.
+
+        Parameters
+        ----------
+        cycles: list[str]
+            The json telemetry of each cycle, oldest first.
+
+        Returns
+        -------
+        str
+            The batched payload.
+        """
+
+        if len(cycles) == 1:
+            return cycles[0]
+
+        return "[" + ",".join(cycles) + "]"
+
+    def join_overhead(self, count: int) -> int:
+        """
+        The number of bytes join adds on top of the cycles themselves.
+
+        Parameters
+        ----------
+        count: int
+            The number of cycles being joined.
+
+        Returns
+        -------
+        int
+            The number of extra bytes.
+        """
+
+        if count <= 1:
+            return 0
+
+        return JsonEncoding._ARRAY_OVERHEAD + (count - 1) * JsonEncoding._SEPARATOR_SIZE
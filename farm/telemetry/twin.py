@@ -0,0 +1,296 @@
+"""
+This module moves device twin patches from the IoT hub client's handler thread onto the
+farm's event loop. Desired properties are applied on the loop, between telemetry ticks,
+so the new sampling intervals, batching policy and filters are picked up by the next tick
+without reconnecting. The reported properties of a burst of patches are merged and sent
+as a single reported update.
+
+Classes:
+    TwinPatchPipeline: Applies desired property patches on the event loop and coalesces
+    the reported properties.
+
+Functions:
+    merge_patch: Applies a patch to a dictionary of properties like the device twin does.
+
+Usage:
+    pipeline = TwinPatchPipeline(apply_desired_properties, report_properties)
+    client.on_twin_desired_properties_patch_received = pipeline.submit
+    pipeline.bind(asyncio.get_running_loop())
+    await pipeline.close()
+"""
+
+import asyncio
+from threading import Lock
+from typing import Any, Awaitable, Callable, Optional
+
+
+def merge_patch(properties: dict[str, Any], patch: dict[str, Any]) -> None:
+    """
+    Applies a patch to a dictionary of properties like the device twin does. Nested
+    dictionaries are merged key by key and every other value is replaced.
+
+    Parameters
+    ----------
+    properties: dict[str, Any]
+        The properties, updated in place.
+    patch: dict[str, Any]
+        The changed properties.
+
+    Returns
+    -------
+    None
+    """
+
+    for key, value in patch.items():
+        if isinstance(value, dict) and isinstance(properties.get(key), dict):
+            merge_patch(properties[key], value)
+        else:
+            properties[key] = dict(value) if isinstance(value, dict) else value
+
+
+class TwinPatchPipeline:
+    """
+    Applies desired property patches on the event loop and sends the reported properties
+    of every patch received within the debounce delay as one update. Patches can be
+    submitted from any thread. Patches submitted before the pipeline is bound to a loop
+    are kept and applied in order once it is.
+    """
+
+    # The number of seconds reported properties are held to coalesce a burst of patches
+    DEFAULT_DEBOUNCE = 0.5
+    # The number of seconds before reported properties which failed to send are retried
+    DEFAULT_RETRY_DELAY = 30
+
+    def __init__(self, apply: Callable[[dict[str, Any]], dict[str, Any]],
+                 report: Callable[[dict[str, Any]], Awaitable[bool]],
+                 debounce: float = DEFAULT_DEBOUNCE,
+                 retry_delay: float = DEFAULT_RETRY_DELAY) -> None:
+        """
+        Initializes the pipeline without binding it to a loop.
+
+        Parameters
+        ----------
+        apply: Callable[[dict[str, Any]], dict[str, Any]]
+            Applies a desired properties patch and returns the reported properties which
+            changed.
+        report: Callable[[dict[str, Any]], Awaitable[bool]]
+            Sends reported properties, returns whether they were sent.
+        debounce: float
+            The number of seconds reported properties are held after the first patch of
+            a burst.
+        retry_delay: float
+            The number of seconds before reported properties which failed to send are
+            sent again.
+
+        Returns
+        -------
+        None
+        """
+
+        self.debounce = debounce
+        self.retry_delay = retry_delay
+        self.patches_received = 0
+        self.reports_sent = 0
+
+        self._apply = apply
+        self._report = report
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Patches submitted before the pipeline was bound
+        self._early_patches: list[dict[str, Any]] = []
+        self._lock = Lock()
+        # The reported properties waiting to be sent
+        self._pending: dict[str, Any] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def bind(self, loop: asyncio.AbstractEventLoop) -> None:
+        """
+        Binds the pipeline to the event loop patches are applied on and applies the
+        patches submitted so far.
+
+        Parameters
+        ----------
+        loop: asyncio.AbstractEventLoop
+            The running event loop.
+
+        Returns
+        -------
+        None
+        """
+
+        with self._lock:
+            self._loop = loop
+            early_patches, self._early_patches = self._early_patches, []
+
+        for patch in early_patches:
+            loop.call_soon_threadsafe(self._receive, patch)
+
+    def submit(self, patch: dict[str, Any]) -> None:
+        """
+        Schedules a desired properties patch to be applied on the event loop. Safe to
+        call from the IoT hub client's handler thread.
+
+        Parameters
+        ----------
+        patch: dict[str, Any]
+            The desired properties patch.
+
+        Returns
+        -------
+        None
+        """
+
+        with self._lock:
+            if self._loop is None:
+                self._early_patches.append(patch)
+                return
+            loop = self._loop
+
+        try:
+            loop.call_soon_threadsafe(self._receive, patch)
+        except RuntimeError:
+            # The loop is closed, the farm is shutting down
+            pass
+
+    def _receive(self, patch: dict[str, Any]) -> None:
+        """
+        Applies a patch and queues its reported properties. Runs on the event loop.
+
+        Parameters
+        ----------
+        patch: dict[str, Any]
+            The desired properties patch.
+
+        Returns
+        -------
+        None
+        """
+
+        self.patches_received += 1
+        reported = self._apply(patch)
+        if reported:
+            merge_patch(self._pending, reported)
+            self._schedule_flush(self.debounce)
+
+    def _schedule_flush(self, delay: float) -> None:
+        """
+        Schedules the pending reported properties to be sent, unless they already are.
+
+        Parameters
+        ----------
+        delay: float
+            The number of seconds to wait before sending.
+
+        Returns
+        -------
+        None
+        """
+
+        if self._flush_handle is None and self._flush_task is None:
+            self._flush_handle = self._loop.call_later(delay, self._start_flush)
+
+    def _start_flush(self) -> None:
+        """
+        Starts sending the pending reported properties. Runs on the event loop.
+
+        Returns
+        -------
+        None
+        """
+
+        self._flush_handle = None
+        self._flush_task = self._loop.create_task(self._flush())
+
+    async def _flush(self) -> None:
+        """
+        Sends the pending reported properties. Properties which fail to send are merged
+        under the ones received since and retried later.
+
+        Returns
+        -------
+        None
+        """
+
+        reported, self._pending = self._pending, {}
+        try:
+            sent = bool(reported) and await self._report(reported)
+        finally:
+            self._flush_task = None
+
+        if sent:
+            self.reports_sent += 1
+        elif reported:
+            merge_patch(reported, self._pending)
+            self._pending = reported
+            self._schedule_flush(self.retry_delay)
+            return
+
+        # Patches received while sending
+        if self._pending:
+            self._schedule_flush(self.debounce)
+
+    def report(self, reported: dict[str, Any]) -> None:
+        """
+        Queues reported properties which didn't come from a patch, to be sent with the
+        next reported update. Runs on the event loop.
+
+        Parameters
+        ----------
+        reported: dict[str, Any]
+            The reported properties which changed.
+
+        Returns
+        -------
+        None
+        """
+
+        merge_patch(self._pending, reported)
+        if self._loop is not None:
+            self._schedule_flush(self.debounce)
+
+    def retry(self) -> None:
+        """
+        Sends the reported properties which failed to send right away instead of waiting
+        for the retry delay, used once the connection is back.
+
+        Returns
+        -------
+        None
+        """
+
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+            self._schedule_flush(0)
+
+    @property
+    def pending(self) -> dict[str, Any]:
+        """
+        The reported properties waiting to be sent.
+
+        Returns
+        -------
+        dict[str, Any]
+            The reported properties.
+        """
+
+        return self._pending
+
+    async def close(self) -> None:
+        """
+        Sends the pending reported properties right away and stops scheduling sends.
+
+        Returns
+        -------
+        None
+        """
+
+        if self._flush_task is not None:
+            await self._flush_task
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._pending:
+            reported, self._pending = self._pending, {}
+            if await self._report(reported):
+                self.reports_sent += 1